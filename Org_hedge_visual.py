@@ -4,50 +4,30 @@ import matplotlib
 matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import MetaTrader5 as mt5
+from dashboard_shm import DashboardReader, symbol_pl
+from settings import DASHBOARD_POLL_MS
 
-# Anta att hedged_positions, etc. är importerade eller tillgängliga
-# from communication import hedged_positions
-# from channel_4 import hedged_positions, original_orders_per_symbol, hedge_orders_per_symbol
-# Justera efter din kodstruktur
+# Egen process (`python Org_hedge_visual.py`) som bara läser bottens dashboard-segment i delat minne
+_reader = None
 
 # Denna funktion hämtar aktuell data för alla symboler, beräknar P/L för original och hedge
-def get_symbol_pl_data():
-    open_positions = mt5.positions_get()
-    if open_positions is None:
-        return {}, {}  # Inga data om något gick fel
-
-    symbol_data_original = {}
-    symbol_data_hedge = {}
-
-    # Nollställ data
-    # Vi använder dictionaries: {symbol: sum_of_profits}
-    # För varje symbol börjar vi på 0
-    # Men vi lägger bara till symboler som faktiskt har positioner
-
-    for pos in open_positions:
-        symbol = pos.symbol
-        # Kolla om hedge eller original
-        if pos.ticket in hedged_positions.values():
-            # Hedgeorder
-            if symbol not in symbol_data_hedge:
-                symbol_data_hedge[symbol] = 0.0
-            symbol_data_hedge[symbol] += pos.profit
-        else:
-            # Originalorder
-            if symbol not in symbol_data_original:
-                symbol_data_original[symbol] = 0.0
-            symbol_data_original[symbol] += pos.profit
-
-    # Se till att om en symbol finns i original men inte hedge (eller tvärtom) sätter vi 0 för den andra
-    all_symbols = set(symbol_data_original.keys()).union(set(symbol_data_hedge.keys()))
-    for sym in all_symbols:
-        if sym not in symbol_data_original:
-            symbol_data_original[sym] = 0.0
-        if sym not in symbol_data_hedge:
-            symbol_data_hedge[sym] = 0.0
-
-    return symbol_data_original, symbol_data_hedge
+def get_symbol_pl_data(reader=None):
+    global _reader
+    if reader is None:
+        if _reader is None:
+            try:
+                _reader = DashboardReader()
+            except FileNotFoundError:
+                return {}, {}  # Boten har inte startat än
+        reader = _reader
+    snapshot = reader.read()
+    if snapshot is None:
+        return {}, {}  # Ingen konsistent läsning
+
+    # P/L summeras per symbol: {symbol: sum_of_profits}.
+    # Bara symboler som faktiskt har positioner tas med, och båda dictionaries får samma nycklar.
+    _, rows = snapshot
+    return symbol_pl(rows)
 
 
 class EquityChartGUI:
@@ -69,8 +49,13 @@ class EquityChartGUI:
         # Uppdatera diagrammet en gång direkt
         self.update_equity_chart()
 
-        # Om du vill ha automatisk uppdatering, t.ex. var 10:e sekund:
-        # self.master.after(10000, self.update_equity_chart)
+        # Automatisk uppdatering: rita om när boten har publicerat en ny ögonblicksbild
+        self.master.after(DASHBOARD_POLL_MS, self.poll)
+
+    def poll(self):
+        if _reader is None or _reader.changed():
+            self.update_equity_chart()
+        self.master.after(DASHBOARD_POLL_MS, self.poll)
 
     def update_equity_chart(self):
         # Hämta data
@@ -119,7 +104,5 @@ def start_gui():
     root.mainloop()
 
 
-# Om du vill testa lokalt kan du köra:
-# if __name__ == "__main__":
-#     mt5.initialize()
-#     start_gui()
+if __name__ == "__main__":
+    start_gui()
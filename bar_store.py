@@ -0,0 +1,168 @@
+# bar_store.py
+"""
+Lokal bar-lagring på disk, en minnesmappad fil per (symbol, tidsram).
+
+Filerna innehåller stängda barer i MetaTrader5:s rates-format (RATES_DTYPE),
+sorterade på tid. Vid sync hämtas bara barer som är nyare än den senast
+sparade och läggs till i slutet av filen. Läsare får vyer (utan kopiering)
+av den minnesmappade arrayen, så indikatoruppvärmning och backtester kan läsa
+månader av barer utan att fråga terminalen.
+
+Den pågående (ej stängda) baren sparas aldrig; bars(..., include_current=True)
+hämtar den separat från terminalen.
+
+Den första, djupa hämtningen (BAR_STORE_INITIAL_BARS) görs av uppvärmningen och
+trendmotorn i bakgrunden. Finns ingen fil ännu när en signal ber om count barer
+hämtas bara de från terminalen, utan att sparas.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import MetaTrader5 as mt5
+
+from settings import BAR_STORE_DIR, BAR_STORE_INITIAL_BARS, BAR_STORE_SYNC_INTERVAL
+
+logger = logging.getLogger("BarStore")
+
+# Samma layout som arrayen copy_rates_* returnerar
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("close", "<f8"), ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D1": 86400}
+TIMEFRAME_NAMES = tuple(TIMEFRAME_SECONDS)
+
+# (symbol, tidsramsnamn) -> minnesmappad array över alla sparade barer
+_stores = {}
+# (symbol, tidsramsnamn) -> time.monotonic() vid senaste sync
+_last_sync = {}
+_lock = threading.Lock()
+
+
+def timeframe_name(timeframe):
+    """Tidsramsnamn ("M1") för ett namn eller en MetaTrader5-konstant."""
+    if isinstance(timeframe, str):
+        return timeframe
+    for name in TIMEFRAME_NAMES:
+        if getattr(mt5, f"TIMEFRAME_{name}") == timeframe:
+            return name
+    raise ValueError(f"Unknown timeframe {timeframe}.")
+
+
+def store_path(symbol, timeframe):
+    return os.path.join(BAR_STORE_DIR, f"{symbol}_{timeframe_name(timeframe)}.bars")
+
+
+def open_bars(path):
+    """Minnesmappa en bar-fil (skrivskyddad). Tom array om filen saknas eller är tom."""
+    if not os.path.exists(path) or os.path.getsize(path) < RATES_DTYPE.itemsize:
+        return np.empty(0, dtype=RATES_DTYPE)
+    return np.memmap(path, dtype=RATES_DTYPE, mode="r")
+
+
+def _fetch_closed(symbol, timeframe, after_time, initial=BAR_STORE_INITIAL_BARS):
+    """Hämta stängda barer nyare än after_time (None = de senaste initial barerna) från terminalen."""
+    constant = getattr(mt5, f"TIMEFRAME_{timeframe}")
+    if after_time is None:
+        rates = mt5.copy_rates_from_pos(symbol, constant, 1, initial)
+        return np.asarray(rates, dtype=RATES_DTYPE) if rates is not None else np.empty(0, dtype=RATES_DTYPE)
+
+    # Oftast har exakt en ny bar stängt; dubbla fönstret tills det når den senast sparade baren
+    count = 1
+    while True:
+        rates = mt5.copy_rates_from_pos(symbol, constant, 1, count)
+        if rates is None or len(rates) == 0:
+            return np.empty(0, dtype=RATES_DTYPE)
+        if rates["time"][0] <= after_time or len(rates) < count or count >= BAR_STORE_INITIAL_BARS:
+            break
+        count *= 4
+    return rates[rates["time"] > after_time]
+
+
+def sync(symbol, timeframe, force=False, seed=True):
+    """
+    Lägg till nya stängda barer i filen. Returnerar antalet tillagda barer.
+
+    En tom fil fylls med BAR_STORE_INITIAL_BARS barer, men bara med seed; annars lämnas den tom.
+    """
+    timeframe = timeframe_name(timeframe)
+    key = (symbol, timeframe)
+    now = time.monotonic()
+    if not force and now - _last_sync.get(key, -BAR_STORE_SYNC_INTERVAL) < BAR_STORE_SYNC_INTERVAL:
+        return 0
+
+    with _lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = open_bars(store_path(symbol, timeframe))
+        if not seed and len(store) == 0:
+            return 0  # Den djupa hämtningen görs i bakgrunden (uppvärmning, trendmotor)
+        last_time = int(store["time"][-1]) if len(store) else None
+
+        new_bars = _fetch_closed(symbol, timeframe, last_time)
+        _last_sync[key] = now
+        if len(new_bars) == 0:
+            return 0
+
+        os.makedirs(BAR_STORE_DIR, exist_ok=True)
+        with open(store_path(symbol, timeframe), "ab") as f:
+            f.write(np.ascontiguousarray(new_bars, dtype=RATES_DTYPE).tobytes())
+        _stores[key] = open_bars(store_path(symbol, timeframe))
+    logger.debug("Appended %s %s bars for %s.", len(new_bars), timeframe, symbol)
+    return len(new_bars)
+
+
+def bars(symbol, timeframe, count=None, include_current=False):
+    """
+    De senaste count stängda barerna (alla om count är None) som en vy av den minnesmappade filen.
+
+    Finns ingen sparad historik ännu hämtas bara count barer från terminalen (en kopia som inte
+    sparas); utan count fylls filen med den djupa historiken. Med include_current läggs den
+    pågående baren till sist (då blir resultatet en kopia).
+    """
+    timeframe = timeframe_name(timeframe)
+    sync(symbol, timeframe, seed=count is None)
+    store = _stores.get((symbol, timeframe))
+    if store is None:
+        store = np.empty(0, dtype=RATES_DTYPE)
+    if count and len(store) == 0:
+        closed = _fetch_closed(symbol, timeframe, None, count)
+    else:
+        closed = store if count is None else store[-count:] if count else store[:0]
+    if not include_current:
+        return closed
+
+    current = mt5.copy_rates_from_pos(symbol, getattr(mt5, f"TIMEFRAME_{timeframe}"), 0, 1)
+    if current is None or len(current) == 0:
+        return closed
+    current = np.asarray(current, dtype=RATES_DTYPE)
+    if len(closed) and current["time"][0] <= closed["time"][-1]:
+        return closed
+    if len(store) and current["time"][0] - closed["time"][-1] > TIMEFRAME_SECONDS[timeframe]:
+        # En bar har stängt sedan senaste sync (som hoppades över p.g.a. intervallet): hämta den nu
+        sync(symbol, timeframe, force=True)
+        store = _stores[(symbol, timeframe)]
+        closed = store if count is None else store[-count:]
+    combined = np.concatenate((closed, current))
+    return combined[-count:] if count else combined
+
+
+def bars_between(symbol, timeframe, start_time, end_time):
+    """Stängda barer med start_time <= time < end_time, utan att fråga terminalen."""
+    timeframe = timeframe_name(timeframe)
+    store = _stores.get((symbol, timeframe))
+    if store is None:
+        store = _stores[(symbol, timeframe)] = open_bars(store_path(symbol, timeframe))
+    times = store["time"]
+    return store[np.searchsorted(times, start_time):np.searchsorted(times, end_time)]
+
+
+def reset():
+    """Glöm öppna filer och sync-tider (filerna på disk ligger kvar)."""
+    with _lock:
+        _stores.clear()
+        _last_sync.clear()
@@ -1,5 +1,10 @@
 import logging
+import asyncio
 import MetaTrader5 as mt5
+from order_submission import submit_order
+from order_templates import build_request
+from mt5_connection import require_connection_async
+from session_calendar import require_open
 
 logger = logging.getLogger("Channel1")
 
@@ -19,46 +24,55 @@ def calculate_lot_size(risk_percent, balance, sl_price, entry_price, total_order
     lot_size = round(lot_size / step) * step
     return round(lot_size, 2)
 
+def parse_scalping_signal(message):
+    """Tolka en scalping-signal till (action, symbol, entry_prices, sl_price, tp_prices)."""
+    lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
+    if len(lines) < 2:
+        raise ValueError("Signal format invalid: Not enough lines in the message.")
+
+    action = "SELL" if "Sell" in lines[0] else "BUY" if "Buy" in lines[0] else None
+    if not action:
+        raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
+
+    symbol = "XAUUSD" if "Gold" in lines[0] else None
+    if not symbol:
+        raise ValueError("Invalid signal format: Symbol not recognized.")
+
+    entry_zone_raw = " ".join(lines[0].split(" ")[2:])
+    entry_prices = list(map(float, entry_zone_raw.replace(" ", "").split("-")))
+
+    sl_price = float(lines[1].split(" ")[-1])
+    tp_prices = []
+    for line in lines[2:]:
+        if line.startswith("TP"):
+            tp_value = line.split(" ")[-1]
+            try:
+                # Rensa parenteser och hantera flera värden (ex: "2636/2634")
+                tp_value_clean = tp_value.strip("()")
+                if "/" in tp_value_clean:
+                    tp_value_clean = tp_value_clean.split("/")[0]  # Ta det första värdet före '/'
+                tp_prices.append(float(tp_value_clean))
+            except ValueError:
+                logger.warning("Skipping invalid TP format: %s", line)
+                continue
+
+    if not tp_prices:
+        raise ValueError("No valid Take Profit levels found.")
+
+    return action, symbol, entry_prices, sl_price, tp_prices
+
 # Funktion för att hantera inkommande signaler
 async def process_scalping_signal(message, mt5_path):
     """Processa signaler från Telegram och placera ordrar."""
     try:
-        lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
-        if len(lines) < 2:
-            raise ValueError("Signal format invalid: Not enough lines in the message.")
-
-        action = "SELL" if "Sell" in lines[0] else "BUY" if "Buy" in lines[0] else None
-        if not action:
-            raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
-
-        symbol = "XAUUSD" if "Gold" in lines[0] else None
-        if not symbol:
-            raise ValueError("Invalid signal format: Symbol not recognized.")
-
-        entry_zone_raw = " ".join(lines[0].split(" ")[2:])
-        entry_prices = list(map(float, entry_zone_raw.replace(" ", "").split("-")))
-
-        sl_price = float(lines[1].split(" ")[-1])
-        tp_prices = []
-        for line in lines[2:]:
-            if line.startswith("TP"):
-                tp_value = line.split(" ")[-1]
-                try:
-                    # Rensa parenteser och hantera flera värden (ex: "2636/2634")
-                    tp_value_clean = tp_value.strip("()")
-                    if "/" in tp_value_clean:
-                        tp_value_clean = tp_value_clean.split("/")[0]  # Ta det första värdet före '/'
-                    tp_prices.append(float(tp_value_clean))
-                except ValueError:
-                    logger.warning(f"Skipping invalid TP format: {line}")
-                    continue
-
-        if not tp_prices:
-            raise ValueError("No valid Take Profit levels found.")
-
-        ensure_mt5_initialized(mt5_path)
-
-        orders = place_scalping_orders(
+        action, symbol, entry_prices, sl_price, tp_prices = parse_scalping_signal(message)
+
+        await require_connection_async(mt5_path)
+        require_open(symbol)  # Stängd marknad: avvisa innan några order byggs
+
+        # Orderläggningen blockerar (omförsök, hastighetsbegränsning, routing): kör i en tråd
+        orders = await asyncio.to_thread(
+            place_scalping_orders,
             action=action,
             symbol=symbol,
             zone=entry_prices,
@@ -66,54 +80,61 @@ async def process_scalping_signal(message, mt5_path):
             tp_prices=tp_prices,
         )
 
-        logger.info(f"Orders placed: {orders}")
+        logger.info("Orders placed: %s", orders)
 
     except Exception as e:
-        logger.error(f"Error processing signal: {e}")
+        logger.error("Error processing signal: %s", e)
 
-async def process_channel_1_signal(message, mt5_path):
-    """Process incoming signals from Telegram and handle order placement."""
-    try:
-        lines = [line.strip().lower() for line in message.strip().split("\n") if line.strip()]
-        logger.info(f"Processed lines: {lines}")
+def parse_channel_1_signal(message):
+    """Tolka en Kanal 1-signal till (action, symbol, zone, sl_price, tp_prices)."""
+    lines = [line.strip().lower() for line in message.strip().split("\n") if line.strip()]
+    logger.info("Processed lines: %s", lines)
+
+    if len(lines) < 5:
+        raise ValueError(f"Signal format invalid: Not enough lines in the message ({len(lines)} lines).")
+
+    # Kontrollera Buy/Sell
+    action = "SELL" if "sell" in lines[0] else "BUY" if "buy" in lines[0] else None
+    if not action:
+        raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
 
-        if len(lines) < 5:
-            raise ValueError(f"Signal format invalid: Not enough lines in the message ({len(lines)} lines).")
+    # Kontrollera symbol (Gold)
+    symbol = "XAUUSD" if "gold" in lines[0] else None
+    if not symbol:
+        raise ValueError("Invalid signal format: Missing symbol 'Gold'.")
 
-        # Kontrollera Buy/Sell
-        action = "SELL" if "sell" in lines[0] else "BUY" if "buy" in lines[0] else None
-        if not action:
-            raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
+    # Extrahera zon
+    zone_line = lines[1].split("zone")[1].strip()
+    zone = list(map(float, zone_line.replace(" ", "").strip("<>").split("-")))
+    if len(zone) != 2:
+        raise ValueError(f"Zone parsing failed: {zone}")
 
-        # Kontrollera symbol (Gold)
-        symbol = "XAUUSD" if "gold" in lines[0] else None
-        if not symbol:
-            raise ValueError("Invalid signal format: Missing symbol 'Gold'.")
+    # Extrahera SL och TP
+    sl_price = float(lines[2].split(":")[1].strip())
+    tp_prices = [float(tp.split(":")[1].strip()) for tp in lines[3:] if "tp" in tp]
 
-        # Extrahera zon
-        zone_line = lines[1].split("zone")[1].strip()
-        zone = list(map(float, zone_line.replace(" ", "").strip("<>").split("-")))
-        if len(zone) != 2:
-            raise ValueError(f"Zone parsing failed: {zone}")
+    if not tp_prices:
+        raise ValueError("No valid Take Profit levels found.")
 
-        # Extrahera SL och TP
-        sl_price = float(lines[2].split(":")[1].strip())
-        tp_prices = [float(tp.split(":")[1].strip()) for tp in lines[3:] if "tp" in tp]
+    return action, symbol, zone, sl_price, tp_prices
 
-        if not tp_prices:
-            raise ValueError("No valid Take Profit levels found.")
+async def process_channel_1_signal(message, mt5_path):
+    """Process incoming signals from Telegram and handle order placement."""
+    try:
+        action, symbol, zone, sl_price, tp_prices = parse_channel_1_signal(message)
 
         # Initialize MT5
-        ensure_mt5_initialized(mt5_path)
+        await require_connection_async(mt5_path)
+        require_open(symbol)  # Stängd marknad: avvisa innan några order byggs
 
         # Placera gränsordrar inom zonen
         orders = await asyncio.to_thread(
             place_orders_within_zone, action, symbol, zone, sl_price, tp_prices, logger, total_orders=5
         )
-        logger.info(f"Limit orders placed: {orders}")
+        logger.info("Limit orders placed: %s", orders)
 
     except Exception as e:
-        logger.error(f"Error processing signal: {e}")
+        logger.error("Error processing signal: %s", e)
 
 # Funktion för att placera ordrar
 def place_scalping_orders(action, symbol, zone, sl_price, tp_prices):
@@ -123,24 +144,21 @@ def place_scalping_orders(action, symbol, zone, sl_price, tp_prices):
     orders = []
 
     for i, tp_price in enumerate(tp_prices):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_LIMIT if action == "BUY" else mt5.ORDER_TYPE_SELL_LIMIT,
-            "price": current_price,
-            "sl": sl_price,
-            "tp": tp_price,
-            "deviation": 10,
-            "magic": 0,
-            "comment": f"Order_TP{i+1}",
-        }
-        result = mt5.order_send(request)
-        if result.retcode == mt5.TRADE_RETCODE_DONE:
-            logger.info(f"Order {request['comment']} placed.")
+        request = build_request(
+            symbol, "pending",
+            type=mt5.ORDER_TYPE_BUY_LIMIT if action == "BUY" else mt5.ORDER_TYPE_SELL_LIMIT,
+            volume=lot_size,
+            price=current_price,
+            sl=sl_price,
+            tp=tp_price,
+            comment=f"Order_TP{i+1}",
+        )
+        result = submit_order(request)
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            logger.info("Order %s placed.", request['comment'])
             orders.append(request)
         else:
-            logger.error(f"Failed to place order {request['comment']}: {result.retcode}")
+            logger.error("Failed to place order %s: %s", request['comment'], result.retcode if result else 'no response')
     return orders
 
 def place_orders_within_zone(action, symbol, zone, sl_price, tp_prices, logger, total_orders=4):
@@ -164,38 +182,35 @@ def place_orders_within_zone(action, symbol, zone, sl_price, tp_prices, logger,
         for i in range(total_orders):
             entry_price = zone[0] + i * order_distance
             if i >= len(tp_prices):
-                logger.warning(f"Skipping TP for order {i+1}: No valid TP provided.")
+                logger.warning("Skipping TP for order %s: No valid TP provided.", i+1)
                 continue
             tp_price = tp_prices[i]
 
             if abs(entry_price - sl_price) < stops_level:
-                logger.error(f"Limit order not placed: SL too close to entry price {entry_price}. Required: {stops_level}")
+                logger.error("Limit order not placed: SL too close to entry price %s. Required: %s", entry_price, stops_level)
                 continue
             if abs(tp_price - entry_price) < stops_level:
-                logger.error(f"Limit order not placed: TP too close to entry price {entry_price}. Required: {stops_level}")
+                logger.error("Limit order not placed: TP too close to entry price %s. Required: %s", entry_price, stops_level)
                 continue
 
-            request = {
-                "action": mt5.TRADE_ACTION_PENDING,
-                "symbol": symbol,
-                "volume": lot_size,
-                "type": mt5.ORDER_TYPE_SELL_LIMIT if action == "SELL" else mt5.ORDER_TYPE_BUY_LIMIT,
-                "price": entry_price,
-                "sl": sl_price,
-                "tp": tp_price,
-                "deviation": 10,
-                "magic": 0,
-                "comment": f"Order_TP{i+1}",
-            }
-            result = mt5.order_send(request)
+            request = build_request(
+                symbol, "pending",
+                type=mt5.ORDER_TYPE_SELL_LIMIT if action == "SELL" else mt5.ORDER_TYPE_BUY_LIMIT,
+                volume=lot_size,
+                price=entry_price,
+                sl=sl_price,
+                tp=tp_price,
+                comment=f"Order_TP{i+1}",
+            )
+            result = submit_order(request)
             if result.retcode == mt5.TRADE_RETCODE_DONE:
-                logger.info(f"Order {request['comment']} placed successfully.")
+                logger.info("Order %s placed successfully.", request['comment'])
                 orders.append({"price": entry_price, "volume": lot_size, "tp": tp_price, "comment": f"Order_TP{i+1}"})
             else:
-                logger.error(f"Failed to place order {request['comment']}: {result.retcode}")
+                logger.error("Failed to place order %s: %s", request['comment'], result.retcode)
 
         return orders
 
     except Exception as e:
-        logger.error(f"Error in placing orders within zone: {e}")
+        logger.error("Error in placing orders within zone: %s", e)
         return []
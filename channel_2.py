@@ -1,5 +1,9 @@
 import logging
 import MetaTrader5 as mt5
+from order_submission import submit_order
+from order_templates import build_request
+from mt5_connection import require_connection_async
+from session_calendar import require_open
 import asyncio
 
 logger = logging.getLogger("Channel2")
@@ -19,70 +23,77 @@ def calculate_lot_size(risk_percent, balance, sl_price, entry_price, total_order
     lot_size = round(lot_size / step) * step
     return round(lot_size, 2)
 
+def parse_channel_2_signal(message):
+    """Tolka en Kanal 2-signal till (action, symbol, zone, sl_price, tp_prices)."""
+    lines = [line.strip().lower() for line in message.strip().split("\n") if line.strip()]
+    logger.info("Processed lines: %s", lines)
+
+    # Kontrollera att signalen har minst 5 rader
+    if len(lines) < 5:
+        raise ValueError(f"Signal format invalid: Not enough lines in the message ({len(lines)} lines).")
+
+    # Kontrollera action (Buy/Sell)
+    action = "SELL" if "sell" in lines[1] else "BUY" if "buy" in lines[1] else None
+    if not action:
+        raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
+
+    # Kontrollera symbol (Gold)
+    symbol = "XAUUSD" if "gold" in lines[1] else None
+    if not symbol:
+        raise ValueError("Invalid signal format: Missing symbol 'Gold'.")
+
+    # Extrahera zon
+    try:
+        zone_line = lines[1].split("zone")[1].strip()
+        zone = list(map(float, zone_line.replace(" ", "").strip("<>").split("-")))
+        if len(zone) != 2:
+            raise ValueError(f"Zone parsing failed: {zone}")
+    except Exception as e:
+        raise ValueError(f"Error parsing zone: {e}")
+
+    # Extrahera SL och TP
+    try:
+        sl_price = float(lines[2].split(":")[1].strip())
+    except IndexError:
+        raise ValueError(f"Stop Loss line missing or invalid: {lines[2]}")
+    except ValueError:
+        raise ValueError(f"Stop Loss format invalid: {lines[2]}")
+
+    tp_prices = []
+    for tp_line in lines[3:]:
+        if "take profit" in tp_line or "tp" in tp_line:
+            try:
+                # Extrahera värdet efter ":", ta bort eventuella mellanslag
+                tp_value = tp_line.split(":")[1].strip()
+                tp_prices.append(float(tp_value))
+            except Exception as e:
+                logger.warning("Skipping invalid TP line: %s (%s)", tp_line, e)
+
+    if not tp_prices:
+        raise ValueError("No valid Take Profit levels found.")
+
+    return action, symbol, zone, sl_price, tp_prices
+
 async def process_channel_2_signal(message, mt5_path):
     """Processa inkommande signaler från Telegram och hantera orderläggning."""
     try:
-        lines = [line.strip().lower() for line in message.strip().split("\n") if line.strip()]
-        logger.info(f"Processed lines: {lines}")
-
-        # Kontrollera att signalen har minst 5 rader
-        if len(lines) < 5:
-            raise ValueError(f"Signal format invalid: Not enough lines in the message ({len(lines)} lines).")
-
-        # Kontrollera action (Buy/Sell)
-        action = "SELL" if "sell" in lines[1] else "BUY" if "buy" in lines[1] else None
-        if not action:
-            raise ValueError("Invalid signal format: Missing 'Sell' or 'Buy'.")
-
-        # Kontrollera symbol (Gold)
-        symbol = "XAUUSD" if "gold" in lines[1] else None
-        if not symbol:
-            raise ValueError("Invalid signal format: Missing symbol 'Gold'.")
-
-        # Extrahera zon
-        try:
-            zone_line = lines[1].split("zone")[1].strip()
-            zone = list(map(float, zone_line.replace(" ", "").strip("<>").split("-")))
-            if len(zone) != 2:
-                raise ValueError(f"Zone parsing failed: {zone}")
-        except Exception as e:
-            raise ValueError(f"Error parsing zone: {e}")
-
-        # Extrahera SL och TP
-        try:
-            sl_price = float(lines[2].split(":")[1].strip())
-        except IndexError:
-            raise ValueError(f"Stop Loss line missing or invalid: {lines[2]}")
-        except ValueError:
-            raise ValueError(f"Stop Loss format invalid: {lines[2]}")
-
-        tp_prices = []
-        for tp_line in lines[3:]:
-            if "take profit" in tp_line or "tp" in tp_line:
-                try:
-                    # Extrahera värdet efter ":", ta bort eventuella mellanslag
-                    tp_value = tp_line.split(":")[1].strip()
-                    tp_prices.append(float(tp_value))
-                except Exception as e:
-                    logger.warning(f"Skipping invalid TP line: {tp_line} ({e})")
-
-        if not tp_prices:
-            raise ValueError("No valid Take Profit levels found.")
+        action, symbol, zone, sl_price, tp_prices = parse_channel_2_signal(message)
 
         # Initialize MT5
-        ensure_mt5_initialized(mt5_path)
+        await require_connection_async(mt5_path)
+        require_open(symbol)  # Stängd marknad: avvisa innan några order byggs
 
         # Placera pending orders inom zonen
         orders = await asyncio.to_thread(
             place_orders_within_zone, action, symbol, zone, sl_price, tp_prices, logger, total_orders=5
         )
-        logger.info(f"Pending orders placed: {orders}")
+        logger.info("Pending orders placed: %s", orders)
 
         # Starta övervakning för TP1
         asyncio.create_task(monitor_positions_for_tp1(symbol, tp_prices[0], logger, offset_pips=1))
 
     except Exception as e:
-        logger.error(f"Error processing signal: {e}")
+        logger.error("Error processing signal: %s", e)
 
 def place_scalping_orders(action, symbol, zone, sl_price, tp1_price, tp2_price, logger):
     """Placera ordrar baserat på signalens parametrar."""
@@ -91,29 +102,26 @@ def place_scalping_orders(action, symbol, zone, sl_price, tp1_price, tp2_price,
     orders = []
 
     for i, tp_price in enumerate([tp1_price, tp2_price]):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_LIMIT if action == "BUY" else mt5.ORDER_TYPE_SELL_LIMIT,
-            "price": current_price,
-            "sl": sl_price,
-            "tp": tp_price,
-            "deviation": 10,
-            "magic": 0,
-            "comment": f"Order_TP{i+1}",
-        }
-        result = mt5.order_send(request)
+        request = build_request(
+            symbol, "pending",
+            type=mt5.ORDER_TYPE_BUY_LIMIT if action == "BUY" else mt5.ORDER_TYPE_SELL_LIMIT,
+            volume=lot_size,
+            price=current_price,
+            sl=sl_price,
+            tp=tp_price,
+            comment=f"Order_TP{i+1}",
+        )
+        result = submit_order(request)
         if result.retcode == mt5.TRADE_RETCODE_DONE:
-            logger.info(f"Order {request['comment']} placed.")
+            logger.info("Order %s placed.", request['comment'])
             orders.append(request)
         else:
-            logger.error(f"Failed to place order {request['comment']}: {result.retcode}")
+            logger.error("Failed to place order %s: %s", request['comment'], result.retcode)
     return orders
 
 async def monitor_positions_for_tp1(symbol, tp1_price, logger, offset_pips=1):
     """Övervakar priset och uppdaterar SL till BE + 1 pip vid TP1."""
-    logger.info(f"Starting TP1 monitoring for {symbol} at {tp1_price}.")
+    logger.info("Starting TP1 monitoring for %s at %s.", symbol, tp1_price)
     point = mt5.symbol_info(symbol).point
     offset_points = offset_pips * point
 
@@ -122,7 +130,7 @@ async def monitor_positions_for_tp1(symbol, tp1_price, logger, offset_pips=1):
 
         positions = mt5.positions_get(symbol=symbol)
         if not positions:
-            logger.info(f"No active positions to monitor for {symbol}.")
+            logger.info("No active positions to monitor for %s.", symbol)
             return
 
         for position in positions:
@@ -143,23 +151,17 @@ async def monitor_positions_for_tp1(symbol, tp1_price, logger, offset_pips=1):
             if condition_met and position.profit > 0:
                 # Kontrollera om SL redan är korrekt inställd
                 if abs(position.sl - new_sl) < point:  # Om SL är inom 1 punkt av det nya värdet
-                    logger.info(f"SL already set to the correct value for position {position.ticket}.")
+                    logger.info("SL already set to the correct value for position %s.", position.ticket)
                     continue
 
                 # Uppdatera SL om det behövs
-                request = {
-                    "action": mt5.TRADE_ACTION_SLTP,
-                    "symbol": symbol,
-                    "position": position.ticket,
-                    "sl": new_sl,
-                    "tp": position.tp,
-                    "magic": position.magic,
-                }
-                result = mt5.order_send(request)
-                if result.retcode == mt5.TRADE_RETCODE_DONE:
-                    logger.info(f"Updated SL for position {position.ticket} to {new_sl}.")
+                request = build_request(symbol, "sltp", position=position.ticket, sl=new_sl, tp=position.tp,
+                                        magic=position.magic)
+                result = await asyncio.to_thread(submit_order, request)
+                if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                    logger.info("Updated SL for position %s to %s.", position.ticket, new_sl)
                 else:
-                    logger.error(f"Failed to update SL for position {position.ticket}: {result.retcode}")
+                    logger.error("Failed to update SL for position %s: %s", position.ticket, result.retcode if result else 'no response')
 
 def place_orders_within_zone(action, symbol, zone, sl_price, tp_prices, logger, total_orders=4):
     """Place limit orders evenly within the zone with improved validation for stops."""
@@ -182,38 +184,35 @@ def place_orders_within_zone(action, symbol, zone, sl_price, tp_prices, logger,
         for i in range(total_orders):
             entry_price = zone[0] + i * order_distance
             if i >= len(tp_prices):
-                logger.warning(f"Skipping TP for order {i+1}: No valid TP provided.")
+                logger.warning("Skipping TP for order %s: No valid TP provided.", i+1)
                 continue
             tp_price = tp_prices[i]
 
             if abs(entry_price - sl_price) < stops_level:
-                logger.error(f"Limit order not placed: SL too close to entry price {entry_price}. Required: {stops_level}")
+                logger.error("Limit order not placed: SL too close to entry price %s. Required: %s", entry_price, stops_level)
                 continue
             if abs(tp_price - entry_price) < stops_level:
-                logger.error(f"Limit order not placed: TP too close to entry price {entry_price}. Required: {stops_level}")
+                logger.error("Limit order not placed: TP too close to entry price %s. Required: %s", entry_price, stops_level)
                 continue
 
-            request = {
-                "action": mt5.TRADE_ACTION_PENDING,
-                "symbol": symbol,
-                "volume": lot_size,
-                "type": mt5.ORDER_TYPE_SELL_LIMIT if action == "SELL" else mt5.ORDER_TYPE_BUY_LIMIT,
-                "price": entry_price,
-                "sl": sl_price,
-                "tp": tp_price,
-                "deviation": 10,
-                "magic": 0,
-                "comment": f"Order_TP{i+1}",
-            }
-            result = mt5.order_send(request)
+            request = build_request(
+                symbol, "pending",
+                type=mt5.ORDER_TYPE_SELL_LIMIT if action == "SELL" else mt5.ORDER_TYPE_BUY_LIMIT,
+                volume=lot_size,
+                price=entry_price,
+                sl=sl_price,
+                tp=tp_price,
+                comment=f"Order_TP{i+1}",
+            )
+            result = submit_order(request)
             if result.retcode == mt5.TRADE_RETCODE_DONE:
-                logger.info(f"Order {request['comment']} placed successfully.")
+                logger.info("Order %s placed successfully.", request['comment'])
                 orders.append({"price": entry_price, "volume": lot_size, "tp": tp_price, "comment": f"Order_TP{i+1}"})
             else:
-                logger.error(f"Failed to place order {request['comment']}: {result.retcode}")
+                logger.error("Failed to place order %s: %s", request['comment'], result.retcode)
 
         return orders
 
     except Exception as e:
-        logger.error(f"Error in placing orders within zone: {e}")
+        logger.error("Error in placing orders within zone: %s", e)
         return []
@@ -1,23 +1,26 @@
+import asyncio
 import logging
 import MetaTrader5 as mt5
+import bar_store
+from order_submission import submit_order
+from order_templates import build_request
+from mt5_connection import require_connection_async
+from session_calendar import require_open
+import symbol_index
 import math
 
 logger = logging.getLogger("Channel3")
 
-SYMBOL_MAP = {
-    "US30": "DJ30",  # Mappa US30 till DJ30
-}
-
 def map_symbol(symbol):
-    """Mappa symbol till broker-specifik symbol om det behövs."""
-    return SYMBOL_MAP.get(symbol, symbol)  # Returnera mappad symbol eller originalet
+    """Mappa symbol till broker-specifik symbol (alias och suffix via symbol_index), None om den saknas."""
+    return symbol_index.resolve(symbol)
 
 
 def calculate_atr(symbol, period=14):
     """
     Beräkna ATR (Average True Range) i pips för en given symbol och period.
     """
-    rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_H1, 0, period + 1)
+    rates = bar_store.bars(symbol, mt5.TIMEFRAME_H1, period + 1, include_current=True)
     if rates is None or len(rates) < period + 1:
         raise ValueError(f"Not enough data to calculate ATR for {symbol}. Ensure sufficient historical data.")
 
@@ -77,31 +80,37 @@ def calculate_lot_size(balance, risk_percentage, atr, symbol, sl_distance):
     rounded_lot_size = max(min_lot, round(lot_size / step_lot) * step_lot)
 
     # Logga mellanresultat för felsökning
-    logger.info(f"Calculated lot size for {symbol}:")
-    logger.info(f"  Balance: {balance}, Risk Percentage: {risk_percentage}%, Risk Amount: {risk_amount}")
-    logger.info(f"  ATR: {atr}, SL Distance: {sl_distance}")
-    logger.info(f"  Point: {point}, Contract Size: {contract_size}, Pip Value per Contract: {pip_value_per_contract}")
-    logger.info(f"  Lot Size (rounded): {rounded_lot_size}")
+    logger.info("Calculated lot size for %s:", symbol)
+    logger.info("  Balance: %s, Risk Percentage: %s%%, Risk Amount: %s", balance, risk_percentage, risk_amount)
+    logger.info("  ATR: %s, SL Distance: %s", atr, sl_distance)
+    logger.info("  Point: %s, Contract Size: %s, Pip Value per Contract: %s", point, contract_size, pip_value_per_contract)
+    logger.info("  Lot Size (rounded): %s", rounded_lot_size)
 
     return rounded_lot_size
 
 
 
+def parse_channel_3_signal(message):
+    """Tolka action och broker-symbol från en Kanal 3-signal."""
+    lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
+    logger.info("Processed lines from Channel 3: %s", lines)
+
+    action_line = lines[0].lower()
+    action = "BUY" if "buy" in action_line else "SELL" if "sell" in action_line else None
+    raw_symbol = action_line.split()[1].upper()
+    symbol = map_symbol(raw_symbol)
+    if not symbol:
+        raise ValueError(f"Unrecognized symbol {raw_symbol}.")
+    return action, symbol
+
+
 async def process_channel_3_signal(message, mt5_path):
     """Processa inkommande signaler från Kanal 3."""
     try:  # Korrekt indentering av try-blocket
-        if not mt5.initialize(mt5_path):
-            raise RuntimeError(f"Failed to initialize MT5 at path {mt5_path}")
-
-        lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
-        logger.info(f"Processed lines from Channel 3: {lines}")
+        await require_connection_async(mt5_path)
 
-        action_line = lines[0].lower()
-        action = "BUY" if "buy" in action_line else "SELL" if "sell" in action_line else None
-        raw_symbol = action_line.split()[1].upper()
-        symbol = map_symbol(raw_symbol)
-        if not symbol:
-            raise ValueError(f"Unrecognized symbol {raw_symbol}.")
+        action, symbol = parse_channel_3_signal(message)
+        require_open(symbol)  # Stängd marknad: avvisa innan ATR och marginal räknas
 
         # Hämta tickdata
         tick = mt5.symbol_info_tick(symbol)
@@ -111,7 +120,7 @@ async def process_channel_3_signal(message, mt5_path):
 
         # Beräkna ATR
         atr = calculate_atr(symbol)
-        logger.info(f"ATR for {symbol}: {atr}")
+        logger.info("ATR for %s: %s", symbol, atr)
 
         # SL och TP
         sl_distance = atr * 1.5
@@ -135,28 +144,28 @@ async def process_channel_3_signal(message, mt5_path):
             raise ValueError(f"Lot size {lot_size} outside allowed range: {symbol_info.volume_min} - {symbol_info.volume_max}")
 
         # Skapa och skicka order
-        order = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY if action == "BUY" else mt5.ORDER_TYPE_SELL,
-            "price": current_price,
-            "sl": sl,
-            "tp": tp,
-            "deviation": 500,
-            "magic": 0,
-            "comment": "Channel3_Signal",
-        }
-        logger.info(f"Placing order: {order}")
-        result = mt5.order_send(order)
-        if result.retcode == mt5.TRADE_RETCODE_DONE:
-            logger.info(f"Order placed successfully for {symbol} ({action}): {result}")
+        order = build_request(
+            symbol, "deal",
+            type=mt5.ORDER_TYPE_BUY if action == "BUY" else mt5.ORDER_TYPE_SELL,
+            volume=lot_size,
+            price=current_price,
+            sl=sl,
+            tp=tp,
+            deviation=500,
+            comment="Channel3_Signal",
+        )
+        logger.info("Placing order: %s", order)
+        result = await asyncio.to_thread(submit_order, order)
+        if result is None:
+            logger.error("No response placing order for %s (%s).", symbol, action)
+        elif result.retcode == mt5.TRADE_RETCODE_DONE:
+            logger.info("Order placed successfully for %s (%s). Ticket: %s, Price: %s", symbol, action, result.order, result.price)
         else:
-            logger.error(f"Failed to place order: Retcode={result.retcode}, Description={mt5.last_error()}")
+            logger.error("Failed to place order: Retcode=%s, Description=%s", result.retcode, mt5.last_error())
 
     except ValueError as ve:
-        logger.error(f"ValueError: {ve}")
+        logger.error("ValueError: %s", ve)
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
 
 
@@ -2,360 +2,403 @@
 import MetaTrader5 as mt5
 import asyncio
 import time  # För tidskontroll i throttling
-from settings import EMA_PERIOD, Trendorders
+from operator import attrgetter
+from settings import EMA_PERIOD, Trendorders, SIGNAL_COALESCE_WINDOW
 from communication import (
-    update_queue,
+    gui_updates,
     hedged_positions,
     original_orders_per_symbol,
     hedge_orders_per_symbol
 )
 import logging
-import os  # För att använda miljövariabeln eller en flagga för testläge
-
-# Skapa logger
+import numpy as np
+from logging_setup import bind_log_context
+import trend_engine
+from strategy import TREND, required_ema_position
+from position_book import build_position_book, counts_per_symbol, loss_candidates, original_directions
+from order_submission import submit_order, market_price
+from order_rate_limiter import HEDGE
+from mt5_tape import mark
+import signal_coalescer
+from order_templates import build_request, template
+from mt5_connection import require_connection_async
+from session_calendar import require_open, is_tradable
+import symbol_index
+from symbol_state import partition, symbol_lock, symbols_locked, generations
+
+# Skapa logger (handlers konfigureras centralt i logging_setup)
 logger = logging.getLogger("Channel4")
 
-# Standard loggnivå
-log_level = logging.INFO
-
-# Kontrollera om vi är i testläge (kan sättas via en miljövariabel eller en flagga)
-if os.getenv('TEST_MODE', 'False') == 'True':
-    # Om vi är i testläge, logga till en fil
-    handler = logging.FileHandler('test_log.log')  # Loggar till filen test_log.log
-else:
-    # Annars loggas till standard utmatning (som konsolen)
-    handler = logging.StreamHandler()
-
-# Ange loggnivå och formattering
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.setLevel(log_level)
-
-SYMBOL_MAP = {
-    "US30": "DJ30",  # Mappa US30 till DJ30
-}
-
-# Global ordbok för att lagra trender per symbol
-current_trends = {}
 # Variabel för att hålla koll på om monitor_equity är igång
 monitoring_equity = False
-# Global dictionary för att logga senaste varningstid per symbol
-hedge_warning_logged = {}
-# En global lista eller dict för att hålla reda på den senaste orginalordern per symbol
-last_original_order_per_symbol = {}
 # En global dictionary för att koppla hedgeorder till orginalorder
 hedge_orders_per_original = {}
 
 def map_symbol(symbol):
-    """Mappa symbol till broker-specifik symbol om det behövs."""
-    return SYMBOL_MAP.get(symbol, symbol)
+    """Mappa symbol till broker-specifik symbol (alias och suffix via symbol_index), None om den saknas."""
+    return symbol_index.resolve(symbol)
 
 def get_trend(symbol):
     """Hämtar aktuell trend för en symbol."""
     mapped_symbol = map_symbol(symbol)  # Mappa symbolen
-    trend = current_trends.get(mapped_symbol, "UNKNOWN")
-    logger.info(f"Current trend for {mapped_symbol}: {trend}")
+    state = trend_engine.get_state(mapped_symbol)  # Publiceras av trendmotorn, None om inaktuellt
+    trend = state["trend"] if state else "UNKNOWN"
+    logger.info("Current trend for %s: %s", mapped_symbol, trend)
     return trend
 
 def calculate_ema(symbol, period=EMA_PERIOD, timeframe=mt5.TIMEFRAME_M1):
-    """Beräkna EMA för en given symbol och period."""
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, period + 1)
-    if rates is None or len(rates) < period + 1:
-        raise ValueError(f"Not enough data to calculate EMA for {symbol}.")
-
-    close_prices = [rate[4] for rate in rates]  # Hämta stängningspriser
-    multiplier = 2 / (period + 1)
-    ema = close_prices[0]  # Initiera EMA med första stängningspriset
-
-    for price in close_prices[1:]:
-        ema = (price - ema) * multiplier + ema
-
-    return ema
+    """Beräkna EMA för en given symbol och period, med samma stängda barer och SMA-start som trendmotorn."""
+    return trend_engine.calculate(symbol, timeframe, period)
 
-def check_price_vs_ema(symbol, timeframe=mt5.TIMEFRAME_M1):
+def check_price_vs_ema(symbol, timeframe=mt5.TIMEFRAME_M1, period=EMA_PERIOD):
     """
     Kontrollera om aktuellt pris är över eller under EMA och returnera resultatet.
 
     Returnerar:
         dict: {'position': 'above' eller 'below', 'ema': <ema-värde>, 'price': <aktuellt pris>}
     """
-    ema = calculate_ema(symbol, period=EMA_PERIOD, timeframe=timeframe)
+    # Läs EMA från trendmotorn (konstant tid); räkna bara om från historiken om den saknas eller är inaktuell
+    ema = trend_engine.get_ema(symbol, "M1") if timeframe == mt5.TIMEFRAME_M1 and period == EMA_PERIOD else None
+    if ema is None:
+        ema = calculate_ema(symbol, period=period, timeframe=timeframe)
     tick = mt5.symbol_info_tick(symbol)
     if tick is None:
         raise ValueError(f"Failed to retrieve tick data for {symbol}.")
     current_price = (tick.ask + tick.bid) / 2  # Medelpris
 
     position = "above" if current_price > ema else "below"
-    logger.info(f"Current Price: {current_price}, EMA({EMA_PERIOD}): {ema}, Position: {position}")
+    logger.info("Current Price: %s, EMA(%s): %s, Position: %s", current_price, period, ema, position)
     return {"position": position, "ema": ema, "price": current_price}
 
-async def process_channel_4_signal(message, mt5_path):
-    """Processa inkommande signaler från Kanal 4 med EMA-villkor och equity-övervakning."""
-    global monitoring_equity
+def parse_channel_4_signal(message):
+    """
+    Tolka ordertyp och symbol från ett meddelande i Kanal 4.
+
+    Returnerar:
+        tuple: (action, action_line, symbol) eller None om meddelandet inte kunde tolkas.
+    """
+    # Extrahera ordertyp och symbol från meddelandet
+    lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
+    if not lines:
+        logger.error("Received empty message.")
+        return None
+
+    action_line = lines[0].strip().upper()
+    if "BUY" in action_line:
+        action = mt5.ORDER_TYPE_BUY
+    elif "SELL" in action_line:
+        action = mt5.ORDER_TYPE_SELL
+    else:
+        logger.error("Unknown action in message: %s", action_line)
+        return None
 
+    # Hämta symbol från meddelandet
     try:
-        logger.info("Initializing MetaTrader 5...")
-        if not mt5.initialize(mt5_path):
-            raise RuntimeError(f"Failed to initialize MT5 at path {mt5_path}")
+        raw_symbol = action_line.split()[1].upper().rstrip(":")
+    except IndexError:
+        logger.error("Failed to parse symbol from message: %s", action_line)
+        return None
+    symbol = map_symbol(raw_symbol)
+    if symbol is None:
+        logger.error("Symbol %s is not offered by the broker.", raw_symbol)
+        return None
+
+    return action, action_line, symbol
+
+def signal_price_reference(message):
+    """Returnera (symbol, ENTRY-pris) från en Kanal 4-signal, eller None om något saknas."""
+    parsed = parse_channel_4_signal(message)
+    if parsed is None:
+        return None
+    for line in message.upper().split("\n"):
+        if line.strip().startswith("ENTRY"):
+            try:
+                return parsed[2], float(line.split(":", 1)[1].strip())
+            except (IndexError, ValueError):
+                return None
+    return None
+
+def find_affordable_lot_size(action, symbol, symbol_info, price, lot_size, free_margin):
+    """Minska lotstorleken stegvis tills den fria marginalen räcker (eller volume_min underskrids)."""
+    while lot_size >= symbol_info.volume_min:
+        required_margin = mt5.order_calc_margin(action, symbol, lot_size, price)
+        if free_margin >= required_margin:
+            break
+        lot_size = round(lot_size - symbol_info.volume_step, 2)
+    return lot_size
+
+async def process_channel_4_signal(message, mt5_path, params=TREND, ema_check=None):
+    """
+    Processa inkommande signaler från Kanal 4 med EMA-villkor och equity-övervakning.
 
-        logger.info(f"Processing message: {message}")
+    ema_check kan skickas in (resultat från check_price_vs_ema) när anroparen redan har
+    läst marknaden, t.ex. shadow_engine som delar en ögonblicksbild mellan varianter.
+    """
+    global monitoring_equity
 
-        # Extrahera ordertyp och symbol från meddelandet
-        lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
-        if not lines:
-            logger.error("Received empty message.")
-            return
+    try:
+        await require_connection_async(mt5_path)
 
-        action_line = lines[0].strip().upper()
-        if "BUY" in action_line:
-            action = mt5.ORDER_TYPE_BUY
-        elif "SELL" in action_line:
-            action = mt5.ORDER_TYPE_SELL
-        else:
-            logger.error(f"Unknown action in message: {action_line}")
-            return
+        logger.info("Processing message: %s", message)
 
-        # Hämta symbol från meddelandet
-        try:
-            symbol = map_symbol(action_line.split()[1].upper().rstrip(":"))
-        except IndexError:
-            logger.error(f"Failed to parse symbol from message: {action_line}")
+        parsed = parse_channel_4_signal(message)
+        if parsed is None:
             return
-
-        logger.info(f"Parsed symbol: {symbol}")
-
-        # Kontrollera om symbol är synlig
-        symbol_info = mt5.symbol_info(symbol)
-        if not symbol_info or not symbol_info.visible:
-            raise ValueError(f"Symbol {symbol} is not available or not visible in MetaTrader 5.")
-
-        # Kontrollera EMA-filter
-        ema_check = check_price_vs_ema(symbol)
-        current_price = ema_check["price"]
-
-        # Introducera en variabel för att avgöra ordertyp i kommentaren
-        is_trend_order = False
-
-        # Ändring start:
-        # Om Trendorders = True och symbolen har hedge, skippa vanlig EMA-logik
-        # (Trendorder tillåts oavsett EMA-läge)
-        if Trendorders and symbol in hedged_positions:
-            is_trend_order = True
-            logger.info(f"Trend order allowed for {action_line} on {symbol}.")
-        else:
-            # Ny logik för originalorder:
-            # BUY endast om position == "above"
-            # SELL endast om position == "below"
-            if action == mt5.ORDER_TYPE_BUY and ema_check["position"] != "above":
-                logger.warning(f"BUY signal rejected: Price is not above EMA för {symbol}.")
-                return
-            elif action == mt5.ORDER_TYPE_SELL and ema_check["position"] != "below":
-                logger.warning(f"SELL signal rejected: Price is not below EMA för {symbol}.")
+        action, action_line, symbol = parsed
+
+        bind_log_context(symbol=symbol)
+        logger.info("Parsed symbol: %s", symbol)
+        require_open(symbol)  # Stängd marknad: avvisa innan EMA, marginal och order_send
+
+        # Samla signaler på symbolen under fönstret och netta dem till en order (av om fönstret är 0)
+        window = SIGNAL_COALESCE_WINDOW.get(params.name)
+        volume_factor = 1
+        if window:
+            closed = await signal_coalescer.coalesce(params.name, symbol, 1 if action == mt5.ORDER_TYPE_BUY else -1,
+                                                     action_line, window)
+            if closed is None:
+                return  # Räknades in i ett redan öppet fönster
+            if closed.net == 0:
+                logger.info("Signals on %s netted out within the window; no order.", symbol)
+                signal_coalescer.record_result(params.name, closed, False)
                 return
+            direction = 1 if closed.net > 0 else -1
+            action = mt5.ORDER_TYPE_BUY if direction > 0 else mt5.ORDER_TYPE_SELL
+            action_line = closed.last_line[direction]
+            volume_factor = abs(closed.net)
+            if closed.signals > 1:
+                ema_check = None  # Marknadsläsningen är äldre än fönstret
+
+        # Signaler på samma symbol körs i ordning; andra symboler kan processas samtidigt
+        async with symbol_lock(symbol):
+            ticket = await asyncio.to_thread(place_signal_order, action, action_line, symbol, params, ema_check,
+                                             volume_factor)
+            placed = ticket is not None
+            if placed:
+                record_original_order(symbol, ticket)
+        if window:
+            signal_coalescer.record_result(params.name, closed, placed)
+
+        # Kontrollera om monitor_equity är igång, och starta den om den inte är det
+        if placed and not monitoring_equity:
+            monitoring_equity = True
+            asyncio.create_task(supervise_monitor_equity(params))
 
-            logger.info(f"Signal passed EMA filter: {action_line}. EMA={ema_check['ema']}, Price={current_price}")
+    except Exception as e:
+        logger.error("Error processing channel 4 signal: %s", e)
 
-            # Kontrollera Trendorders-inställning om vi inte redan är i trend-läget
-            if not Trendorders and symbol in hedged_positions:
-                logger.info(f"Order rejected due to active hedge on {symbol} and Trendorders=False.")
-                return
-        # Ändring slut
 
-        # Nu skall ordern läggas. Bestäm kommentaren beroende på ordertyp
-        if is_trend_order:
-            order_comment = "Trendorder"
-        else:
-            # Om det inte är en trendorder, är det en original-order
-            order_comment = "Original_order"
+def place_signal_order(action, action_line, symbol, params=TREND, ema_check=None, volume_factor=1):
+    """
+    Kontrollera EMA-filtret och lägg ordern för en tolkad signal (blockerande; körs med symbolens lås).
 
-        # Använd fast lotstorlek
-        fixed_lot_size = 0.1
-        logger.info(f"Using fixed lot size: {fixed_lot_size}")
+    volume_factor multiplicerar lotstorleken (nettot av signalerna i ett samlingsfönster).
+    Returnerar ticket för den lagda ordern, annars None. Räknarna uppdateras inte här utan av
+    anroparen på event-loopen (record_original_order).
+    """
+    # Kontrollera om symbol är synlig (uppslagning i symbolindexet, inget terminalanrop)
+    if not symbol_index.is_selected(symbol):
+        raise ValueError(f"Symbol {symbol} is not available or not visible in MetaTrader 5.")
+    symbol_info = template(symbol)  # Volymgränser från den cachade ordermallen
+
+    # Kontrollera EMA-filter
+    if ema_check is None:
+        ema_check = check_price_vs_ema(symbol, period=params.ema_period)
+    current_price = ema_check["price"]
+
+    # Introducera en variabel för att avgöra ordertyp i kommentaren
+    is_trend_order = False
+
+    # Ändring start:
+    # Om Trendorders = True och symbolen har hedge, skippa vanlig EMA-logik
+    # (Trendorder tillåts oavsett EMA-läge)
+    if Trendorders and symbol in hedged_positions:
+        is_trend_order = True
+        logger.info("Trend order allowed for %s on %s.", action_line, symbol)
+    else:
+        # Originalorder godtas bara om priset ligger på rätt sida om EMA enligt strategins regel
+        # (trend: BUY över / SELL under, countertrend: tvärtom)
+        required_position = required_ema_position(params, action == mt5.ORDER_TYPE_BUY)
+        if ema_check["position"] != required_position:
+            logger.warning("%s signal rejected: Price is not %s EMA för %s.",
+                           'BUY' if action == mt5.ORDER_TYPE_BUY else 'SELL', required_position, symbol)
+            return None
+
+        logger.info("Signal passed EMA filter: %s. EMA=%s, Price=%s", action_line, ema_check['ema'], current_price)
+
+        # Kontrollera Trendorders-inställning om vi inte redan är i trend-läget
+        if not Trendorders and symbol in hedged_positions:
+            logger.info("Order rejected due to active hedge on %s and Trendorders=False.", symbol)
+            return None
+    # Ändring slut
+
+    # Nu skall ordern läggas. Bestäm kommentaren beroende på ordertyp
+    if is_trend_order:
+        order_comment = "Trendorder"
+    else:
+        # Om det inte är en trendorder, är det en original-order
+        order_comment = "Original_order"
 
-        account_info = mt5.account_info()
-        if account_info is None:
-            logger.error("Failed to fetch account info.")
-            return
+    # Använd fast lotstorlek
+    fixed_lot_size = round(params.fixed_lot_size * volume_factor, 2)
+    logger.info("Using fixed lot size: %s", fixed_lot_size)
 
-        free_margin = account_info.margin_free
+    account_info = mt5.account_info()
+    if account_info is None:
+        logger.error("Failed to fetch account info.")
+        return None
 
-        while fixed_lot_size >= symbol_info.volume_min:
-            required_margin = mt5.order_calc_margin(action, symbol, fixed_lot_size, current_price)
-            if free_margin >= required_margin:
-                break
-            fixed_lot_size = round(fixed_lot_size - symbol_info.volume_step, 2)
+    free_margin = account_info.margin_free
 
-        if fixed_lot_size < symbol_info.volume_min:
-            raise ValueError(f"Insufficient margin for minimum lot size {symbol_info.volume_min}. Free={free_margin}")
+    fixed_lot_size = find_affordable_lot_size(action, symbol, symbol_info, current_price, fixed_lot_size, free_margin)
 
-        logger.info(f"Final Lot Size: {fixed_lot_size}")
+    if fixed_lot_size < symbol_info.volume_min:
+        raise ValueError(f"Insufficient margin for minimum lot size {symbol_info.volume_min}. Free={free_margin}")
 
-        order = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": fixed_lot_size,
-            "type": action,
-            "price": current_price,
-            "deviation": 20,
-            "magic": 0,
-            "comment": order_comment,
-            "type_filling": mt5.ORDER_FILLING_IOC,
-        }
+    logger.info("Final Lot Size: %s", fixed_lot_size)
 
-        result = mt5.order_send(order)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.error(f"Failed to place order for {symbol}. Error: {result.retcode}, Comment: {result.comment}")
-        else:
-            logger.info(f"Successfully placed {'BUY' if action == mt5.ORDER_TYPE_BUY else 'SELL'} order for {symbol}. Ticket: {result.order}")
+    # Fyll på rätt sida av spreaden (ask för BUY, bid för SELL), inte mittpriset som EMA-filtret använder
+    order_price = market_price(symbol, action) or current_price
 
-            # Spara den senaste orginalordern i dictionaryn
-            last_original_order_per_symbol[symbol] = result.order
-            logger.debug(f"Last original order for {symbol}: {last_original_order_per_symbol[symbol]}")
+    order = build_request(symbol, "deal", type=action, volume=fixed_lot_size, price=order_price, comment=order_comment)
 
-            # Öka antalet originalorder per symbol
-            original_orders_per_symbol[symbol] += 1
-            logger.debug(f"Original orders for {symbol}: {original_orders_per_symbol[symbol]}")
+    result = submit_order(order)
+    if result.retcode != mt5.TRADE_RETCODE_DONE:
+        logger.error("Failed to place order for %s. Error: %s, Comment: %s", symbol, result.retcode, result.comment)
+    else:
+        logger.info("Successfully placed %s order for %s. Ticket: %s", 'BUY' if action == mt5.ORDER_TYPE_BUY else 'SELL', symbol, result.order,
+                    extra={"ticket": result.order})
+        return result.order
+    return None
 
-            # Kontrollera om monitor_equity är igång, och starta den om den inte är det
-            if not monitoring_equity:
-                monitoring_equity = True
-                asyncio.create_task(supervise_monitor_equity())
 
-    except Exception as e:
-        logger.error(f"Error processing channel 4 signal: {e}")
+def record_original_order(symbol, ticket):
+    """Registrera en lagd originalorder i symbolens partition och räknare (på event-loopen)."""
+    # Spara den senaste orginalordern i symbolens partition
+    part = partition(symbol)
+    part.last_original_order = ticket
+    part.touch()
+    logger.debug("Last original order for %s: %s", symbol, part.last_original_order)
 
+    # Öka antalet originalorder per symbol
+    original_orders_per_symbol[symbol] += 1
+    logger.debug("Original orders for %s: %s", symbol, original_orders_per_symbol[symbol])
 
-async def supervise_monitor_equity():
+
+async def supervise_monitor_equity(params=TREND):
     """Supervisorn som säkerställer att monitor_equity alltid körs."""
     while True:
         try:
-            await monitor_equity()
+            await monitor_equity(params)
         except Exception as e:
-            logger.error(f"monitor_equity crashed: {e}. Restarting in 5 seconds.")
+            logger.error("monitor_equity crashed: %s. Restarting in 5 seconds.", e)
             await asyncio.sleep(5)  # Vänta innan du startar om
             continue
 
 def close_position(position):
-    """Stänger en specifik position."""
+    """
+    Stänger en specifik position (blockerande). Returnerar True om den stängdes; räknarna
+    uppdateras av anroparen på event-loopen (record_closed_position).
+    """
     if not isinstance(position.ticket, int) or position.ticket <= 0:
-        logger.error(f"Invalid ticket number for position: {position}")
-        return
+        logger.error("Invalid ticket number for position: %s", position)
+        return False
 
     order_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
     tick = mt5.symbol_info_tick(position.symbol)
     if not tick:
-        logger.error(f"Failed to retrieve tick data for symbol {position.symbol}. Cannot close position {position.ticket}.")
-        return
+        logger.error("Failed to retrieve tick data for symbol %s. Cannot close position %s.", position.symbol, position.ticket)
+        return False
 
     price = tick.bid if order_type == mt5.ORDER_TYPE_BUY else tick.ask
 
     if price == 0.0:
-        logger.error(f"Failed to retrieve price for symbol {position.symbol}. Cannot close position {position.ticket}.")
-        return
+        logger.error("Failed to retrieve price for symbol %s. Cannot close position %s.", position.symbol, position.ticket)
+        return False
 
-    close_order = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": position.symbol,
-        "volume": position.volume,
-        "type": order_type,
-        "position": position.ticket,  # Korrekt position ticket
-        "price": price,
-        "deviation": 20,  # Minska deviation
-        "magic": 0,
-        "comment": "Close_Position",
-        "type_filling": mt5.ORDER_FILLING_IOC,
-    }
+    close_order = build_request(position.symbol, "deal", type=order_type, volume=position.volume,
+                                position=position.ticket, price=price, comment="Close_Position")
 
     # Logga close_order innan skickning
-    logger.debug(f"Closing order: {close_order}")
+    logger.debug("Closing order: %s", close_order)
 
-    result = mt5.order_send(close_order)
+    result = submit_order(close_order)
 
     # Logga hela resultatet för detaljerad felsökning
-    logger.debug(f"OrderSendResult: retcode={result.retcode}, deal={result.deal}, order={result.order}, volume={result.volume}, price={result.price}, comment='{result.comment}'")
+    logger.debug("OrderSendResult: retcode=%s, deal=%s, order=%s, volume=%s, price=%s, comment='%s'", result.retcode, result.deal, result.order, result.volume, result.price, result.comment)
 
     if result.retcode != mt5.TRADE_RETCODE_DONE:
-        logger.error(f"Failed to close position {position.ticket}. Error: {result.retcode}, Comment: {result.comment}")
+        logger.error("Failed to close position %s. Error: %s, Comment: %s", position.ticket, result.retcode, result.comment)
+        return False
+    logger.info("Successfully closed position %s. Deal: %s, Price: %s", position.ticket, result.deal, result.price,
+                extra={"symbol": position.symbol, "ticket": position.ticket})
+    return True
+
+def record_closed_position(position):
+    """Räkna bort en stängd position från symbolens räknare och hedgekopplingar (på event-loopen)."""
+    # Om det är en originalorder, minska antalet originalorder och hedge-order
+    symbol = position.symbol
+    partition(symbol).touch()
+    if position.ticket in hedged_positions:
+        hedge_ticket = hedged_positions.pop(position.ticket)
+        hedge_orders_per_symbol[symbol] -= 1
+        logger.info("Removed hedge ticket %s for original ticket %s.", hedge_ticket, position.ticket)
+        logger.debug("Hedge orders for %s: %s", symbol, hedge_orders_per_symbol[symbol])
     else:
-        logger.info(f"Successfully closed position {position.ticket}. Result: {result}")
-
-        # Om det är en originalorder, minska antalet originalorder och hedge-order
-        symbol = position.symbol
-        if position.ticket in hedged_positions:
-            hedge_ticket = hedged_positions.pop(position.ticket)
-            hedge_orders_per_symbol[symbol] -= 1
-            logger.info(f"Removed hedge ticket {hedge_ticket} for original ticket {position.ticket}.")
-            logger.debug(f"Hedge orders for {symbol}: {hedge_orders_per_symbol[symbol]}")
-        else:
-            original_orders_per_symbol[symbol] -= 1
-            logger.debug(f"Original orders for {symbol}: {original_orders_per_symbol[symbol]}")
+        original_orders_per_symbol[symbol] -= 1
+        logger.debug("Original orders for %s: %s", symbol, original_orders_per_symbol[symbol])
 
 def close_all_orders():
-    """Stänger alla öppna positioner och verifierar att de stängs."""
+    """
+    Stänger alla öppna positioner (blockerande). Returnerar de positioner som stängdes;
+    räknarna uppdateras av anroparen på event-loopen (record_closed_position).
+    """
+    closed = []
     open_positions = mt5.positions_get()
     if open_positions is None:
         logger.error("Failed to fetch open positions.")
-        return
+        return closed
 
     if len(open_positions) == 0:
         logger.info("No open positions to close.")
-        return
+        return closed
 
     for position in open_positions:
         # Verifiera att position.ticket är giltigt
         if not isinstance(position.ticket, int) or position.ticket <= 0:
-            logger.error(f"Invalid ticket number for position: {position}")
+            logger.error("Invalid ticket number for position: %s", position)
             continue
 
         order_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
         tick = mt5.symbol_info_tick(position.symbol)
         if not tick:
-            logger.error(f"Failed to retrieve tick data for symbol {position.symbol}. Cannot close position {position.ticket}.")
+            logger.error("Failed to retrieve tick data for symbol %s. Cannot close position %s.", position.symbol, position.ticket)
             continue
 
         price = tick.bid if order_type == mt5.ORDER_TYPE_BUY else tick.ask
 
         if price == 0.0:
-            logger.error(f"Failed to retrieve price for symbol {position.symbol}. Cannot close position {position.ticket}.")
+            logger.error("Failed to retrieve price for symbol %s. Cannot close position %s.", position.symbol, position.ticket)
             continue
 
-        close_order = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": position.symbol,
-            "volume": position.volume,
-            "type": order_type,
-            "position": position.ticket,  # Korrekt position ticket
-            "price": price,
-            "deviation": 20,  # Minska deviation
-            "magic": 0,
-            "comment": "Close_Position",
-            "type_filling": mt5.ORDER_FILLING_IOC,
-        }
+        close_order = build_request(position.symbol, "deal", type=order_type, volume=position.volume,
+                                    position=position.ticket, price=price, comment="Close_Position")
 
         # Logga close_order innan skickning
-        logger.debug(f"Closing order: {close_order}")
+        logger.debug("Closing order: %s", close_order)
 
-        result = mt5.order_send(close_order)
+        result = submit_order(close_order)
 
         # Logga hela resultatet för detaljerad felsökning
-        logger.debug(f"OrderSendResult: retcode={result.retcode}, deal={result.deal}, order={result.order}, volume={result.volume}, price={result.price}, comment='{result.comment}'")
+        logger.debug("OrderSendResult: retcode=%s, deal=%s, order=%s, volume=%s, price=%s, comment='%s'", result.retcode, result.deal, result.order, result.volume, result.price, result.comment)
 
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            logger.error(f"Failed to close position {position.ticket}. Error: {result.retcode}, Comment: {result.comment}")
+            logger.error("Failed to close position %s. Error: %s, Comment: %s", position.ticket, result.retcode, result.comment)
         else:
-            logger.info(f"Successfully closed position {position.ticket}. Result: {result}")
-
-            # Om det är en originalorder, minska antalet originalorder och hedge-order
-            symbol = position.symbol
-            if position.ticket in hedged_positions:
-                hedge_ticket = hedged_positions.pop(position.ticket)
-                hedge_orders_per_symbol[symbol] -= 1
-                logger.info(f"Removed hedge ticket {hedge_ticket} for original ticket {position.ticket}.")
-                logger.debug(f"Hedge orders for {symbol}: {hedge_orders_per_symbol[symbol]}")
-            else:
-                original_orders_per_symbol[symbol] -= 1
-                logger.debug(f"Original orders for {symbol}: {original_orders_per_symbol[symbol]}")
+            logger.info("Successfully closed position %s. Deal: %s, Price: %s", position.ticket, result.deal, result.price,
+                    extra={"symbol": position.symbol, "ticket": position.ticket})
+            closed.append(position)
+    return closed
 
 def initialize_order_tracking():
     """Initialisera orderspårning baserat på befintliga öppna positioner."""
@@ -365,212 +408,297 @@ def initialize_order_tracking():
             symbol = position.symbol
             # Antag att varje befintlig position är en originalorder
             original_orders_per_symbol[symbol] += 1
-            logger.info(f"Tracking existing position {position.ticket} for symbol {symbol}.")
-            logger.debug(f"Original orders for {symbol}: {original_orders_per_symbol[symbol]}")
+            logger.info("Tracking existing position %s for symbol %s.", position.ticket, symbol)
+            logger.debug("Original orders for %s: %s", symbol, original_orders_per_symbol[symbol])
 
-async def monitor_equity():
+async def monitor_equity(params=TREND):
     """Övervaka total equity och profit för alla positioner, och hantera hedge-logik."""
-    global monitoring_equity
-    logger.info("Starting equity monitoring...")
-
-    profit_threshold = 10.0  # $10 profit gräns
-    loss_threshold = -20.0  # $10 förlust gräns
-    lot_size = 0.1  # Lotstorlek för hedge-order
+    logger.info("Starting equity monitoring (%s strategy)...", params.name)
 
     while True:
         try:
-            # Hämta öppna positioner
-            open_positions = mt5.positions_get()
-
-            # --- Ny kod start ---
-            # Nollställ alla räknare innan vi räknar om från verkliga data
-            for sym in original_orders_per_symbol.keys():
-                original_orders_per_symbol[sym] = 0
-            for sym in hedge_orders_per_symbol.keys():
-                hedge_orders_per_symbol[sym] = 0
-
-            # Räkna om räknarna baserat på aktuella öppna positioner
-            if open_positions:
-                for position in open_positions:
-                    symbol = position.symbol
-                    # Om positionens ticket finns i hedged_positions.values() så är det en hedge-order
-                    if position.ticket in hedged_positions.values():
-                        hedge_orders_per_symbol[symbol] += 1
-                    else:
-                        original_orders_per_symbol[symbol] += 1
-            # --- Ny kod slut ---
-
-            if not open_positions or len(open_positions) == 0:
-                await update_queue.put({'type': 'label', 'text': "No open positions."})  # Uppdatera GUI via kön
-                logger.info("No open positions. Monitoring paused.")
-                monitoring_equity = False  # Reset flaggan
-                await asyncio.sleep(10)  # Vänta innan du kontrollerar igen
-                continue  # Fortsätt loopen
-
-            # Initialisera: Lägg till öppna positioner som inte redan är spårade
-            # (Denna del är nu mest redundant, då vi redan byggt upp räknarna baserat på öppna positioner
-            #  i koden ovan. Men om du vill behålla logiken för att logga befintliga positioner kan den vara kvar.)
-            for position in open_positions:
-                symbol = position.symbol
-                # Om positionen redan räknats som originalorder behöver vi inte sätta om den,
-                # men om du vill behålla denna logg för debugging kan du låta den vara.
-                if original_orders_per_symbol[symbol] == 0:
-                    original_orders_per_symbol[symbol] = 1
-                    logger.info(f"Tracking existing position {position.ticket} for symbol {symbol}.")
-                    logger.debug(f"Original orders for {symbol}: {original_orders_per_symbol[symbol]}")
-
-            # Hämta total equity och profit
-            account_info = mt5.account_info()
-            if account_info is None:
-                logger.error("Failed to fetch account info.")
-                await asyncio.sleep(10)
-                continue
-
-            equity = account_info.equity
-            balance = account_info.balance
-            total_profit = equity - balance  # Totalt P/L
-
-            # Logga total profit för debugging
-            logger.debug(f"Monitoring Total Equity: Balance={balance:.2f}, Equity={equity:.2f}, Total Profit={total_profit:.2f}")
-
-            # Hantera vinstgräns
-            if total_profit >= profit_threshold:
-                logger.info(f"Total profit reached ${total_profit:.2f}. Closing all orders.")
-                close_all_orders()
-
-                # Verifiera att alla order är stängda
-                remaining_positions = mt5.positions_get()
-                if remaining_positions and len(remaining_positions) > 0:
-                    logger.error("Some positions could not be closed. Continuing monitoring.")
-                else:
-                    logger.info("All positions successfully closed. Stopping monitoring.")
-                monitoring_equity = False  # Reset flaggan
-                await asyncio.sleep(10)  # Vänta innan du kontrollerar igen
-                continue  # Fortsätt loopen
-
-            # Iterera över alla öppna positioner och hantera varje symbol
-            for position in open_positions:
-                # Verifiera att position.ticket är ett positivt heltal
-                if not isinstance(position.ticket, int) or position.ticket <= 0:
-                    logger.error(f"Invalid ticket number for position: {position}")
-                    continue
-
-                symbol = position.symbol
-
-                # Kontrollera om positionen är en hedge-order
-                if position.ticket in hedged_positions.values():
-                    logger.warning(f"Skipping hedge order {position.ticket} from hedging.")
-                    continue  # Hoppa över hedge-order
-
-                position_info = f"Position {position.ticket} ({symbol}) - Profit: {position.profit:.2f}"
-
-                # Hantera förlustgräns för varje position
-                if position.profit <= loss_threshold:
-                    # Kontrollera om vi har möjlighet att placera en hedge för denna symbol
-                    max_allowed_hedges = original_orders_per_symbol[symbol]
-                    current_hedges = hedge_orders_per_symbol[symbol]
-
-                    if max_allowed_hedges > 0:
-                        if current_hedges < max_allowed_hedges:
-                            if position.ticket not in hedged_positions:
-                                logger.info(f"Loss threshold reached for position {position.ticket}. Placing hedge.")
-                                open_hedge_order(lot_size, position)
-                                hedge_orders_per_symbol[symbol] += 1
-                                logger.debug(f"Hedge orders for {symbol}: {hedge_orders_per_symbol[symbol]}")
-                        else:
-                            current_time = time.time()
-                            cooldown_period = 60  # 60 sekunder
-                            last_logged = hedge_warning_logged.get(symbol, 0)
-                            if current_time - last_logged > cooldown_period:
-                                logger.info(f"Cannot place hedge for {symbol}. Max hedge orders reached ({current_hedges}/{max_allowed_hedges}).")
-                                await update_queue.put({'type': 'label', 'text': f"Cannot place hedge for {symbol}. Max hedge orders reached."})
-                                hedge_warning_logged[symbol] = current_time
-                    else:
-                        logger.debug(f"No original orders for {symbol}. Skipping hedge placement.")
-
-                # Uppdatera GUI med ny position och hedgestatus via kön
-                await update_queue.put({'type': 'position_status', 'position': position})
-
+            mark("equity_cycle", strategy=params.name)
+            await run_equity_cycle(params)
         except Exception as e:
-            await update_queue.put({'type': 'label', 'text': f"Error in equity monitoring: {e}"})  # Uppdatera GUI via kön
-            logger.error(f"Error in equity monitoring: {e}")
+            gui_updates.publish_label(f"Error in equity monitoring: {e}")  # Uppdatera GUI
+            logger.error("Error in equity monitoring: %s", e)
 
         await asyncio.sleep(10)  # Vänta 10 sekunder innan nästa kontroll
 
-def open_hedge_order(lot_size, position):
-    """Lägger en hedge-order för en given position, men endast om det finns en originalorder i samma riktning som positionen."""
-    symbol = position.symbol
+async def run_equity_cycle(params=TREND):
+    """Kör ett varv av equity-övervakningen: räkna om order, kontrollera vinstgräns och placera hedgar."""
+    global monitoring_equity
+    profit_threshold = params.profit_threshold
+    loss_threshold = params.loss_threshold
+    lot_size = params.hedge_lot_size
+
+    # Hämta öppna positioner (i en tråd: anropet väntar på MT5_LOCK medan order skickas) och konvertera
+    # dem en gång till en kolumnär positionsbok. Generationerna tas före läsningen och visar senare vilka
+    # symboler som har ändrats sedan ögonblicksbilden togs.
+    snapshot_generations = generations()
+    open_positions = await asyncio.to_thread(mt5.positions_get)
+    book = build_position_book(open_positions, hedged_positions.values())
+
+    # Räkna om order per symbol från verkliga data. Symboler som en signal, hedge eller stängning
+    # håller på med (låst eller ändrad sedan ögonblicksbilden) räknas om nästa varv i stället.
+    original_counts, hedge_counts = counts_per_symbol(book)
+    for sym in set(original_orders_per_symbol) | set(hedge_orders_per_symbol) | set(original_counts):
+        if _symbol_busy(sym, snapshot_generations):
+            continue
+        original_orders_per_symbol[sym] = original_counts.get(sym, 0)
+        hedge_orders_per_symbol[sym] = hedge_counts.get(sym, 0)
 
-    open_positions = mt5.positions_get(symbol=symbol)
-    if open_positions is None:
-        logger.error(f"Failed to fetch positions for {symbol}. Cannot determine hedge eligibility.")
+    if len(book) == 0:
+        gui_updates.publish_label("No open positions.")  # Uppdatera GUI
+        logger.info("No open positions. Monitoring paused.")
+        monitoring_equity = False  # Reset flaggan
         return
 
-    # Istället för att leta efter motsatt riktning letar vi efter originalorder i samma riktning som den förlustposition vi hedgar.
-    # Logik: Om positionen är BUY (förlust), hedge är SELL. Men vi vill försäkra oss om att det finns minst en original-BUY-order.
-    # Om positionen är SELL (förlust), hedge är BUY. Då vill vi att det finns minst en original-SELL-order.
+    # Symboler som bara har hedgeorder räknas ändå som att de har en originalorder
+    for symbol, count in original_counts.items():
+        if count == 0 and not _symbol_busy(symbol, snapshot_generations):
+            original_orders_per_symbol[symbol] = 1
+            logger.info("Tracking existing positions for symbol %s.", symbol)
 
-    original_needed = position.type  # Om position.type är BUY, behövs en BUY original. Om SELL, behövs en SELL original.
-
-    has_required_original = False
-    for pos in open_positions:
-        if pos.ticket not in hedged_positions.values():
-            # Detta är en originalorder
-            if pos.type == original_needed:
-                has_required_original = True
-                break
+    # Hämta total equity och profit
+    account_info = await asyncio.to_thread(mt5.account_info)
+    if account_info is None:
+        logger.error("Failed to fetch account info.")
+        return
 
-    if not has_required_original:
-        logger.info(f"Cannot place hedge order for {symbol}. No original order found in the same direction as the losing position.")
+    equity = account_info.equity
+    balance = account_info.balance
+    total_profit = equity - balance  # Totalt P/L
+
+    # Logga total profit för debugging
+    logger.debug("Monitoring Total Equity: Balance=%.2f, Equity=%.2f, Total Profit=%.2f", balance, equity, total_profit)
+
+    # Hantera vinstgräns
+    if total_profit >= profit_threshold:
+        logger.info("Total profit reached $%.2f. Closing all orders.", total_profit)
+        # Stängningen rör alla symboler: ta alla deras lås (i sorterad ordning) först
+        async with symbols_locked(original_counts):
+            for position in await asyncio.to_thread(close_all_orders):
+                record_closed_position(position)
+
+        # Verifiera att alla order är stängda
+        remaining_positions = await asyncio.to_thread(mt5.positions_get)
+        if remaining_positions and len(remaining_positions) > 0:
+            logger.error("Some positions could not be closed. Continuing monitoring.")
+        else:
+            logger.info("All positions successfully closed. Stopping monitoring.")
+        monitoring_equity = False  # Reset flaggan
         return
 
-    # Nu vet vi att det finns en originalorder i samma riktning, vilket betyder att denna hedge är logiskt giltig.
+    invalid = np.flatnonzero(book["ticket"] <= 0)
+    for index in invalid:
+        logger.error("Invalid ticket number for position: %s", open_positions[index])
 
-    symbol_info = mt5.symbol_info(symbol)
-    tick = mt5.symbol_info_tick(symbol)
-    if symbol_info is None or tick is None:
-        logger.error(f"Failed to retrieve symbol info or tick data for {symbol}.")
-        return
+    # Bara originalpositioner på eller under förlustgränsen behöver hanteras; gruppera dem per symbol
+    # och besluta hedgarna för hela boken i ett pass
+    candidates_per_symbol = {}
+    for index in loss_candidates(book, loss_threshold):
+        position = open_positions[index]
+        candidates_per_symbol.setdefault(position.symbol, []).append(position)
+
+    if candidates_per_symbol:
+        await _hedge_book(candidates_per_symbol, original_directions(book), lot_size, loss_threshold,
+                          snapshot_generations)
+
+    # Uppdatera GUI med alla positioner och hedgestatus i en enda ögonblicksbild
+    gui_updates.publish_positions(open_positions, hedged_positions, (balance, equity))
+
+def _symbol_busy(symbol, snapshot_generations):
+    """Sant om symbolen är låst eller har ändrats sedan ögonblicksbilden togs."""
+    part = partition(symbol)
+    return part.lock.locked() or part.generation != snapshot_generations.get(symbol, 0)
 
-    # Bestäm hedge-typ (motsatt riktning mot positionen)
-    hedge_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-    hedge_price = tick.ask if hedge_type == mt5.ORDER_TYPE_BUY else tick.bid
+async def _hedge_book(candidates_per_symbol, directions, lot_size, loss_threshold, snapshot_generations):
+    """
+    Besluta och placera hedgar för hela bokens förlustpositioner i ett pass, under de berörda symbolernas lås.
+
+    Bara terminalanropen körs i en tråd; räknare och hedgekopplingar läses och ändras på event-loopen.
+    """
+    async with symbols_locked(candidates_per_symbol):
+        stale = [symbol for symbol in candidates_per_symbol
+                 if partition(symbol).generation != snapshot_generations.get(symbol, 0)]
+        if stale:
+            # En signal eller stängning har ändrat symbolerna sedan ögonblicksbilden: läs om just dem
+            fresh = await asyncio.to_thread(_reread_symbols, stale)
+            for symbol, positions in fresh.items():
+                book = _recount(symbol, positions)
+                candidates_per_symbol[symbol] = [positions[index] for index in loss_candidates(book, loss_threshold)]
+                directions[symbol] = original_directions(book).get(symbol, set())
+        eligible, slots, blocked = _plan_hedges(candidates_per_symbol, directions)
+        placed = await asyncio.to_thread(_hedge_batch, eligible, lot_size, slots)
+        _record_hedges(eligible, slots, placed, blocked)
+
+    current_time = time.time()
+    cooldown_period = 60  # 60 sekunder
+    for symbol, (current_hedges, max_allowed_hedges) in blocked.items():
+        part = partition(symbol)
+        if current_time - part.hedge_warning_logged > cooldown_period:
+            logger.info("Cannot place hedge for %s. Max hedge orders reached (%s/%s).", symbol, current_hedges, max_allowed_hedges)
+            gui_updates.publish_label(f"Cannot place hedge for {symbol}. Max hedge orders reached.")
+            part.hedge_warning_logged = current_time
+
+def _reread_symbols(symbols):
+    """Läs om positionerna för ändrade symboler (blockerande). Returnerar {symbol: positioner}."""
+    return {symbol: mt5.positions_get(symbol=symbol) or () for symbol in symbols}
+
+def _recount(symbol, positions):
+    """Räkna om symbolens original- och hedgeorder från terminalens positioner. Returnerar positionsboken."""
+    book = build_position_book(positions, hedged_positions.values())
+    original_counts, hedge_counts = counts_per_symbol(book)
+    original_orders_per_symbol[symbol] = original_counts.get(symbol, 0) or (1 if len(book) else 0)
+    hedge_orders_per_symbol[symbol] = hedge_counts.get(symbol, 0)
+    return book
+
+def _plan_hedges(candidates_per_symbol, directions):
+    """
+    Välj vilka förlustpositioner som får hedgas (på event-loopen, med symbolernas lås).
 
-    required_margin = mt5.order_calc_margin(hedge_type, symbol, lot_size, hedge_price)
+    Returnerar (positioner, lediga platser per symbol, {symbol: (aktuella hedgar, max tillåtna)}
+    för symboler som redan har nått maxgränsen).
+    """
+    blocked = {}
+    eligible = []
+    slots = {}  # symbol -> lediga hedgeplatser
+    for symbol, positions in candidates_per_symbol.items():
+        if not is_tradable(symbol):
+            logger.debug("Market for %s is closed. Skipping hedge placement.", symbol)
+            continue
+        # Kontrollera om vi har möjlighet att placera en hedge för denna symbol
+        max_allowed_hedges = original_orders_per_symbol[symbol]
+        current_hedges = hedge_orders_per_symbol[symbol]
+        if max_allowed_hedges <= 0:
+            logger.debug("No original orders for %s. Skipping hedge placement.", symbol)
+            continue
+        if current_hedges >= max_allowed_hedges:
+            blocked[symbol] = (current_hedges, max_allowed_hedges)
+            continue
+        slots[symbol] = max_allowed_hedges - current_hedges
+        for position in positions:
+            if position.ticket in hedged_positions:
+                continue
+            # Hedgen är bara giltig om det finns en originalorder i samma riktning som förlustpositionen
+            # (BUY på förlust hedgas med SELL och kräver en original-BUY, och tvärtom)
+            if position.type not in directions.get(symbol, ()):
+                logger.info("Cannot place hedge order for %s. No original order found in the same direction as the losing position.", symbol)
+                continue
+            logger.info("Loss threshold reached for position %s. Placing hedge.", position.ticket)
+            eligible.append(position)
+    return eligible, slots, blocked
+
+def _hedge_batch(positions, lot_size, slots):
+    """
+    Reservera marginalen för hedgarna på en gång och skicka dem som en batch (blockerande; körs med
+    symbolernas lås).
+
+    En plats i slots tas först när hedgen köas (marginalen räcker) och släpps igen om ordern inte
+    gick igenom. Returnerar [(position, hedge-ticket)] för de hedgar som lades.
+    """
+    placed = []
+    for position, hedge_order in _reserve_hedges(positions, lot_size, slots):
+        hedge_ticket = _send_hedge(position, hedge_order)
+        if hedge_ticket is None:
+            slots[position.symbol] += 1  # Ordern gick inte igenom: släpp platsen
+        else:
+            placed.append((position, hedge_ticket))
+    return placed
+
+def _record_hedges(eligible, slots, placed, blocked):
+    """Registrera lagda hedgar och markera symboler vars lediga platser tog slut (på event-loopen)."""
+    for position, hedge_ticket in placed:
+        hedged_positions[position.ticket] = hedge_ticket  # Registrera hedge-order
+        hedge_orders_per_symbol[position.symbol] += 1
+        partition(position.symbol).touch()
+    hedged = {position.ticket for position, _ in placed}
+    for position in eligible:
+        symbol = position.symbol
+        if slots[symbol] <= 0 and position.ticket not in hedged:
+            blocked[symbol] = (hedge_orders_per_symbol[symbol], original_orders_per_symbol[symbol])
+    return blocked
+
+def _reserve_hedges(positions, lot_size, slots):
+    """
+    Bygg hedgeorder för positionerna inom den fria marginalen och symbolernas lediga platser
+    (slots, räknas ned), största förlusten först.
+
+    Tick och marginal läses en gång per symbol och riktning, och marginalen reserveras för hela
+    batchen mot ett enda account_info(). Returnerar [(position, order)] i sändordning.
+    """
+    if not positions:
+        return []
     account_info = mt5.account_info()
     if account_info is None:
         logger.error("Failed to fetch account info.")
-        return
+        return []
+    free_margin = budget = account_info.margin_free
 
-    free_margin = account_info.margin_free
-    logger.debug(f"Required Margin: {required_margin}, Free Margin: {free_margin}")
-    if required_margin > free_margin:
-        logger.error("Insufficient margin to place hedge order.")
-        return
-
-    # Lägg hedge-ordern
-    hedge_order = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": symbol,
-        "volume": lot_size,
-        "type": hedge_type,
-        "price": hedge_price,
-        "deviation": 20,
-        "magic": 0,
-        "comment": "Hedge_order",
-        "type_filling": mt5.ORDER_FILLING_IOC,
-    }
+    ticks = {}
+    margins = {}
+    orders = []
+    for position in sorted(positions, key=attrgetter("profit")):
+        symbol = position.symbol
+        if slots[symbol] <= 0:
+            continue
+        if symbol not in ticks:
+            ticks[symbol] = mt5.symbol_info_tick(symbol)
+        tick = ticks[symbol]
+        if tick is None:
+            logger.error("Failed to retrieve tick data for %s.", symbol)
+            continue
 
-    logger.debug(f"Placing hedge order: {hedge_order}")
-    result = mt5.order_send(hedge_order)
+        # Bestäm hedge-typ (motsatt riktning mot positionen)
+        hedge_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
+        hedge_price = tick.ask if hedge_type == mt5.ORDER_TYPE_BUY else tick.bid
+        if (symbol, hedge_type) not in margins:
+            margins[(symbol, hedge_type)] = mt5.order_calc_margin(hedge_type, symbol, lot_size, hedge_price)
+        required_margin = margins[(symbol, hedge_type)]
+        if required_margin is None or required_margin > budget:
+            logger.error("Insufficient margin to place hedge order for %s (required %s, remaining %s).",
+                         symbol, required_margin, budget)
+            continue
+        budget -= required_margin
+        slots[symbol] -= 1
+        orders.append((position, build_request(symbol, "deal", type=hedge_type, volume=lot_size, price=hedge_price,
+                                               comment="Hedge_order")))
+    logger.debug("Hedge batch: %s orders, margin reserved %.2f of %.2f free.", len(orders), free_margin - budget, free_margin)
+    return orders
+
+def _send_hedge(position, hedge_order):
+    """Skicka en hedgeorder med hedgeprioritet. Returnerar hedgens ticket om den lades, annars None."""
+    symbol = position.symbol
+    logger.debug("Placing hedge order: %s", hedge_order)
+    result = submit_order(hedge_order, priority=HEDGE)
 
-    logger.debug(f"OrderSendResult: retcode={result.retcode}, deal={result.deal}, order={result.order}, volume={result.volume}, price={result.price}, comment='{result.comment}'")
+    logger.debug("OrderSendResult: retcode=%s, deal=%s, order=%s, volume=%s, price=%s, comment='%s'", result.retcode, result.deal, result.order, result.volume, result.price, result.comment)
 
     if result.retcode != mt5.TRADE_RETCODE_DONE:
-        logger.error(f"Failed to place hedge order for {symbol}. Retcode: {result.retcode}, Comment: {result.comment}")
-    else:
-        logger.info(f"Successfully placed hedge order for {symbol}. Hedge Ticket: {result.order}")
-        hedged_positions[position.ticket] = result.order  # Registrera hedge-order
-        hedge_orders_per_symbol[symbol] += 1
-        logger.debug(f"Hedge orders for {symbol}: {hedge_orders_per_symbol[symbol]}")
+        logger.error("Failed to place hedge order for %s. Retcode: %s, Comment: %s", symbol, result.retcode, result.comment)
+        return None
+    logger.info("Successfully placed hedge order for %s. Hedge Ticket: %s", symbol, result.order,
+                extra={"symbol": symbol, "ticket": position.ticket})
+    return result.order
+
+def open_hedge_order(lot_size, position):
+    """
+    Lägger en hedge-order för en given position via samma väg som batchen: maxgränsen per symbol,
+    en originalorder i samma riktning som positionen och marginalen.
+
+    Synkron och ändrar räknarna direkt, så den ska anropas från event-loopens tråd (som före
+    symbollåsen); equity-övervakningen använder _hedge_book.
+    """
+    symbol = position.symbol
+
+    open_positions = mt5.positions_get(symbol=symbol)
+    if open_positions is None:
+        logger.error("Failed to fetch positions for %s. Cannot determine hedge eligibility.", symbol)
+        return
 
+    book = _recount(symbol, open_positions)
+    eligible, slots, blocked = _plan_hedges({symbol: [position]}, original_directions(book))
+    _record_hedges(eligible, slots, _hedge_batch(eligible, lot_size, slots), blocked)
+    if symbol in blocked:
+        logger.info("Cannot place hedge for %s. Max hedge orders reached (%s/%s).", symbol, *blocked[symbol])
@@ -1,41 +1,51 @@
-from pybit.unified_trading import HTTP
 import logging
 
 logger = logging.getLogger("Channel5")
 
-# Initiera PyBit-klient
-client = HTTP(
-    testnet=True,  # Aktivera testnet
-    api_key="DIN_API_KEY",
-    api_secret="DIN_API_SECRET",
-)
+# PyBit-klient, skapas vid första ordern (se get_client)
+client = None
+
+def get_client():
+    """Initiera PyBit-klienten vid första användning och returnera den."""
+    global client
+    if client is None:
+        from pybit.unified_trading import HTTP
+        client = HTTP(
+            testnet=True,  # Aktivera testnet
+            api_key="DIN_API_KEY",
+            api_secret="DIN_API_SECRET",
+        )
+    return client
+
+def parse_channel_5_signal(message):
+    """Tolka ordersidan ("Buy"/"Sell") från en Kanal 5-signal."""
+    action_line = message.strip().upper()
+
+    if "BUY" in action_line:
+        return "Buy"
+    elif "SELL" in action_line:
+        return "Sell"
+    raise ValueError("Invalid action in message. Expected 'BUY' or 'SELL'.")
 
 async def process_channel_5_signal(message):
     """Processa inkommande signaler från Channel 5 och lägg order på Bybit."""
     try:
-        logger.info(f"Processing message: {message}")
-        action_line = message.strip().upper()
-
-        if "BUY" in action_line:
-            side = "Buy"
-        elif "SELL" in action_line:
-            side = "Sell"
-        else:
-            raise ValueError("Invalid action in message. Expected 'BUY' or 'SELL'.")
+        logger.info("Processing message: %s", message)
+        side = parse_channel_5_signal(message)
 
         # Exempel: Extrahera symbol och annan info
         symbol = "BTCUSDT"  # Ändra efter behov
         order_qty = 0.01  # Justera efter ditt behov
 
         # Skicka order
-        logger.info(f"Placing {side} order for {symbol}")
-        response = client.place_order(
+        logger.info("Placing %s order for %s", side, symbol)
+        response = get_client().place_order(
             symbol=symbol,
             side=side,
             qty=order_qty,
             orderType="Market",
             timeInForce="GTC",
         )
-        logger.info(f"Order response: {response}")
+        logger.info("Order response: %s", response)
     except Exception as e:
-        logger.error(f"Error processing signal from Channel 5: {e}")
+        logger.error("Error processing signal from Channel 5: %s", e)
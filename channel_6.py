@@ -1,20 +1,34 @@
-from telethon import TelegramClient, events
 from settings import TELEGRAM_BOT_TOKEN_CHANNEL_6, GROUP_ID6, TARGET_GROUP_ID6, MT5_PATH
+import asyncio
 import logging
 import MetaTrader5 as mt5
+from order_submission import submit_order
+from order_templates import build_request
+from mt5_connection import ensure_connected_async
+from session_calendar import require_open
+import symbol_index
 
 # Logger setup
 logger = logging.getLogger("Channel6")
 
-# Skapa Telegram-klient för Kanal 6
-client_channel_6 = TelegramClient("channel_6_session", api_id=21741387, api_hash="097295cc4e92cedcf99626ff23d2a010")
+# Telegram-klient för Kanal 6 som fristående bot. Skapas först i get_client() så att
+# import av modulen (t.ex. som plugin i main.py) inte bygger en extra TelegramClient.
+client_channel_6 = None
+
+def get_client():
+    """Skapa (en gång) och returnera Telegram-klienten för Kanal 6."""
+    global client_channel_6
+    if client_channel_6 is None:
+        from telethon import TelegramClient, events
+        client_channel_6 = TelegramClient("channel_6_session", api_id=21741387, api_hash="097295cc4e92cedcf99626ff23d2a010")
+        client_channel_6.add_event_handler(handle_channel_6, events.NewMessage(chats=GROUP_ID6))
+    return client_channel_6
 
 async def start_client():
     """Startar Telegram-klient för Kanal 6 med bot-token."""
-    await client_channel_6.start(bot_token=TELEGRAM_BOT_TOKEN_CHANNEL_6)
+    await get_client().start(bot_token=TELEGRAM_BOT_TOKEN_CHANNEL_6)
     logger.info("Channel 6 Telegram client started.")
 
-@client_channel_6.on(events.NewMessage(chats=GROUP_ID6))
 async def handle_channel_6(event):
     logger.info("[Channel 6] New message received.")
     await process_channel_6_signal(event.raw_text, MT5_PATH, client_channel_6, TARGET_GROUP_ID6)
@@ -32,50 +46,64 @@ async def main_channel_6(mt5_path):
         await start_client()  # Starta klienten med bot-token
         await client_channel_6.run_until_disconnected()
     except Exception as e:
-        logger.error(f"Error in Channel 6 main loop: {e}")
+        logger.error("Error in Channel 6 main loop: %s", e)
     finally:
         mt5.shutdown()
 
+def parse_channel_6_signal(message):
+    """Tolka stop-ordertyp och symbol från en Kanal 6-signal, eller None om den är ogiltig."""
+    lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
+
+    if len(lines) < 2:
+        logger.error("Signal format is invalid or incomplete.")
+        return None
+
+    # Identifiera signalens komponenter
+    action_line = lines[0].upper()
+    if action_line.startswith("BUY"):
+        action = "BUY_STOP"
+        symbol = action_line.split()[1].strip(":")
+    elif action_line.startswith("SELL"):
+        action = "SELL_STOP"
+        symbol = action_line.split()[1].strip(":")
+    else:
+        logger.error("No valid action (BUY/SELL) found in the signal.")
+        return None
+
+    # Kontrollera om symbol hittades
+    if not symbol:
+        logger.error("No symbol provided in signal.")
+        return None
+
+    return action, symbol
+
 async def process_channel_6_signal(message, mt5_path, client, target_group):
     """Processa signaler från Kanal 6 och skicka orderinformation till en annan Telegram-grupp."""
     try:
-        # Kontrollera att MT5 är initierat
-        if not mt5.initialize(mt5_path):
-            logger.error("MetaTrader 5 is not initialized. Please initialize before running the bot.")
-            return
-
-        logger.info(f"Processing message: {message}")
-        lines = [line.strip() for line in message.strip().split("\n") if line.strip()]
-
-        if len(lines) < 2:
-            logger.error("Signal format is invalid or incomplete.")
-            return
-
-        # Identifiera signalens komponenter
-        action_line = lines[0].upper()
-        if action_line.startswith("BUY"):
-            action = "BUY_STOP"
-            symbol = action_line.split()[1].strip(":")
-        elif action_line.startswith("SELL"):
-            action = "SELL_STOP"
-            symbol = action_line.split()[1].strip(":")
-        else:
-            logger.error("No valid action (BUY/SELL) found in the signal.")
+        # Kontrollera att MT5 är anslutet (avvisas direkt om brytaren är öppen)
+        if not await ensure_connected_async(mt5_path):
+            logger.error("MetaTrader 5 is not connected; dropping signal.")
             return
 
-        # Kontrollera om symbol hittades
-        if not symbol:
-            logger.error("No symbol provided in signal.")
+        logger.info("Processing message: %s", message)
+        parsed = parse_channel_6_signal(message)
+        if parsed is None:
             return
+        action, symbol = parsed
 
-        logger.info(f"Action: {action}, Symbol: {symbol}")
+        logger.info("Action: %s, Symbol: %s", action, symbol)
 
-        # Kontrollera symbolens information
-        symbol_info = mt5.symbol_info(symbol)
-        if not symbol_info or not symbol_info.visible:
+        # Brokerns namn för symbolen (alias och suffix via symbol_index), vald i Market Watch
+        broker_symbol = symbol_index.resolve(symbol)
+        if broker_symbol is None:
             raise ValueError(f"Symbol {symbol} is not available or not visible in MetaTrader 5.")
+        symbol = broker_symbol
+        require_open(symbol)
+        symbol_info = mt5.symbol_info(symbol)
+        if not symbol_info:
+            raise ValueError(f"Symbol {symbol} is not available in MetaTrader 5.")
 
-        logger.info(f"Symbol info: {symbol_info}")
+        logger.debug("Symbol info: %s", symbol_info)
 
         # Hämta föregående candle data
         rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 2)
@@ -84,7 +112,7 @@ async def process_channel_6_signal(message, mt5_path, client, target_group):
         previous_high = rates[1][2]  # High från föregående candle
         previous_low = rates[1][3]   # Low från föregående candle
 
-        logger.info(f"Previous Candle High: {previous_high}, Low: {previous_low}")
+        logger.info("Previous Candle High: %s, Low: %s", previous_high, previous_low)
 
         # Definiera Entry, SL och TP
         entry_price = previous_high if action == "BUY_STOP" else previous_low
@@ -93,7 +121,7 @@ async def process_channel_6_signal(message, mt5_path, client, target_group):
         tp_distance = abs(entry_price - sl) * 1.3
         tp = entry_price + tp_distance if action == "BUY_STOP" else entry_price - tp_distance
 
-        logger.info(f"Entry Price: {entry_price}, SL: {sl}, TP: {tp}")
+        logger.info("Entry Price: %s, SL: %s, TP: %s", entry_price, sl, tp)
 
         # Kontrollera och justera för minimala avstånd
         min_stop_distance = symbol_info.trade_stops_level * symbol_info.point
@@ -104,7 +132,7 @@ async def process_channel_6_signal(message, mt5_path, client, target_group):
             logger.warning("TP too close to Entry. Adjusting TP.")
             tp = tp + min_stop_distance if action == "BUY_STOP" else tp - min_stop_distance
 
-        logger.info(f"Adjusted SL: {sl}, TP: {tp}")
+        logger.info("Adjusted SL: %s, TP: %s", sl, tp)
 
         # Beräkna lotstorlek
         balance = mt5.account_info().balance
@@ -114,43 +142,42 @@ async def process_channel_6_signal(message, mt5_path, client, target_group):
         sl_distance_usd = abs(entry_price - sl) * pip_value
         lot_size = round(risk_amount / sl_distance_usd, 2)
 
-        logger.info(f"Lot Size: {lot_size}")
+        logger.info("Lot Size: %s", lot_size)
 
         # Förbered ordern
-        order = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_STOP if action == "BUY_STOP" else mt5.ORDER_TYPE_SELL_STOP,
-            "price": entry_price,
-            "sl": round(sl, 4),
-            "tp": round(tp, 4),
-            "deviation": 10,
-            "magic": 6,  # Magic number för Kanal 6
-            "comment": "Channel6_Signal",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
-        }
-
-        logger.info(f"Placing order: {order}")
+        # Mallen avrundar priser till symbolens decimaler och sätter fyllnadsläge för pending-order
+        order = build_request(
+            symbol, "pending",
+            type=mt5.ORDER_TYPE_BUY_STOP if action == "BUY_STOP" else mt5.ORDER_TYPE_SELL_STOP,
+            volume=lot_size,
+            price=entry_price,
+            sl=sl,
+            tp=tp,
+            magic=6,  # Magic number för Kanal 6
+            comment="Channel6_Signal",
+        )
+
+        logger.info("Placing order: %s", order)
 
         # Skicka ordern
-        result = mt5.order_send(order)
+        result = await asyncio.to_thread(submit_order, order)
+        if result is None:
+            raise ValueError("Order placement failed: no response from terminal")
         if result.retcode != mt5.TRADE_RETCODE_DONE:
-            raise ValueError(f"Order placement failed: {result}")
+            raise ValueError(f"Order placement failed: retcode={result.retcode}, comment={result.comment}")
 
-        logger.info(f"Order placed successfully: {result}")
+        logger.info("Order placed successfully. Ticket: %s, Price: %s", result.order, result.price)
 
         # Skicka orderinformation till en annan Telegram-grupp
         order_message = f"""
 {action.split("_")[0]} {symbol}
-Entry: {round(entry_price, 4)}
-SL: {round(sl, 4)}
-TP: {round(tp, 4)}
+Entry: {order["price"]}
+SL: {order["sl"]}
+TP: {order["tp"]}
 """
         await client.send_message(target_group, order_message.strip())
         logger.info("Order details sent to target Telegram group.")
 
     except Exception as e:
-        logger.error(f"Error processing signal: {e}")
+        logger.error("Error processing signal: %s", e)
 
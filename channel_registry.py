@@ -0,0 +1,98 @@
+# channel_registry.py
+"""
+Kanaler som lat-importerade plugins.
+
+Varje kanal registreras med modulnamn och funktionsnamn i stället för att
+importeras direkt. Bara kanalerna i settings.ENABLED_CHANNELS aktiveras, och
+deras moduler (med MetaTrader5, pybit, pandas osv.) importeras först när de
+behövs: vid första signalen eller i preload() efter att boten börjat lyssna.
+"""
+import logging
+
+from settings import (
+    ENABLED_CHANNELS,
+    GROUP_ID1, GROUP_ID2, GROUP_ID3, GROUP_ID4, GROUP_ID5, GROUP_ID6,
+    TARGET_GROUP_ID6,
+    MT5_PATH, MT5_PATH_ALT,
+)
+from startup_profile import timed_import
+
+logger = logging.getLogger("ChannelRegistry")
+
+
+class ChannelPlugin:
+    """En kanal: vilken chatt den lyssnar på och var dess processor finns."""
+
+    def __init__(self, name, module, handler, chats, args=lambda client: (), background=None, price_reference=None):
+        self.name = name
+        self.module_name = module
+        self.handler_name = handler
+        self.chats = chats
+        self.args = args  # Funktion client -> extra argument till processorn efter meddelandet
+        self.background = background  # Namn på en coroutine-funktion som ska köras i bakgrunden
+        self.price_reference = price_reference  # Namn på en funktion message -> (symbol, pris), för driftkontroll
+        self._handler = None
+
+    def load(self):
+        """Importera kanalens modul (en gång) och returnera processorfunktionen."""
+        if self._handler is None:
+            module = timed_import(self.module_name)
+            self._handler = getattr(module, self.handler_name)
+        return self._handler
+
+    def background_task(self):
+        """Returnera kanalens bakgrunds-coroutine (t.ex. equity-övervakning) eller None."""
+        if self.background is None:
+            return None
+        return getattr(timed_import(self.module_name), self.background)()
+
+    async def handle(self, message, client):
+        """Processa ett meddelande med kanalens processor."""
+        handler = self.load()
+        await handler(message, *self.args(client))
+
+
+CHANNEL_PLUGINS = {
+    "channel_1": ChannelPlugin("channel_1", "channel_1", "process_channel_1_signal", GROUP_ID1,
+                               args=lambda client: (MT5_PATH,)),
+    "channel_2": ChannelPlugin("channel_2", "channel_2", "process_channel_2_signal", GROUP_ID2,
+                               args=lambda client: (MT5_PATH,)),
+    "channel_3": ChannelPlugin("channel_3", "channel_3", "process_channel_3_signal", GROUP_ID3,
+                               args=lambda client: (MT5_PATH,)),
+    "channel_4": ChannelPlugin("channel_4", "channel_4", "process_channel_4_signal", GROUP_ID4,
+                               args=lambda client: (MT5_PATH_ALT,), background="supervise_monitor_equity",
+                               price_reference="signal_price_reference"),
+    "channel_4_countertrend": ChannelPlugin("channel_4_countertrend", "channel_4_org_countertrend",
+                                            "process_channel_4_signal", GROUP_ID4,
+                                            args=lambda client: (MT5_PATH_ALT,),
+                                            background="supervise_monitor_equity",
+                                            price_reference="signal_price_reference"),
+    # Trend live + motrend på papper på samma signaler (se shadow_engine och SHADOW_* i settings)
+    "channel_4_shadow": ChannelPlugin("channel_4_shadow", "shadow_engine", "process_channel_4_signal", GROUP_ID4,
+                                      args=lambda client: (MT5_PATH_ALT,), background="run_shadow_engine",
+                                      price_reference="signal_price_reference"),
+    "channel_5": ChannelPlugin("channel_5", "channel_5", "process_channel_5_signal", GROUP_ID5),
+    "channel_6": ChannelPlugin("channel_6", "channel_6", "process_channel_6_signal", GROUP_ID6,
+                               args=lambda client: (MT5_PATH, client, TARGET_GROUP_ID6)),
+}
+
+
+def enabled_plugins():
+    """Returnera de kanaler som är aktiverade i settings.ENABLED_CHANNELS."""
+    plugins = []
+    for name in ENABLED_CHANNELS:
+        plugin = CHANNEL_PLUGINS.get(name)
+        if plugin is None:
+            logger.error("Unknown channel '%s' in ENABLED_CHANNELS.", name)
+            continue
+        plugins.append(plugin)
+    return plugins
+
+
+def preload(plugins):
+    """Importera processorerna för de givna kanalerna i förväg (körs efter att boten börjat lyssna)."""
+    for plugin in plugins:
+        try:
+            plugin.load()
+        except Exception as e:
+            logger.error("Failed to load channel plugin %s: %s", plugin.name, e)
@@ -1,19 +1,17 @@
 import logging
-import matplotlib.pyplot as plt
-import pandas as pd
 import MetaTrader5 as mt5
+import bar_store
 import os
 
-# Skapa en logger
+# Skapa en logger (handlers konfigureras centralt i logging_setup)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-ch = logging.StreamHandler()  # Skickar loggar till konsolen
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-ch.setFormatter(formatter)
-logger.addHandler(ch)
 
 def plot_candlestick_chart(final_values):
     """Skapa en graf för att visualisera de senaste candlarna och prisnivåer."""
+    # pandas och matplotlib är tunga att importera och behövs bara när en graf faktiskt ritas
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     symbol = final_values["symbol"]
     sl = final_values["sl"]
     tp = final_values["tp"]
@@ -22,7 +20,7 @@ def plot_candlestick_chart(final_values):
     action = final_values["action"]
 
     # Hämta OHLC-data (de senaste 5 candlarna)
-    rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 5)
+    rates = bar_store.bars(symbol, mt5.TIMEFRAME_M1, 5, include_current=True)
     if rates is None or len(rates) < 5:
         raise ValueError(f"Not enough data to create chart for {symbol}.")
 
@@ -1,9 +1,10 @@
 # communication.py
-import asyncio
 from collections import defaultdict
 
-# Skapa en global kö för asynkron kommunikation
-update_queue = asyncio.Queue()
+from gui_bridge import GuiChannel
+
+# Uppdateringar till GUI:t: event-loopen publicerar, Tk-tråden läser (se gui_bridge)
+gui_updates = GuiChannel()
 
 # Skapa en global dictionary för hedged positions
 # Struktur: { original_ticket: hedge_ticket }
@@ -14,3 +15,11 @@ original_orders_per_symbol = defaultdict(int)
 
 # Skapa en global dictionary för att spåra antalet hedge-order per symbol
 hedge_orders_per_symbol = defaultdict(int)
+
+# Global ordbok för trendläget per symbol, uppdateras av trend_engine
+# Struktur: { symbol: {"trend": "UP"/"DOWN"/"MIXED", "timeframes": {...}, "ema": {...}, "updated": ts} }
+current_trends = {}
+
+# Resultat per strategivariant i shadow mode, uppdateras av shadow_engine
+# Struktur: { namn: {"live": bool, "realized": float, "floating": float, "equity": float, "positions": int, "hedges": int} }
+shadow_results = {}
@@ -0,0 +1,117 @@
+# conftest.py
+import asyncio
+import glob
+import os
+
+import pytest
+
+import mt5_simulator
+
+# MetaTrader5 finns bara för Windows. Saknas paketet körs testerna mot den simulerade terminalen.
+try:
+    import MetaTrader5  # noqa: F401
+except ImportError:
+    mt5_simulator.install()
+
+import channel_1
+import channel_2
+import channel_3
+import channel_4
+import trend_engine
+import shadow_engine
+import order_submission
+import order_templates
+import bar_store
+import mt5_connection
+import order_rate_limiter
+import symbol_index
+import symbol_warmup
+import signal_coalescer
+import session_calendar
+import terminal_router
+from communication import hedged_positions, original_orders_per_symbol, hedge_orders_per_symbol
+
+# Sparade baslinjer för benchmarks (skapas med: pytest test_benchmarks.py --benchmark-autosave)
+BENCHMARK_STORAGE = ".benchmarks"
+# Hur mycket långsammare (medelvärde) en benchmark får vara innan körningen fälls
+BENCHMARK_REGRESSION_LIMIT = "mean:25%"
+
+CHANNEL_MODULES = [channel_1, channel_2, channel_3, channel_4, trend_engine, shadow_engine, order_submission, order_templates, bar_store, mt5_connection, symbol_index,
+                   symbol_warmup, session_calendar]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    """Jämför automatiskt mot senaste sparade baslinje så att en regression fäller körningen."""
+    if not config.pluginmanager.hasplugin("benchmark"):
+        return
+    if config.getoption("benchmark_compare") or config.getoption("benchmark_disable"):
+        return
+    if not glob.glob(os.path.join(BENCHMARK_STORAGE, "*", "*.json")):
+        return
+
+    from pytest_benchmark.utils import parse_compare_fail
+
+    config.option.benchmark_compare = True
+    if not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = [parse_compare_fail(BENCHMARK_REGRESSION_LIMIT)]
+
+
+@pytest.fixture
+def use_terminal(monkeypatch):
+    """Låter kanalmodulerna anropa en given MT5-modul (simulator, inspelning eller uppspelning) under testet."""
+    def use(module):
+        for channel in CHANNEL_MODULES:
+            monkeypatch.setattr(channel, "mt5", module)
+    return use
+
+
+@pytest.fixture
+def terminal(monkeypatch, tmp_path, use_terminal):
+    """En ny simulerad terminal som alla kanalmoduler använder under testet."""
+    sim = mt5_simulator.SimulatedTerminal()
+    use_terminal(mt5_connection.serialize(sim.as_module()))
+    monkeypatch.setattr(bar_store, "BAR_STORE_DIR", str(tmp_path / "bars"))
+    bar_store.reset()
+    trend_engine.reset()
+    hedged_positions.clear()
+    original_orders_per_symbol.clear()
+    hedge_orders_per_symbol.clear()
+    order_templates._templates.clear()
+    mt5_connection.reset()
+    symbol_index.reset()
+    symbol_warmup.readiness.clear()
+    signal_coalescer.reset()
+    # Testerna ska inte bero på veckodag och klockslag: alla symboler handlas dygnet runt
+    monkeypatch.setattr(session_calendar, "TRADING_SESSIONS", {})
+    monkeypatch.setattr(session_calendar, "DEFAULT_TRADING_SESSION", {day: [("00:00", "24:00")] for day in range(7)})
+    session_calendar.reset()
+    # Simulatorn stryper inte: mät koden, inte brokerns takt
+    order_rate_limiter.reset()
+    order_rate_limiter.configure(1e9, 1e9)
+    yield sim
+    hedged_positions.clear()
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def router(terminal, loop):
+    """Två simulerade terminaler bakom routern: Primary (långsam) och Secondary."""
+    primary, secondary = mt5_simulator.SimulatedTerminal(), mt5_simulator.SimulatedTerminal()
+    primary.latency = 0.002
+    terminal_router.start({"Primary": "primary.exe", "Secondary": "secondary.exe"},
+                          {"Primary": primary.as_module(), "Secondary": secondary.as_module()})
+
+    async def probe_all():
+        await asyncio.gather(*(terminal_router.probe(worker) for worker in terminal_router.workers))
+
+    loop.run_until_complete(probe_all())
+    yield primary, secondary
+    terminal_router.stop()
+    terminal_router.routing_log.clear()
@@ -0,0 +1,222 @@
+# dashboard_shm.py
+"""
+Ögonblicksbilder för dashboards i delat minne (multiprocessing.shared_memory).
+
+Boten (en skrivare) lägger positioner, P/L och hedgestatus i ett namngivet
+minnessegment. GUI:na (gui_visualization, Org_hedge_visual) körs som egna
+processer och läser bara segmentet, så de kan startas, stoppas eller krascha
+utan att påverka boten, och flera kan vara anslutna samtidigt.
+
+Konsistens hålls med ett seqlock: skrivaren räknar upp sekvensnumret till ett
+udda värde, skriver och räknar upp till jämnt igen. Läsaren kopierar datan och
+försöker igen om sekvensnumret var udda eller ändrades under kopieringen.
+
+Layout: HEADER_DTYPE (en post) följt av DASHBOARD_MAX_POSITIONS rader ROW_DTYPE.
+"""
+import asyncio
+import logging
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from position_book import build_position_book, symbol_name
+from settings import DASHBOARD_SHM_NAME, DASHBOARD_MAX_POSITIONS, DASHBOARD_PUBLISH_INTERVAL
+
+logger = logging.getLogger("Dashboard")
+
+HEADER_DTYPE = np.dtype([
+    ("seq", "<u8"),  # Udda medan en skrivning pågår
+    ("count", "<u4"),  # Antal giltiga rader
+    ("total", "<u4"),  # Antal positioner innan eventuell trunkering
+    ("updated", "<f8"),  # time.time() vid publiceringen
+    ("balance", "<f8"),
+    ("equity", "<f8"),
+    ("status", "S128"),  # Statusraden (UTF-8)
+])
+
+# Hedgestatus per rad
+ORIGINAL = 0
+ORIGINAL_HEDGED = 1
+HEDGE = 2
+
+ROW_DTYPE = np.dtype([
+    ("ticket", "<i8"),
+    ("symbol", "S16"),
+    ("type", "i1"),
+    ("volume", "<f8"),
+    ("profit", "<f8"),
+    ("hedge_state", "i1"),
+    ("partner", "<i8"),  # Hedgens ticket för en hedgad original, originalets ticket för en hedge, annars 0
+])
+
+
+# Segment som en publicerare i den här processen äger (och alltså har registrerat hos resource_tracker)
+_owned_segments = set()
+
+
+def segment_size(capacity=DASHBOARD_MAX_POSITIONS):
+    return HEADER_DTYPE.itemsize + capacity * ROW_DTYPE.itemsize
+
+
+def _views(buffer, capacity):
+    header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buffer)
+    rows = np.ndarray((capacity,), dtype=ROW_DTYPE, buffer=buffer, offset=HEADER_DTYPE.itemsize)
+    return header, rows
+
+
+def build_rows(positions, hedges):
+    """Bygg dashboardrader av MT5-positioner och hedge-kopplingarna {original_ticket: hedge_ticket}."""
+    book = build_position_book(positions, hedges.values())
+    rows = np.zeros(len(book), dtype=ROW_DTYPE)
+    if not len(book):
+        return rows
+    rows["ticket"] = book["ticket"]
+    codes = book["symbol"]
+    names = np.array([symbol_name(code) for code in range(int(codes.max()) + 1)], dtype=ROW_DTYPE["symbol"])
+    rows["symbol"] = names[codes]
+    rows["type"] = book["type"]
+    rows["volume"] = book["volume"]
+    rows["profit"] = book["profit"]
+    partners = dict(hedges)
+    partners.update((hedge, original) for original, hedge in hedges.items())
+    partner = np.fromiter((partners.get(ticket, 0) for ticket in rows["ticket"].tolist()), dtype=np.int64, count=len(rows))
+    rows["partner"] = partner
+    rows["hedge_state"] = np.where(book["hedge"], HEDGE, np.where(partner != 0, ORIGINAL_HEDGED, ORIGINAL))
+    return rows
+
+
+def symbol_pl(rows):
+    """
+    Summera P/L per symbol ur dashboardrader, uppdelat på original- och hedgeorder.
+
+    :return: (original_pl, hedge_pl) som dictionaries {symbol: summa}; båda har samma nycklar.
+    """
+    if len(rows) == 0:
+        return {}, {}
+    symbols, codes = np.unique(rows["symbol"], return_inverse=True)
+    hedge = rows["hedge_state"] == HEDGE
+    original_pl = np.bincount(codes[~hedge], weights=rows["profit"][~hedge], minlength=len(symbols))
+    hedge_pl = np.bincount(codes[hedge], weights=rows["profit"][hedge], minlength=len(symbols))
+    names = [symbol.decode() for symbol in symbols.tolist()]
+    return (
+        {name: float(pl) for name, pl in zip(names, original_pl)},
+        {name: float(pl) for name, pl in zip(names, hedge_pl)},
+    )
+
+
+class DashboardPublisher:
+    """Skrivarsidan: äger segmentet och publicerar med seqlock."""
+
+    def __init__(self, name=DASHBOARD_SHM_NAME, capacity=DASHBOARD_MAX_POSITIONS):
+        self.capacity = capacity
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        except FileExistsError:
+            # Kvar efter en tidigare körning som inte städade: återanvänd det
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < segment_size(capacity):
+                self.shm.close()
+                raise
+        _owned_segments.add(self.shm.name)
+        self.header, self.rows = _views(self.shm.buf, capacity)
+        self.header[0] = np.zeros((), dtype=HEADER_DTYPE)
+
+    def publish(self, rows, balance=0.0, equity=0.0, status=None):
+        """Skriv en ögonblicksbild (rader från build_rows)."""
+        count = min(len(rows), self.capacity)
+        header = self.header
+        seq = int(header["seq"][0])
+        header["seq"] = seq + 1  # Udda: skrivning pågår
+        self.rows[:count] = rows[:count]
+        header["count"] = count
+        header["total"] = len(rows)
+        header["updated"] = time.time()
+        header["balance"] = balance
+        header["equity"] = equity
+        if status is not None:
+            header["status"] = status.encode("utf-8")[:HEADER_DTYPE["status"].itemsize]
+        header["seq"] = seq + 2  # Jämnt: klart
+
+    def close(self, unlink=True):
+        del self.header, self.rows
+        self.shm.close()
+        _owned_segments.discard(self.shm.name)
+        if unlink:
+            self.shm.unlink()
+
+
+class DashboardReader:
+    """Läsarsidan: ansluter till segmentet och kopierar konsistenta ögonblicksbilder."""
+
+    def __init__(self, name=DASHBOARD_SHM_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Läsaren äger inte segmentet: hindra resource_tracker från att ta bort det när läsaren avslutas
+        if self.shm.name not in _owned_segments:
+            try:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+        capacity = (self.shm.size - HEADER_DTYPE.itemsize) // ROW_DTYPE.itemsize
+        self.header, self.rows = _views(self.shm.buf, capacity)
+        self.last_seq = None
+
+    def read(self, retries=100):
+        """
+        Returnera (header, rader) som kopior, eller None om ingen konsistent läsning lyckades.
+
+        header är en numpy-post med fälten i HEADER_DTYPE.
+        """
+        for _ in range(retries):
+            before = int(self.header["seq"][0])
+            if before % 2:
+                time.sleep(0)  # Skrivning pågår
+                continue
+            header = self.header[0].copy()
+            rows = self.rows[:int(header["count"])].copy()
+            if int(self.header["seq"][0]) == before:
+                self.last_seq = before
+                return header, rows
+        return None
+
+    def changed(self):
+        """Sant om en ny ögonblicksbild har publicerats sedan senaste read()."""
+        return int(self.header["seq"][0]) != self.last_seq
+
+    def close(self):
+        del self.header, self.rows
+        self.shm.close()
+
+
+def _publish_snapshot(publisher, snapshot, balance, equity):
+    publisher.publish(build_rows(snapshot.positions, snapshot.hedges), balance, equity, snapshot.label)
+
+
+async def run_dashboard_publisher(gui_updates, interval=DASHBOARD_PUBLISH_INTERVAL):
+    """
+    Bakgrundsuppgift i boten: skriv GUI-ögonblicksbilden (communication.gui_updates)
+    till delat minne när den har ändrats.
+    """
+    try:
+        publisher = DashboardPublisher()
+    except Exception as e:
+        logger.error("Failed to create dashboard shared memory: %s", e)
+        return
+    logger.info("Publishing dashboard snapshots to shared memory '%s'.", publisher.shm.name)
+    last_versions = None
+    try:
+        while True:
+            snapshot = gui_updates.read()
+            versions = (snapshot.label_version, snapshot.positions_version)
+            if versions != last_versions:
+                last_versions = versions
+                try:
+                    balance, equity = snapshot.account or (0.0, 0.0)
+                    # Radbygget och kopieringen (några ms för 10000 positioner) körs utanför event-loopen;
+                    # uppgiften är fortfarande den enda skrivaren eftersom den väntar in tråden
+                    await asyncio.to_thread(_publish_snapshot, publisher, snapshot, balance, equity)
+                except Exception as e:
+                    logger.error("Failed to publish dashboard snapshot: %s", e)
+            await asyncio.sleep(interval)
+    finally:
+        publisher.close()
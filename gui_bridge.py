@@ -0,0 +1,51 @@
+# gui_bridge.py
+"""
+Trådsäker publicering från event-loopen till GUI:t.
+
+Event-loopen (den enda skrivaren) publicerar genom att bygga en ny, oföränderlig
+GuiSnapshot och byta ut referensen i ett enda attribut. Referensbytet är atomiskt,
+så inga lås behövs och loopen väntar aldrig på GUI:t. Läsaren (dashboard_shm:s
+publicerare, som skriver vidare till delat minne för GUI-processerna) tar den
+senaste ögonblicksbilden och hoppar över det som inte har fått ny version sedan
+förra läsningen; flera uppdateringar mellan två läsningar slås därmed ihop till
+en (den senaste vinner).
+
+Ögonblicksbilden har en egen kopia av hedge-kopplingarna, så GUI:t läser aldrig
+hedged_positions medan loopen (eller dess trådar) ändrar den.
+"""
+from collections import namedtuple
+
+GuiSnapshot = namedtuple("GuiSnapshot", [
+    "label_version",
+    "label",
+    "positions_version",
+    "positions",  # tuple med positioner från senaste övervakningsvarvet
+    "hedges",  # {original_ticket: hedge_ticket}, kopia vid publiceringen
+    "account",  # (balance, equity) vid publiceringen, eller None
+])
+
+
+class GuiChannel:
+    """Senaste GUI-tillstånd som en referens som byts ut vid varje publicering."""
+
+    def __init__(self):
+        self._snapshot = GuiSnapshot(0, None, 0, (), {}, None)
+
+    def publish_label(self, text):
+        """Sätt statusraden (anropas från event-loopen)."""
+        snapshot = self._snapshot
+        self._snapshot = snapshot._replace(label_version=snapshot.label_version + 1, label=text)
+
+    def publish_positions(self, positions, hedges, account=None):
+        """Publicera positionerna, en kopia av hedge-kopplingarna och (balance, equity) (anropas från event-loopen)."""
+        snapshot = self._snapshot
+        self._snapshot = snapshot._replace(
+            positions_version=snapshot.positions_version + 1,
+            positions=tuple(positions),
+            hedges=dict(hedges),
+            account=account,
+        )
+
+    def read(self):
+        """Senaste ögonblicksbilden (anropas t.ex. av dashboard_shm:s publicerare)."""
+        return self._snapshot
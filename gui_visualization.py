@@ -1,8 +1,15 @@
 # gui_visualization.py
+"""
+Positionsövervakning som egen process: `python gui_visualization.py`.
+
+GUI:t läser bara dashboard_shm-segmentet som boten skriver, så det kan startas,
+stängas eller krascha utan att påverka handeln. Startas det före boten väntar
+det tills segmentet finns.
+"""
 import tkinter as tk
 import logging
-import queue  # Importera queue
-from communication import update_queue, hedged_positions  # Importera hedged_positions
+from dashboard_shm import DashboardReader, HEDGE, ORIGINAL_HEDGED
+from settings import DASHBOARD_POLL_MS
 
 logger = logging.getLogger("GUI")
 
@@ -21,45 +28,53 @@ class GUI:
         self.title_label.pack()
 
         self.position_widgets = {}
+        # Ansluts när boten har skapat segmentet
+        self.reader = None
 
-        # Starta uppdateringskön
+        # Starta uppdateringarna
         self.root.after(100, self.process_queue)
 
     def start(self):
         self.root.mainloop()
 
     def process_queue(self):
+        """Läs segmentet och rita om när boten har publicerat en ny ögonblicksbild."""
         try:
-            while True:
-                task = update_queue.get_nowait()
-                if task['type'] == 'label':
-                    self.label.config(text=task['text'])
-                elif task['type'] == 'position_status':
-                    self.update_position_status(task['position'])
-        except queue.Empty:
-            pass
+            if self.reader is None:
+                self.reader = DashboardReader()
+            if self.reader.changed():
+                snapshot = self.reader.read()
+                if snapshot is not None:
+                    header, rows = snapshot
+                    status = header["status"].decode("utf-8", "replace")
+                    if status:
+                        self.label.config(text=status)
+                    self.update_position_batch(rows)
+        except FileNotFoundError:
+            self.label.config(text="Waiting for bot...")
         except Exception as e:
-            logger.error(f"Error processing queue: {e}")
+            logger.error("Error processing GUI updates: %s", e)
         # Schemalägg nästa kontroll
-        self.root.after(100, self.process_queue)
+        self.root.after(DASHBOARD_POLL_MS, self.process_queue)
+
+    def update_position_batch(self, rows):
+        """Ersätt positionslistan med raderna i en ögonblicksbild (dashboard_shm.ROW_DTYPE) och rita om en gång."""
+        self.position_widgets = {}
+        for row in rows:
+            self.update_position_status(row, redraw=False)
+        self.update_position_list_ui()
 
-    def update_position_status(self, position):
+    def update_position_status(self, row, redraw=True):
         """Uppdatera status för en position i GUI."""
-        ticket = position.ticket
-        is_hedge = ticket in hedged_positions.values()
-        is_original = ticket not in hedged_positions
+        ticket = int(row["ticket"])
+        is_hedge = row["hedge_state"] == HEDGE
 
         # Bestäm om denna position har en hedge
-        has_hedge = False
-        hedge_ticket = None
-        for orig_ticket, hedge_tkt in hedged_positions.items():
-            if orig_ticket == ticket:
-                has_hedge = True
-                hedge_ticket = hedge_tkt
-                break
+        has_hedge = row["hedge_state"] == ORIGINAL_HEDGED
+        hedge_ticket = int(row["partner"]) or None
 
         # Uppdatera eller lägg till positionens information
-        position_info = f"{position.symbol} (Ticket {ticket}) - Profit: {position.profit:.2f}"
+        position_info = f"{row['symbol'].decode()} (Ticket {ticket}) - Profit: {row['profit']:.2f}"
         position_type = "Hedge" if is_hedge else "Original"
 
         # Lagra information om ordertypen och hedge-status
@@ -71,7 +86,8 @@ class GUI:
         }
 
         # Uppdatera UI med senaste status
-        self.update_position_list_ui()
+        if redraw:
+            self.update_position_list_ui()
 
     def update_position_list_ui(self):
         """Uppdatera UI:t med alla positioner och checkboxar."""
@@ -108,3 +124,7 @@ class GUI:
 def start_gui():
     gui = GUI()
     gui.start()
+
+
+if __name__ == "__main__":
+    start_gui()
@@ -0,0 +1,260 @@
+# load_generator.py
+"""
+Syntetisk signallast mot hela pipelinen, för att hitta var den mättas.
+
+Verktyget bygger realistiska meddelanden i varje kanals format (priser runt
+den simulerade terminalens kurs) och skickar dem som Telethon-liknande
+NewMessage-händelser till de riktiga hanterarna (signal_recovery.event_handler),
+en uppgift per händelse som Telethon gör. Ankomsterna är Poisson-fördelade med
+vald takt och kanalmix. MT5-sidan är mt5_simulator.
+
+Rapporten visar genomströmning, ködjup (pågående hanterare och order som väntar
+i order_rate_limiter) och p50/p99/p999 för tiden från signal till lagd order.
+
+    python load_generator.py --rate 50 --duration 10 --mix channel_4=3,channel_3=1
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import itertools
+import logging
+import random
+import time
+
+# Injektionstid för signalen som den aktuella uppgiften (och dess trådar) hanterar
+_signal_started = contextvars.ContextVar("load_signal_started", default=None)
+
+
+# --- Meddelanden per kanalformat ---
+def _zone(rng, price, side):
+    near = round(price + (rng.uniform(0, 2) if side == "sell" else -rng.uniform(0, 2)), 2)
+    return (near, round(near + 5, 2)) if side == "sell" else (round(near - 5, 2), near)
+
+
+def _levels(side, zone, steps):
+    sign = -1 if side == "sell" else 1
+    entry = zone[0] if side == "sell" else zone[1]
+    stop = round(zone[1] + 5 if side == "sell" else zone[0] - 5, 2)
+    return stop, [round(entry + sign * 5 * (i + 1), 2) for i in range(steps)]
+
+
+def channel_1_message(rng, prices):
+    side = rng.choice(("buy", "sell"))
+    zone = _zone(rng, prices["XAUUSD"], side)
+    stop, targets = _levels(side, zone, 3)
+    lines = [f"Gold {side} now", f"Zone {zone[0]} - {zone[1]}", f"SL: {stop}"]
+    lines += [f"TP{i + 1}: {tp}" for i, tp in enumerate(targets)]
+    return "\n" + "\n".join(lines) + "\n"
+
+
+def channel_2_message(rng, prices):
+    side = rng.choice(("buy", "sell"))
+    zone = _zone(rng, prices["XAUUSD"], side)
+    stop, targets = _levels(side, zone, 2)
+    lines = ["Signal alert", f"Gold {side} zone {zone[0]} - {zone[1]}", f"SL: {stop}"]
+    lines += [f"TP{i + 1}: {tp}" for i, tp in enumerate(targets)]
+    return "\n" + "\n".join(lines) + "\n"
+
+
+def channel_3_message(rng, prices):
+    return f"{rng.choice(('buy', 'sell'))} xauusd\nATR signal"
+
+
+def channel_4_message(rng, prices):
+    symbol = rng.choice(("XAUUSD", "XAUUSD", "XAUUSD", "US30"))
+    price = prices["DJ30" if symbol == "US30" else symbol]
+    entry = round(price * (1 + rng.uniform(-0.0005, 0.0005)), 2)
+    return f"\n{rng.choice(('BUY', 'SELL'))} {symbol}\nENTRY: {entry}\n{rng.choice(('BULL', 'BEAR'))}\n"
+
+
+def channel_6_message(rng, prices):
+    return f"{rng.choice(('BUY', 'SELL'))} XAUUSD:\nEntry now"
+
+
+MESSAGE_BUILDERS = {
+    "channel_1": channel_1_message,
+    "channel_2": channel_2_message,
+    "channel_3": channel_3_message,
+    "channel_4": channel_4_message,
+    "channel_4_countertrend": channel_4_message,
+    "channel_4_shadow": channel_4_message,
+    "channel_6": channel_6_message,
+}
+
+
+class SyntheticEvent:
+    """De fält i Telethons NewMessage.Event som hanterarna läser."""
+
+    __slots__ = ("chat_id", "id", "raw_text", "date")
+
+    def __init__(self, chat_id, message_id, raw_text):
+        self.chat_id = chat_id
+        self.id = message_id
+        self.raw_text = raw_text
+        self.date = datetime.datetime.now(datetime.timezone.utc)
+
+
+class FakeClient:
+    """Telegram-klient för kanaler som skickar vidare meddelanden (Kanal 6)."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, entity, message, **kwargs):
+        self.sent += 1
+
+    def is_connected(self):
+        return True
+
+
+class LoadStats:
+    def __init__(self):
+        self.injected = 0
+        self.completed = 0
+        self.orders = 0
+        self.latencies = []  # Sekunder från injektion till första lagda ordern per signal
+        self._first_order = set()
+        self.depth_samples = []  # (pågående hanterare, väntande order)
+        self.start = self.end = None
+
+    def record_order(self, signal_id, started):
+        self.orders += 1
+        if signal_id not in self._first_order:
+            self._first_order.add(signal_id)
+            self.latencies.append(time.perf_counter() - started)
+
+    def report(self):
+        elapsed = (self.end or time.perf_counter()) - self.start
+        ordered = sorted(self.latencies)
+
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else None
+
+        handlers = [depth for depth, _ in self.depth_samples] or [0]
+        waiting = [orders for _, orders in self.depth_samples] or [0]
+        return {
+            "injected": self.injected,
+            "completed": self.completed,
+            "orders": self.orders,
+            "throughput": self.completed / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "p999_ms": percentile(0.999),
+            "max_in_flight": max(handlers),
+            "mean_in_flight": sum(handlers) / len(handlers),
+            "max_orders_waiting": max(waiting),
+        }
+
+
+def parse_mix(text):
+    """"channel_4=3,channel_3=1" -> {"channel_4": 3.0, "channel_3": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_load(mt5, rate, duration, mix, seed=0, client=None, sample_interval=0.01):
+    """
+    Skicka Poisson-fördelade signaler med rate per sekund i duration sekunder och vänta in dem.
+
+    mt5 är den (simulerade) MetaTrader5-modul som kanalerna använder; dess order_send
+    instrumenteras under körningen för att mäta tid från signal till order.
+    """
+    import order_rate_limiter
+    from channel_registry import CHANNEL_PLUGINS
+    from signal_recovery import event_handler
+
+    rng = random.Random(seed)
+    client = client or FakeClient()
+    stats = LoadStats()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    handlers = {name: event_handler(CHANNEL_PLUGINS[name], client) for name in names}
+    chats = {}
+    for name in names:
+        chat = CHANNEL_PLUGINS[name].chats
+        chats[name] = chat[0] if isinstance(chat, (list, tuple)) else chat
+    message_ids = itertools.count(10_000_000)
+    pending = set()
+
+    order_send = mt5.order_send
+
+    def instrumented_order_send(request):
+        result = order_send(request)
+        started = _signal_started.get()
+        if started is not None:
+            stats.record_order(*started)
+        return result
+
+    async def inject(handler, event):
+        _signal_started.set((event.id, time.perf_counter()))
+        try:
+            await handler(event)
+        finally:
+            stats.completed += 1
+
+    async def sample_depth():
+        bucket = order_rate_limiter.bucket()
+        while True:
+            stats.depth_samples.append((len(pending), bucket.waiting()))
+            await asyncio.sleep(sample_interval)
+
+    mt5.order_send = instrumented_order_send
+    sampler = asyncio.create_task(sample_depth())
+    try:
+        stats.start = time.perf_counter()
+        deadline = stats.start + duration
+        next_arrival = stats.start
+        while True:
+            next_arrival += rng.expovariate(rate)
+            if next_arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            name = rng.choices(names, weights)[0]
+            ticks = {symbol: mt5.symbol_info_tick(symbol) for symbol in ("XAUUSD", "DJ30")}
+            prices = {symbol: (tick.bid + tick.ask) / 2 for symbol, tick in ticks.items() if tick}
+            event = SyntheticEvent(chats[name], next(message_ids), MESSAGE_BUILDERS[name](rng, prices))
+            task = asyncio.create_task(inject(handlers[name], event))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            stats.injected += 1
+        if pending:
+            await asyncio.wait(set(pending))
+        stats.end = time.perf_counter()
+    finally:
+        sampler.cancel()
+        mt5.order_send = order_send
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress the signal pipeline with synthetic Telegram messages.")
+    parser.add_argument("--rate", type=float, default=50.0, help="Signals per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--mix", default="channel_4=1", help="Channel weights, e.g. channel_4=3,channel_3=1")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per MT5 call")
+    parser.add_argument("--balance", type=float, default=100_000.0, help="Simulated account balance")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    import mt5_simulator
+    terminal = mt5_simulator.SimulatedTerminal(balance=args.balance, seed=args.seed)
+    terminal.latency = args.latency
+    mt5 = mt5_simulator.install(terminal)
+    import mt5_connection
+    mt5_connection.serialize(mt5)  # Som i boten: ett MT5-anrop i taget
+
+    async def run():
+        return await run_load(mt5, args.rate, args.duration, parse_mix(args.mix), args.seed)
+
+    report = asyncio.run(run()).report()
+    for key, value in report.items():
+        print(f"{key:20s} {value:.2f}" if isinstance(value, float) else f"{key:20s} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# logging_setup.py
+"""
+Icke-blockerande loggning för boten.
+
+Alla loggare skriver till en QueueHandler på root-loggern. En QueueListener i en
+egen tråd formaterar och skriver posterna till roterande JSON-filer (och
+konsolen), så att event-loopen aldrig väntar på stderr eller fil-I/O.
+
+Spårnings-ID, symbol och ticket för den signal som hanteras läggs på varje post
+via contextvars; sätt dem med new_trace() och bind_log_context().
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import uuid
+
+from settings import LOG_DIR, LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_TO_CONSOLE
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - [%(trace_id)s] %(message)s'
+
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+symbol_var = contextvars.ContextVar("symbol", default=None)
+ticket_var = contextvars.ContextVar("ticket", default=None)
+
+_listener = None
+
+
+def new_trace(symbol=None):
+    """Starta ett nytt spårnings-ID för den aktuella uppgiften (en inkommande signal) och returnera det."""
+    trace_id = uuid.uuid4().hex[:12]
+    trace_id_var.set(trace_id)
+    symbol_var.set(symbol)
+    ticket_var.set(None)
+    return trace_id
+
+
+def bind_log_context(symbol=None, ticket=None):
+    """Koppla symbol och/eller ticket till alla följande loggposter i den aktuella uppgiften."""
+    if symbol is not None:
+        symbol_var.set(symbol)
+    if ticket is not None:
+        ticket_var.set(ticket)
+
+
+class ContextFilter(logging.Filter):
+    """Lägg spårnings-ID, symbol och ticket på posten i den tråd/uppgift som loggar."""
+
+    def filter(self, record):
+        if not hasattr(record, "trace_id"):
+            record.trace_id = trace_id_var.get()
+        if not hasattr(record, "symbol"):
+            record.symbol = symbol_var.get()
+        if not hasattr(record, "ticket"):
+            record.ticket = ticket_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatera en loggpost som en JSON-rad."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", "-"),
+            "symbol": getattr(record, "symbol", None),
+            "ticket": getattr(record, "ticket", None),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler som låter bli att formatera om meddelandet i loggande tråd om det inte behövs."""
+
+    def prepare(self, record):
+        # Slå ihop msg och args här så att posten kan picklas/köas säkert, men utan att
+        # formatera undantag eller stackar i den heta vägen (det gör lyssnartråden).
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, log_dir=LOG_DIR, console=LOG_TO_CONSOLE):
+    """
+    Konfigurera root-loggern med en QueueHandler och starta en QueueListener.
+
+    Returnerar QueueListener. Anropa stop_logging() vid avslut så att kön töms.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Stoppa QueueListener och skriv ut de poster som ligger kvar i kön."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
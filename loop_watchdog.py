@@ -0,0 +1,205 @@
+# loop_watchdog.py
+"""
+Vakthund för event-loopen och samplande profilerare.
+
+Vakthunden: en korutin i loopen uppdaterar en hjärtslagstid var
+WATCHDOG_INTERVAL sekund och mäter hur sent den väcktes (loopens fördröjning).
+En separat tråd kontrollerar hjärtslaget; har loopen stått still längre än
+WATCHDOG_STALL_THRESHOLD hämtas loopens stack med sys._current_frames() och
+loggas en gång per stopp, tillsammans med de signaler som hanteras just då
+(se in_flight()). Så syns vilket blockerande anrop (mt5.*, synkron I/O) som
+höll loopen.
+
+Profileraren: en tråd samplar alla trådars stackar med PROFILE_SAMPLE_INTERVAL
+under N sekunder och skriver dem i "folded"-format (en rad per unik stack:
+"tråd;fil:funktion;...;fil:funktion antal"), som flamegraph.pl och speedscope
+läser. Starta den med miljövariabeln PROFILE_ENV_VAR=N vid uppstart eller
+signalen SIGUSR2 (inte på Windows).
+
+Båda är billiga nog att alltid vara på: vakthundstråden läser bara en float per
+varv och samplar bara när loopen har stannat, och profileraren körs bara på
+begäran.
+"""
+import asyncio
+import collections
+import itertools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from settings import (
+    LOG_DIR,
+    WATCHDOG_INTERVAL, WATCHDOG_STALL_THRESHOLD, WATCHDOG_REPORT_INTERVAL,
+    PROFILE_ENV_VAR, PROFILE_DEFAULT_SECONDS, PROFILE_SAMPLE_INTERVAL,
+)
+
+logger = logging.getLogger("Watchdog")
+
+# Signaler som hanteras just nu: id -> etikett (läses från vakthundstråden)
+_in_flight = {}
+_in_flight_ids = itertools.count()
+
+# Loopens fördröjning per hjärtslag i sekunder (de senaste)
+lag_samples = collections.deque(maxlen=1000)
+stats = {"stalls": 0, "max_lag": 0.0}
+
+_state = {"beat": None, "loop_thread": None, "profiling": False}
+
+
+@contextmanager
+def in_flight(label):
+    """Märk en signal som pågående så att ett loopstopp under den kan kopplas till den."""
+    key = next(_in_flight_ids)
+    _in_flight[key] = label
+    try:
+        yield
+    finally:
+        _in_flight.pop(key, None)
+
+
+def _format_stack(frame):
+    return "".join(traceback.format_stack(frame))
+
+
+def _watch(threshold, interval, stop):
+    """Vakthundstråden: logga loopens stack en gång per stopp som är längre än threshold."""
+    reported_beat = None
+    while not stop.wait(interval):
+        beat = _state["beat"]
+        if beat is None or beat == reported_beat:
+            continue
+        stalled = time.monotonic() - beat
+        if stalled < threshold:
+            continue
+        reported_beat = beat
+        stats["stalls"] += 1
+        frame = sys._current_frames().get(_state["loop_thread"])
+        signals = ", ".join(_in_flight.values()) or "none"
+        logger.warning("Event loop stalled for %.0f ms (in-flight signals: %s). Loop stack:\n%s",
+                       stalled * 1000, signals, _format_stack(frame) if frame is not None else "<unavailable>")
+
+
+async def run_watchdog(threshold=WATCHDOG_STALL_THRESHOLD, interval=WATCHDOG_INTERVAL):
+    """Bakgrundsuppgift: hjärtslag i loopen, mätning av fördröjning och en vakthundstråd."""
+    _state["loop_thread"] = threading.get_ident()
+    _state["beat"] = time.monotonic()
+    stop = threading.Event()
+    watcher = threading.Thread(target=_watch, args=(threshold, interval, stop), name="LoopWatchdog", daemon=True)
+    watcher.start()
+    install_profile_triggers()
+    beats_per_report = max(1, int(WATCHDOG_REPORT_INTERVAL / interval))
+    try:
+        for beat in itertools.count(1):
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = now - expected
+            lag_samples.append(lag)
+            if lag > stats["max_lag"]:
+                stats["max_lag"] = lag
+            _state["beat"] = now
+            if beat % beats_per_report == 0:
+                logger.info("Event loop lag p50=%.1f ms p99=%.1f ms max=%.1f ms, %s stalls.",
+                            *lag_percentiles(), stats["stalls"])
+    finally:
+        stop.set()
+        _state["beat"] = None
+
+
+def lag_percentiles():
+    """(p50, p99, max) av loopens fördröjning i ms för de senaste hjärtslagen."""
+    if not lag_samples:
+        return 0.0, 0.0, 0.0
+    ordered = sorted(lag_samples)
+    return (
+        ordered[len(ordered) // 2] * 1000,
+        ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        ordered[-1] * 1000,
+    )
+
+
+# --- Samplande profilerare ---
+def _fold(frame):
+    """Stacken från roten till frame som "fil:funktion;..."."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def sample_once(counts, names):
+    """Ta ett sampel av alla trådars stackar (utom den anropande) och räkna upp counts."""
+    own = threading.get_ident()
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == own:
+            continue
+        name = names.get(thread_id)
+        if name is None:
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            name = names.setdefault(thread_id, str(thread_id))
+        counts[f"{name};{_fold(frame)}"] += 1
+
+
+def sample_profile(seconds, sample_interval=PROFILE_SAMPLE_INTERVAL):
+    """Sampla alla trådars stackar under seconds sekunder. Returnerar Counter {folded_stack: antal}."""
+    counts = collections.Counter()
+    names = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sample_once(counts, names)
+        time.sleep(sample_interval)
+    return counts
+
+
+def write_folded(counts, path):
+    """Skriv samplen i folded-format (flamegraph.pl, speedscope)."""
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def start_profile(seconds=PROFILE_DEFAULT_SECONDS, output_dir=LOG_DIR):
+    """Kör profileraren i en bakgrundstråd. Returnerar tråden, eller None om en profilering redan pågår."""
+    if _state["profiling"]:
+        logger.warning("Profiler already running.")
+        return None
+    _state["profiling"] = True
+    path = os.path.join(output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+
+    def run():
+        try:
+            logger.info("Sampling profiler running for %s s.", seconds)
+            counts = sample_profile(seconds)
+            os.makedirs(output_dir, exist_ok=True)
+            write_folded(counts, path)
+            logger.info("Profile with %s samples written to %s.", sum(counts.values()), path)
+        except Exception as e:
+            logger.error("Profiler failed: %s", e)
+        finally:
+            _state["profiling"] = False
+
+    thread = threading.Thread(target=run, name="SamplingProfiler", daemon=True)
+    thread.start()
+    return thread
+
+
+def install_profile_triggers():
+    """Starta profileraren om PROFILE_ENV_VAR är satt, och på SIGUSR2 där signalen finns."""
+    seconds = os.getenv(PROFILE_ENV_VAR)
+    if seconds:
+        try:
+            start_profile(float(seconds))
+        except ValueError:
+            logger.error("Invalid %s=%r, expected seconds.", PROFILE_ENV_VAR, seconds)
+    if hasattr(signal, "SIGUSR2"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, start_profile)
+        except (NotImplementedError, RuntimeError):
+            pass
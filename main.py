@@ -1,69 +1,131 @@
 # main.py
+import startup_profile  # Måste importeras först: startpunkt för kallstartsmätningen
 from telethon import TelegramClient, events
 import asyncio
 import logging
+import os
 #import threading
 from settings import (
     TELEGRAM_API_ID,
     TELEGRAM_API_HASH,
-    GROUP_ID4,
-    MT5_PATH, MT5_PATH_ALT
-)
-from channel_4 import process_channel_4_signal, supervise_monitor_equity
-import MetaTrader5 as mt5
-#import gui_visualization  # Se till att den är i samma mapp eller ange rätt sökväg
-
-# Konfigurera loggning till konsolen med INFO-nivå
-logging.basicConfig(
-    level=logging.INFO,  # Ändra till INFO för mindre detaljerad loggning
-    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
+    MT5_PATH, MT5_PATH_ALT,
+    DASHBOARD_ENABLED, WATCHDOG_ENABLED, ROUTER_ENABLED,
+    TAPE_ENV_VAR
 )
+from channel_registry import enabled_plugins, preload
+from logging_setup import setup_logging, stop_logging
+import signal_recovery
+import mt5_tape
+
+# Konfigurera icke-blockerande loggning (kö + lyssnartråd, roterande JSON-filer och konsol)
+setup_logging()
 logger = logging.getLogger("MultiChannelBot")
 
+# Spela in alla MT5-anrop till ett band (mt5_tape) innan någon kanal importerar MetaTrader5
+if os.getenv(TAPE_ENV_VAR):
+    mt5_tape.install_recorder()
+startup_profile.mark("imports done")
+
 # Telegram-klient
 client = TelegramClient("multi_channel_session", TELEGRAM_API_ID, TELEGRAM_API_HASH)
 
 def ensure_mt5_initialized(mt5_path, alias="default"):
-    """Initialisera MetaTrader 5."""
-    if not mt5.initialize(mt5_path):
-        logger.error(f"Failed to initialize MT5 ({alias}) at path {mt5_path}.")
+    """Initialisera MetaTrader 5 via anslutningshanteraren (kanalerna återanvänder sedan anslutningen)."""
+    mt5_connection = startup_profile.timed_import("mt5_connection")
+    if not mt5_connection.connection(mt5_path, alias).connect():
+        logger.error("Failed to initialize MT5 (%s) at path %s.", alias, mt5_path)
         raise Exception(f"MT5 initialization failed for {alias}.")
-    logger.info(f"MetaTrader 5 ({alias}) initialized successfully.")
+    logger.info("MetaTrader 5 (%s) initialized successfully.", alias)
+
+def initialize_terminals():
+    """Initialisera båda MT5-terminalerna (körs i en tråd parallellt med Telegram-anslutningen)."""
+    # MetaTrader5-paketet är inte trådsäkert: alla anrop går genom ett gemensamt lås
+    startup_profile.timed_import("mt5_connection").serialize()
+    ensure_mt5_initialized(MT5_PATH, alias="Primary")
+    ensure_mt5_initialized(MT5_PATH_ALT, alias="Secondary")
+    startup_profile.mark("MT5 initialized")
+    # Indexera brokerns symboler (alias, suffix) och välj de handlade i Market Watch
+    startup_profile.timed_import("symbol_index").build()
+    startup_profile.mark("symbol index built")
+    # Läs symbolernas fyllnadslägen, decimaler och stops och kontrollera ordermallarna en gång med order_check
+    startup_profile.timed_import("order_templates").warm_up()
+    startup_profile.mark("order templates ready")
 
-@client.on(events.NewMessage(chats=GROUP_ID4))
-async def handle_channel_4(event):
-    logger.info("[Channel 4] New message received.")
-    await process_channel_4_signal(event.raw_text, MT5_PATH_ALT)
+def register_channel(plugin):
+    """Koppla en kanal-plugin till Telegram-klienten utan att importera dess modul."""
+    client.add_event_handler(signal_recovery.event_handler(plugin, client), events.NewMessage(chats=plugin.chats))
 
 async def main():
-    logger.info("Initializing MetaTrader 5 terminals...")
-    try:
-        ensure_mt5_initialized(MT5_PATH, alias="Primary")
-        ensure_mt5_initialized(MT5_PATH_ALT, alias="Secondary")
-    except Exception as e:
-        logger.error(f"Failed to initialize one or more MT5 terminals: {e}")
-        return
+    plugins = enabled_plugins()
+    for plugin in plugins:
+        register_channel(plugin)
 
-    logger.info("MetaTrader 5 terminals initialized. Starting Telegram client...")
+    logger.info("Initializing MetaTrader 5 terminals and starting Telegram client...")
     try:
-        # Starta GUI i en separat tråd för att inte blockera main loop
-        #gui_thread = threading.Thread(target=gui_visualization.start_gui)
-        #gui_thread.daemon = True
-        #gui_thread.start()
+        # Mät loopens fördröjning och logga stacken vid loopstopp; profileraren startas via miljövariabel/SIGUSR2
+        if WATCHDOG_ENABLED:
+            asyncio.create_task(startup_profile.timed_import("loop_watchdog").run_watchdog())
 
-        await client.start()  # Startar huvudklienten
+        # MT5-handskakningen och Telegram-inloggningen körs parallellt i stället för efter varandra
+        try:
+            await asyncio.gather(asyncio.to_thread(initialize_terminals), client.start())
+        except Exception as e:
+            logger.error("Failed to initialize MT5 terminals or Telegram client: %s", e)
+            return
+        startup_profile.mark("listening")
         logger.info("Telegram client started. Listening for messages...")
 
-        # Starta supervisorn för equity-övervakning
-        asyncio.create_task(supervise_monitor_equity())
+        # Välj kanalernas symboler, hämta historik och initiera indikatorerna innan första signalen
+        symbol_warmup = startup_profile.timed_import("symbol_warmup")
+        asyncio.create_task(symbol_warmup.run_warmup(plugins))
+
+        # Håll handelskalenderns trade_mode- och tickflaggor aktuella för kanalernas symboler
+        session_calendar = startup_profile.timed_import("session_calendar")
+        asyncio.create_task(session_calendar.run_session_calendar(symbol_warmup.watchlist(plugins)))
+
+        # Hälsokontroll av MT5-anslutningen och återanslutning med backoff i bakgrunden
+        asyncio.create_task(startup_profile.timed_import("mt5_connection").run_connection_monitor())
+
+        # Bygg om symbolindexet när terminalens symbollista ändras
+        asyncio.create_task(startup_profile.timed_import("symbol_index").run_symbol_index())
+
+        # Håll alla terminaler anslutna i egna processer och skicka nya order via den friskaste/snabbaste
+        if ROUTER_ENABLED:
+            asyncio.create_task(startup_profile.timed_import("terminal_router").run_router())
+
+        # Ladda kanalernas processorer i bakgrunden så att första signalen inte betalar importen
+        await asyncio.to_thread(preload, plugins)
+        startup_profile.mark("channels loaded")
+        startup_profile.report()
+
+        # Hämta signaler som postades medan boten var nere, och bevaka återanslutningar
+        asyncio.create_task(signal_recovery.catch_up(client, plugins))
+        asyncio.create_task(signal_recovery.watch_connection(client, plugins))
+
+        # Håll trendläget (EMA per tidsram) uppdaterat i bakgrunden så att signalfiltren bara läser en dictionary
+        trend_engine = startup_profile.timed_import("trend_engine")
+        asyncio.create_task(trend_engine.run_trend_engine())
+
+        # GUI:na (gui_visualization, Org_hedge_visual) körs som egna processer och läser ögonblicksbilder från delat minne
+        if DASHBOARD_ENABLED:
+            dashboard_shm = startup_profile.timed_import("dashboard_shm")
+            from communication import gui_updates
+            asyncio.create_task(dashboard_shm.run_dashboard_publisher(gui_updates))
+
+        # Starta kanalernas bakgrundsuppgifter (t.ex. supervisorn för equity-övervakning)
+        for plugin in plugins:
+            task = plugin.background_task()
+            if task is not None:
+                asyncio.create_task(task)
 
         # Håll Telegram-klienten aktiv
         await client.run_until_disconnected()
     except Exception as e:
-        logger.error(f"An error occurred while running the Telegram client: {e}")
+        logger.error("An error occurred while running the Telegram client: %s", e)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        mt5_tape.stop_recorder()
+        stop_logging()
@@ -0,0 +1,220 @@
+# mt5_connection.py
+"""
+Beständig MT5-anslutning med hälsokontroll och circuit breaker.
+
+Terminalen initieras en gång (vid start eller första signalen) i stället för
+med mt5.initialize() på varje meddelande. En bakgrundsuppgift kontrollerar
+hälsan billigt med terminal_info()/last_error() och återansluter med
+exponentiell backoff när terminalen är nere.
+
+Efter MT5_BREAKER_FAILURES misslyckanden i rad öppnas brytaren: då svarar
+ensure_connected() False direkt (inget handskakningsförsök), så signaler avvisas
+på mikrosekunder i stället för att vänta ut initialize-timeouten. Bakgrunds-
+uppgiften provar att ansluta igen (halvöppet läge) och stänger brytaren när det
+lyckas.
+
+MetaTrader5-paketet har en anslutning per process; anslutningen till en annan
+terminal byter därför den aktiva terminalen. Kanalerna anropar require_connection_async,
+som gör bytet (en ny initialize-handskakning) i en tråd i stället för på event-loopen.
+
+Paketet är inte heller trådsäkert, medan signaler, hedgar, stängningar och
+bakgrundsuppgifter anropar det från olika trådar (asyncio.to_thread). serialize()
+lägger MT5_LOCK runt varje funktion i modulen, så att anropen körs ett i taget;
+väntan mellan anropen (hastighetsbegränsning, omförsök) sker utan låset.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+import MetaTrader5 as mt5
+
+from settings import (
+    MT5_HEALTH_INTERVAL, MT5_BREAKER_FAILURES,
+    MT5_RECONNECT_BACKOFF, MT5_RECONNECT_MAX_BACKOFF,
+)
+
+logger = logging.getLogger("MT5Connection")
+
+CLOSED = "closed"  # Frisk: anrop släpps igenom
+OPEN = "open"  # Nere: anrop avvisas direkt
+HALF_OPEN = "half_open"  # Återanslutningsförsök pågår
+
+
+# Ett lås för alla anrop till MetaTrader5-paketet (RLock: initialize anropas under anslutningens lås)
+MT5_LOCK = threading.RLock()
+
+
+class TerminalUnavailable(RuntimeError):
+    """Terminalen är inte ansluten (eller brytaren är öppen)."""
+
+
+class TerminalConnection:
+    """Anslutningsstatus och circuit breaker för en terminal (sökväg)."""
+
+    def __init__(self, path, alias=None):
+        self.path = path
+        self.alias = alias or path
+        self.state = CLOSED
+        self.healthy = False
+        self.failures = 0  # Misslyckanden i rad
+        self.retry_at = 0.0  # time.monotonic() för nästa återanslutningsförsök när brytaren är öppen
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Initiera terminalen (blockerande). Returnerar True om anslutningen lyckades."""
+        with self._lock:
+            if mt5.initialize(self.path):
+                _active["path"] = self.path
+                # Kontot styr bland annat vilken bucket i order_rate_limiter som förfrågningarna räknas mot
+                info = mt5.account_info()
+                _active["account"] = info.login if info is not None else None
+                self._succeeded()
+                logger.info("MetaTrader 5 (%s) connected.", self.alias)
+                return True
+            self._failed(mt5.last_error())
+            return False
+
+    def check(self):
+        """Billig hälsokontroll av den aktiva terminalen med terminal_info()."""
+        info = mt5.terminal_info()
+        if info is not None and info.connected:
+            self._succeeded()
+            return True
+        self._failed(mt5.last_error())
+        return False
+
+    def _succeeded(self):
+        if self.state != CLOSED:
+            logger.info("MetaTrader 5 (%s) healthy again; closing circuit breaker.", self.alias)
+        self.state = CLOSED
+        self.healthy = True
+        self.failures = 0
+        self.last_error = None
+
+    def _failed(self, error):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = error
+        if self.failures >= MT5_BREAKER_FAILURES:
+            backoff = min(MT5_RECONNECT_MAX_BACKOFF, MT5_RECONNECT_BACKOFF * 2 ** (self.failures - MT5_BREAKER_FAILURES))
+            self.retry_at = time.monotonic() + backoff
+            if self.state != OPEN:
+                logger.error("MetaTrader 5 (%s) unavailable (%s); opening circuit breaker.", self.alias, error)
+            self.state = OPEN
+        else:
+            logger.warning("MetaTrader 5 (%s) connection check failed (%s).", self.alias, error)
+
+
+# sökväg -> TerminalConnection
+_connections = {}
+# Terminalen som MetaTrader5-paketet är anslutet till just nu och dess inloggning
+_active = {"path": None, "account": None}
+
+
+def connection(path, alias=None):
+    """Returnera (och skapa vid behov) anslutningen för en terminal."""
+    conn = _connections.get(path)
+    if conn is None:
+        conn = _connections.setdefault(path, TerminalConnection(path, alias))
+    return conn
+
+
+def ensure_connected(path):
+    """
+    Sant om terminalen är ansluten och frisk. Ansluter bara om den inte redan är det;
+    med öppen brytare returneras False direkt utan handskakning.
+    """
+    conn = connection(path)
+    if conn.state != CLOSED:
+        return False  # Brytaren är öppen eller bakgrundsuppgiften försöker återansluta
+    if conn.healthy and _active["path"] == path:
+        return True
+    return conn.connect()
+
+
+def require_connection(path):
+    """Som ensure_connected men kastar TerminalUnavailable om terminalen inte kan användas."""
+    if not ensure_connected(path):
+        conn = connection(path)
+        raise TerminalUnavailable(f"MetaTrader 5 ({conn.alias}) unavailable: {conn.last_error} (circuit {conn.state}).")
+
+
+def active_account():
+    """Inloggningen för den anslutna terminalen, eller "default" innan någon anslutning har lyckats."""
+    account = _active["account"]
+    return "default" if account is None else account
+
+
+def is_connected(path):
+    """Sant om terminalen är den aktiva och frisk, utan något anrop till terminalen."""
+    conn = _connections.get(path)
+    return conn is not None and conn.state == CLOSED and conn.healthy and _active["path"] == path
+
+
+async def ensure_connected_async(path):
+    """Som ensure_connected men en handskakning (första anslutningen eller terminalbyte) görs i en tråd."""
+    if is_connected(path):
+        return True
+    return await asyncio.to_thread(ensure_connected, path)
+
+
+async def require_connection_async(path):
+    """Som require_connection men en handskakning (första anslutningen eller terminalbyte) görs i en tråd."""
+    if not is_connected(path):
+        await asyncio.to_thread(require_connection, path)
+
+
+def _maintain(now):
+    """Ett varv i bakgrunden: hälsokontroll av den aktiva terminalen och återanslutning av öppna brytare."""
+    for conn in list(_connections.values()):
+        if conn.state == OPEN:
+            if now >= conn.retry_at:
+                conn.state = HALF_OPEN
+                logger.info("Reconnecting MetaTrader 5 (%s), attempt %s.", conn.alias, conn.failures + 1)
+                conn.connect()
+        elif conn.path == _active["path"]:
+            conn.check()
+
+
+async def run_connection_monitor(interval=MT5_HEALTH_INTERVAL):
+    """Bakgrundsuppgift: hälsokontroller och återanslutning med backoff."""
+    while True:
+        try:
+            await asyncio.to_thread(_maintain, time.monotonic())
+        except Exception as e:
+            logger.error("Error in MT5 connection monitor: %s", e)
+        await asyncio.sleep(interval)
+
+
+def _serialized(func):
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        with MT5_LOCK:
+            return func(*args, **kwargs)
+    call.serialized = True
+    return call
+
+
+def serialize(module=None):
+    """
+    Lägg MT5_LOCK runt varje funktion i MetaTrader5-modulen (standard: den importerade).
+
+    Alla moduler delar samma modulobjekt, så det räcker att göra det en gång vid start.
+    Konstanter och typer lämnas orörda; redan serialiserade funktioner hoppas över.
+    """
+    module = module or mt5
+    for name, value in list(vars(module).items()):
+        if name.startswith("_") or isinstance(value, type) or not callable(value) or getattr(value, "serialized", False):
+            continue
+        setattr(module, name, _serialized(value))
+    return module
+
+
+def reset():
+    """Glöm alla anslutningar (används av tester)."""
+    _connections.clear()
+    _active["path"] = None
+    _active["account"] = None
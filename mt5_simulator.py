@@ -0,0 +1,439 @@
+# mt5_simulator.py
+"""Simulerad MetaTrader5-backend.
+
+Används av benchmarks och tester så att kanalernas kod kan köras utan en
+riktig terminal (MetaTrader5-paketet finns bara för Windows). En
+SimulatedTerminal exponerar samma funktioner och konstanter som
+MetaTrader5-modulen och kan installeras i stället för den via as_module().
+"""
+import sys
+import time
+import types
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+# --- Konstanter (samma värden som MetaTrader5-paketet) ---
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TYPE_BUY_LIMIT = 2
+ORDER_TYPE_SELL_LIMIT = 3
+ORDER_TYPE_BUY_STOP = 4
+ORDER_TYPE_SELL_STOP = 5
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+
+ORDER_TIME_GTC = 0
+
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+
+SYMBOL_TRADE_MODE_DISABLED = 0
+SYMBOL_TRADE_MODE_LONGONLY = 1
+SYMBOL_TRADE_MODE_SHORTONLY = 2
+SYMBOL_TRADE_MODE_CLOSEONLY = 3
+SYMBOL_TRADE_MODE_FULL = 4
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_ERROR = 10011
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_TRADE_DISABLED = 10017
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_EXPIRATION = 10022
+TRADE_RETCODE_TOO_MANY_REQUESTS = 10024
+TRADE_RETCODE_CONNECTION = 10031
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_FROZEN = 10029
+
+RES_S_OK = 1
+RES_E_INTERNAL_FAIL_INIT = -10005
+
+# --- Datatyper (fältnamn enligt MetaTrader5-paketet, i förenklad form) ---
+TradePosition = namedtuple("TradePosition", [
+    "ticket", "time", "time_msc", "time_update", "time_update_msc", "type", "magic",
+    "identifier", "reason", "volume", "price_open", "sl", "tp", "price_current",
+    "swap", "profit", "symbol", "comment", "external_id",
+])
+TradeOrder = namedtuple("TradeOrder", [
+    "ticket", "time_setup", "type", "volume_initial", "volume_current", "price_open",
+    "sl", "tp", "symbol", "comment", "magic",
+])
+SymbolInfo = namedtuple("SymbolInfo", [
+    "name", "visible", "select", "digits", "point", "spread", "trade_mode",
+    "trade_stops_level", "trade_freeze_level", "trade_contract_size",
+    "trade_tick_value", "trade_tick_size", "volume_min", "volume_max",
+    "volume_step", "filling_mode", "bid", "ask", "path",
+])
+Tick = namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"])
+AccountInfo = namedtuple("AccountInfo", [
+    "login", "leverage", "balance", "credit", "profit", "equity", "margin",
+    "margin_free", "margin_level", "currency", "server",
+])
+TerminalInfo = namedtuple("TerminalInfo", [
+    "connected", "trade_allowed", "ping_last", "build", "name", "path",
+])
+OrderSendResult = namedtuple("OrderSendResult", [
+    "retcode", "deal", "order", "volume", "price", "bid", "ask", "comment",
+    "request_id", "retcode_external", "request",
+])
+OrderCheckResult = namedtuple("OrderCheckResult", [
+    "retcode", "balance", "equity", "profit", "margin", "margin_free",
+    "margin_level", "comment", "request",
+])
+
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("close", "<f8"), ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60,
+    TIMEFRAME_M5: 300,
+    TIMEFRAME_M15: 900,
+    TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600,
+    TIMEFRAME_H4: 14400,
+    TIMEFRAME_D1: 86400,
+}
+
+# Symbolspecifikationer: (digits, kontraktsstorlek, startpris, volatilitet per bar)
+DEFAULT_SYMBOLS = {
+    "XAUUSD": (2, 100.0, 2630.0, 0.8),
+    "EURUSD": (5, 100000.0, 1.0500, 0.0002),
+    "GBPUSD": (5, 100000.0, 1.2600, 0.0002),
+    "DJ30": (2, 1.0, 43000.0, 8.0),
+    "BTCUSD": (2, 1.0, 97000.0, 40.0),
+}
+
+CONSTANT_NAMES = [name for name in dir(sys.modules[__name__]) if name.isupper()]
+
+
+class SimulatedTerminal:
+    """En terminal i minnet med positioner, ordrar, kurser och konto."""
+
+    def __init__(self, symbols=None, balance=10000.0, leverage=100, bars=5000, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.leverage = leverage
+        self.balance = balance
+        self.login = 1  # Kontonumret i account_info (byt för att simulera en terminal med ett annat konto)
+        self.bars = bars
+        self.connected = True
+        self.latency = 0.0  # Sekunder som varje anrop sover, för latensexperiment
+        self.retcode_script = []  # Retcodes som returneras av kommande order_send, i ordning
+        self.calls = 0
+        self.positions = {}
+        self.positions_by_symbol = defaultdict(dict)
+        self.open_profit = 0.0
+        self.used_margin = 0.0
+        self.orders = {}
+        self.next_ticket = 1000000
+        self.now = int(time.time())
+        self.symbols = {}
+        self.rates = {}
+        for name, spec in (symbols or DEFAULT_SYMBOLS).items():
+            self.add_symbol(name, *spec)
+
+    # --- Uppsättning ---
+    def add_symbol(self, name, digits, contract_size, price, volatility):
+        point = 10 ** -digits
+        self.symbols[name] = SymbolInfo(
+            name=name, visible=True, select=True, digits=digits, point=point, spread=10,
+            trade_mode=SYMBOL_TRADE_MODE_FULL, trade_stops_level=10, trade_freeze_level=0,
+            trade_contract_size=contract_size, trade_tick_value=contract_size * point,
+            trade_tick_size=point, volume_min=0.01, volume_max=100.0, volume_step=0.01,
+            filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC, bid=price, ask=price + 10 * point,
+            path=f"Simulated\\{name}",
+        )
+        self.rates[name] = self._generate_rates(price, volatility, point)
+
+    def _generate_rates(self, price, volatility, point, count=None):
+        count = count or self.bars
+        closes = price + np.cumsum(self.rng.normal(0.0, volatility, count))
+        opens = np.concatenate(([price], closes[:-1]))
+        spread = np.abs(self.rng.normal(0.0, volatility, count))
+        rates = np.zeros(count, dtype=RATES_DTYPE)
+        rates["time"] = self.now - 60 * np.arange(count, 0, -1)
+        rates["open"] = opens
+        rates["close"] = closes
+        rates["high"] = np.maximum(opens, closes) + spread
+        rates["low"] = np.minimum(opens, closes) - spread
+        rates["tick_volume"] = 100
+        rates["spread"] = 10
+        return rates
+
+    def advance(self, bars=1):
+        """Låt tiden gå: lägg till nya M1-barer (slumpvandring från senaste close) för alla symboler."""
+        self.now += 60 * bars
+        for name, rates in self.rates.items():
+            info = self.symbols[name]
+            volatility = float(np.std(np.diff(rates["close"][-100:]))) or info.point
+            new = self._generate_rates(float(rates["close"][-1]), volatility, info.point, bars)
+            self.rates[name] = np.concatenate((rates, new))
+            self.symbols[name] = info._replace(bid=float(new["close"][-1]), ask=float(new["close"][-1]) + info.spread * info.point)
+
+    def seed_positions(self, count, symbols=None, loss_share=0.2):
+        """Öppna count positioner fördelade över symbolerna; loss_share av dem ligger på förlust."""
+        names = list(symbols or self.symbols)
+        for i in range(count):
+            symbol = names[i % len(names)]
+            info = self.symbols[symbol]
+            profit = -50.0 if self.rng.random() < loss_share else float(self.rng.uniform(-5.0, 5.0))
+            self._open_position(symbol, ORDER_TYPE_BUY if i % 2 == 0 else ORDER_TYPE_SELL, 0.1,
+                                info.ask, "Original_order", profit=profit)
+
+    def _open_position(self, symbol, order_type, volume, price, comment, magic=0, profit=0.0, sl=0.0, tp=0.0):
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        self.open_profit += profit
+        self.used_margin += self.order_calc_margin(order_type, symbol, volume, price)
+        self.positions[ticket] = self.positions_by_symbol[symbol][ticket] = TradePosition(
+            ticket=ticket, time=self.now, time_msc=self.now * 1000, time_update=self.now,
+            time_update_msc=self.now * 1000, type=order_type, magic=magic, identifier=ticket,
+            reason=0, volume=volume, price_open=price, sl=sl, tp=tp, price_current=price,
+            swap=0.0, profit=profit, symbol=symbol, comment=comment, external_id="",
+        )
+        return ticket
+
+    def _close_position(self, ticket):
+        position = self.positions.pop(ticket, None)
+        if position is not None:
+            self.positions_by_symbol[position.symbol].pop(ticket, None)
+            self.balance += position.profit
+            self.open_profit -= position.profit
+            self.used_margin -= self.order_calc_margin(position.type, position.symbol, position.volume, position.price_open)
+        return position
+
+    def restore_positions(self, positions):
+        """Återställ positionsboken till en tidigare ögonblicksbild (dict ticket -> TradePosition)."""
+        self.positions = dict(positions)
+        self.positions_by_symbol = defaultdict(dict)
+        self.open_profit = 0.0
+        self.used_margin = 0.0
+        for ticket, position in self.positions.items():
+            self.positions_by_symbol[position.symbol][ticket] = position
+            self.open_profit += position.profit
+            self.used_margin += self.order_calc_margin(position.type, position.symbol, position.volume, position.price_open)
+
+    def _sleep(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- MetaTrader5-API ---
+    def initialize(self, path=None, **kwargs):
+        self._sleep()
+        return self.connected
+
+    def shutdown(self):
+        return None
+
+    def last_error(self):
+        if self.connected:
+            return (RES_S_OK, "Success")
+        return (RES_E_INTERNAL_FAIL_INIT, "Terminal: Call failed")
+
+    def terminal_info(self):
+        self._sleep()
+        if not self.connected:
+            return None
+        return TerminalInfo(connected=True, trade_allowed=True, ping_last=int(self.latency * 1e6),
+                            build=4755, name="Simulated", path="")
+
+    def account_info(self):
+        self._sleep()
+        if not self.connected:
+            return None
+        profit = self.open_profit
+        margin = self.used_margin
+        equity = self.balance + profit
+        return AccountInfo(
+            login=self.login, leverage=self.leverage, balance=self.balance, credit=0.0, profit=profit,
+            equity=equity, margin=margin, margin_free=equity - margin,
+            margin_level=(equity / margin * 100) if margin else 0.0, currency="USD", server="Simulated",
+        )
+
+    def symbols_get(self, group=None):
+        self._sleep()
+        return tuple(self.symbols.values())
+
+    def symbols_total(self):
+        return len(self.symbols)
+
+    def symbol_info(self, symbol):
+        self._sleep()
+        return self.symbols.get(symbol)
+
+    def symbol_select(self, symbol, enable=True):
+        self._sleep()
+        info = self.symbols.get(symbol)
+        if info is None:
+            return False
+        self.symbols[symbol] = info._replace(visible=enable, select=enable)
+        return True
+
+    def symbol_info_tick(self, symbol):
+        self._sleep()
+        info = self.symbols.get(symbol)
+        if info is None or not self.connected:
+            return None
+        return Tick(time=self.now, bid=info.bid, ask=info.ask, last=info.bid, volume=0,
+                    time_msc=self.now * 1000, flags=6, volume_real=0.0)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self._sleep()
+        rates = self.rates.get(symbol)
+        if rates is None:
+            return None
+        end = len(rates) - start_pos
+        return rates[max(0, end - count):end].copy()
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        self._sleep()
+        rates = self.rates.get(symbol)
+        if rates is None:
+            return None
+        end = int(np.searchsorted(rates["time"], int(date_from), side="right"))
+        return rates[max(0, end - count):end].copy()
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        self._sleep()
+        if not self.connected:
+            return None
+        if ticket is not None:
+            position = self.positions.get(ticket)
+            return (position,) if position else ()
+        if symbol is not None:
+            return tuple(self.positions_by_symbol[symbol].values())
+        return tuple(self.positions.values())
+
+    def positions_total(self):
+        return len(self.positions)
+
+    def orders_get(self, symbol=None, ticket=None, group=None):
+        self._sleep()
+        if symbol is not None:
+            return tuple(o for o in self.orders.values() if o.symbol == symbol)
+        return tuple(self.orders.values())
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        info = self.symbols.get(symbol)
+        if info is None:
+            return None
+        return volume * info.trade_contract_size * price / self.leverage
+
+    def _validate(self, request):
+        """Retcode för ogiltiga parametrar (som terminalen skulle avvisa), annars None."""
+        info = self.symbols.get(request.get("symbol"))
+        if info is None:
+            return TRADE_RETCODE_INVALID
+        filling = request.get("type_filling")
+        if request.get("action") == TRADE_ACTION_DEAL and filling is not None:
+            supported = {ORDER_FILLING_FOK: SYMBOL_FILLING_FOK, ORDER_FILLING_IOC: SYMBOL_FILLING_IOC}
+            if filling not in supported or not info.filling_mode & supported[filling]:
+                return TRADE_RETCODE_INVALID_FILL
+        volume = request.get("volume")
+        if volume is not None and request.get("action") in (TRADE_ACTION_DEAL, TRADE_ACTION_PENDING):
+            if volume < info.volume_min or volume > info.volume_max:
+                return TRADE_RETCODE_INVALID_VOLUME
+        return None
+
+    def order_check(self, request):
+        self._sleep()
+        account = self.account_info()
+        retcode = self._validate(request) or 0
+        return OrderCheckResult(
+            retcode=retcode, balance=account.balance, equity=account.equity, profit=account.profit,
+            margin=account.margin, margin_free=account.margin_free, margin_level=account.margin_level,
+            comment="Done" if retcode == 0 else "Invalid request", request=request,
+        )
+
+    def order_send(self, request):
+        self._sleep()
+        symbol = request.get("symbol")
+        info = self.symbols.get(symbol)
+        retcode = self.retcode_script.pop(0) if self.retcode_script else TRADE_RETCODE_DONE
+        retcode = self._validate(request) or retcode
+        if retcode != TRADE_RETCODE_DONE:
+            return OrderSendResult(retcode=retcode, deal=0, order=0, volume=0.0, price=0.0,
+                                   bid=info.bid if info else 0.0, ask=info.ask if info else 0.0,
+                                   comment="Rejected", request_id=0, retcode_external=0, request=request)
+
+        action = request.get("action")
+        ticket = 0
+        if action == TRADE_ACTION_DEAL and request.get("position"):
+            self._close_position(request["position"])
+            ticket = request["position"]
+        elif action == TRADE_ACTION_DEAL:
+            ticket = self._open_position(symbol, request["type"], request["volume"], request.get("price", info.ask),
+                                         request.get("comment", ""), magic=request.get("magic", 0),
+                                         sl=request.get("sl", 0.0), tp=request.get("tp", 0.0))
+        elif action == TRADE_ACTION_PENDING:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            self.orders[ticket] = TradeOrder(
+                ticket=ticket, time_setup=self.now, type=request["type"], volume_initial=request["volume"],
+                volume_current=request["volume"], price_open=request["price"], sl=request.get("sl", 0.0),
+                tp=request.get("tp", 0.0), symbol=symbol, comment=request.get("comment", ""),
+                magic=request.get("magic", 0),
+            )
+        elif action == TRADE_ACTION_SLTP:
+            position = self.positions.get(request.get("position"))
+            if position:
+                self.positions[position.ticket] = self.positions_by_symbol[symbol][position.ticket] = position._replace(sl=request.get("sl", 0.0), tp=request.get("tp", 0.0))
+                ticket = position.ticket
+        elif action == TRADE_ACTION_REMOVE:
+            self.orders.pop(request.get("order"), None)
+            ticket = request.get("order", 0)
+
+        return OrderSendResult(retcode=TRADE_RETCODE_DONE, deal=ticket, order=ticket,
+                               volume=request.get("volume", 0.0), price=request.get("price", 0.0),
+                               bid=info.bid, ask=info.ask, comment="Request executed",
+                               request_id=ticket, retcode_external=0, request=request)
+
+    def as_module(self):
+        """Returnera en modul som ser ut som MetaTrader5 men anropar denna terminal."""
+        module = types.ModuleType("MetaTrader5")
+        this = sys.modules[__name__]
+        for name in CONSTANT_NAMES:
+            setattr(module, name, getattr(this, name))
+        for name in [
+            "initialize", "shutdown", "last_error", "terminal_info", "account_info",
+            "symbols_get", "symbols_total", "symbol_info", "symbol_select", "symbol_info_tick",
+            "copy_rates_from_pos", "copy_rates_from", "positions_get", "positions_total",
+            "orders_get", "order_calc_margin", "order_check", "order_send",
+        ]:
+            setattr(module, name, getattr(self, name))
+        module.terminal = self
+        return module
+
+
+def install(terminal=None):
+    """Registrera en simulerad terminal som MetaTrader5 i sys.modules och returnera modulen."""
+    module = (terminal or SimulatedTerminal()).as_module()
+    sys.modules["MetaTrader5"] = module
+    return module
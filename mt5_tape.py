@@ -0,0 +1,350 @@
+# mt5_tape.py
+"""
+Inspelning och uppspelning av alla anrop till MetaTrader5.
+
+Inspelning: install_recorder() byter ut MetaTrader5 i sys.modules mot en modul
+som anropar den riktiga terminalen och skriver varje anrop (funktion,
+argument, resultat, starttid och tidsåtgång) till ett band på disk. Signaler
+och övervakningsvarv skrivs som händelser (mark()), så att uppspelningen vet
+vad som drev anropen. Kodningen och skrivningen görs av en egen tråd.
+
+Bandet är en följd av poster: 4 byte längd + zlib-komprimerad pickle. Resultat
+från MetaTrader5 (namedtuples, tuples av namedtuples, numpy-arrayer) lagras
+utan beroende till MetaTrader5-paketet, så bandet kan spelas upp på Linux.
+Filerna roteras vid TAPE_MAX_BYTES och varje fil börjar med terminalens
+konstanter, så en enskild fil går att spela upp.
+
+Uppspelning: ReplayTerminal serverar de inspelade resultaten till den
+oförändrade koden i full fart. Anrop matchas på funktion och argument (för
+order_send/order_check på action, symbol, typ och position); finns ingen
+matchning används senaste resultatet för funktionen och en miss räknas.
+
+    python mt5_tape.py replay tapes/tape-*.mt5tape [--repeat N]
+
+kör om händelserna (signaler och equity-varv) och skriver processningstiden, så
+att en incident kan köras om och kostnaden jämföras mellan kodversioner.
+"""
+import argparse
+import collections
+import glob
+import importlib
+import logging
+import os
+import pickle
+import queue
+import struct
+import sys
+import threading
+import time
+import types
+import zlib
+from collections import deque, namedtuple
+
+from settings import TAPE_DIR, TAPE_MAX_BYTES, TAPE_BACKUP_COUNT
+
+logger = logging.getLogger("MT5Tape")
+
+_LENGTH = struct.Struct("<I")
+_NAMEDTUPLE = "__nt__"
+_NAMEDTUPLES = "__nts__"
+# Fält i en orderförfrågan som identifierar den vid uppspelning (priset varierar mellan körningar)
+REQUEST_KEY_FIELDS = ("action", "symbol", "type", "position", "order", "comment")
+
+_recorder = None
+
+
+# --- Kodning ---
+def _is_namedtuple(value):
+    return isinstance(value, tuple) and hasattr(value, "_fields")
+
+
+def encode(value):
+    """Gör om MetaTrader5-resultat till inbyggda typer (namedtuples blir märkta tuples)."""
+    if _is_namedtuple(value):
+        return (_NAMEDTUPLE, type(value).__name__, value._fields, tuple(encode(v) for v in value))
+    if isinstance(value, tuple):
+        if value and all(_is_namedtuple(v) for v in value):
+            # positions_get m.fl.: namn och fält en gång för hela tuplen
+            first = value[0]
+            return (_NAMEDTUPLES, type(first).__name__, first._fields, [tuple(encode(f) for f in v) for v in value])
+        return tuple(encode(v) for v in value)
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    return value
+
+
+_types = {}
+
+
+def _namedtuple_type(name, fields):
+    key = (name, tuple(fields))
+    cls = _types.get(key)
+    if cls is None:
+        cls = _types[key] = namedtuple(name, fields)
+    return cls
+
+
+def decode(value):
+    """Motsatsen till encode."""
+    if isinstance(value, tuple) and value:
+        if value[0] == _NAMEDTUPLE and len(value) == 4:
+            return _namedtuple_type(value[1], value[2])(*(decode(v) for v in value[3]))
+        if value[0] == _NAMEDTUPLES and len(value) == 4:
+            cls = _namedtuple_type(value[1], value[2])
+            return tuple(cls(*(decode(f) for f in v)) for v in value[3])
+        return tuple(decode(v) for v in value)
+    if isinstance(value, dict):
+        return {k: decode(v) for k, v in value.items()}
+    return value
+
+
+def module_constants(module):
+    """Terminalens konstanter (ORDER_TYPE_BUY, TRADE_RETCODE_DONE, TIMEFRAME_M1 ...)."""
+    return {name: value for name, value in vars(module).items()
+            if name.isupper() and isinstance(value, (int, float, str))}
+
+
+# --- Inspelning ---
+class TapeRecorder:
+    """Skriver poster till roterande bandfiler från en egen tråd."""
+
+    def __init__(self, constants, directory=TAPE_DIR, max_bytes=TAPE_MAX_BYTES, backup_count=TAPE_BACKUP_COUNT):
+        self.constants = constants
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.origin = time.perf_counter()
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._size = 0
+        self._index = 0
+        self._thread = threading.Thread(target=self._run, name="TapeRecorder", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._index += 1
+        path = os.path.join(self.directory, f"tape-{time.strftime('%Y%m%d-%H%M%S')}-{self._index:04d}.mt5tape")
+        self._file = open(path, "wb")
+        self._size = 0
+        self._append(("constants", self.constants))
+        tapes = sorted(glob.glob(os.path.join(self.directory, "tape-*.mt5tape")), key=os.path.getmtime)
+        for old in tapes[:-self.backup_count] if self.backup_count else ():
+            os.remove(old)
+        logger.info("Recording MT5 tape to %s.", path)
+
+    def _append(self, record):
+        data = zlib.compress(pickle.dumps(encode(record), protocol=pickle.HIGHEST_PROTOCOL), 1)
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        self._size += _LENGTH.size + len(data)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                if self._file is None or self._size >= self.max_bytes:
+                    if self._file is not None:
+                        self._file.close()
+                    self._open()
+                self._append(record)
+            except Exception as e:
+                logger.error("Failed to write MT5 tape record: %s", e)
+        if self._file is not None:
+            self._file.close()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def recording_module(real, recorder):
+    """En modul som ser ut som MetaTrader5, anropar real och spelar in varje anrop."""
+    module = types.ModuleType("MetaTrader5")
+    for name, value in vars(real).items():
+        if name.startswith("__"):
+            continue
+        if callable(value) and not isinstance(value, type):
+            value = _recorded(name, value, recorder)
+        setattr(module, name, value)
+    return module
+
+
+def _recorded(name, function, recorder):
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        recorder.write(("call", name, args, kwargs, result, start - recorder.origin, time.perf_counter() - start))
+        return result
+    call.__name__ = name
+    return call
+
+
+def install_recorder(**options):
+    """Spela in alla MetaTrader5-anrop från och med nu. Måste köras innan kanalerna importerar MetaTrader5."""
+    global _recorder
+    real = importlib.import_module("MetaTrader5")
+    _recorder = TapeRecorder(module_constants(real), **options)
+    sys.modules["MetaTrader5"] = recording_module(real, _recorder)
+    return _recorder
+
+
+def stop_recorder():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def mark(kind, **data):
+    """Skriv en händelse (t.ex. en signal) till bandet om inspelning pågår."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.write(("event", kind, data, time.perf_counter() - recorder.origin))
+
+
+# --- Uppspelning ---
+def read_tape(paths):
+    """Läs och avkoda alla poster i bandfilerna, i ordning."""
+    for path in paths:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_LENGTH.size)
+                if len(header) < _LENGTH.size:
+                    break
+                (length,) = _LENGTH.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    logger.warning("Truncated record at end of %s.", path)
+                    break
+                yield decode(pickle.loads(zlib.decompress(data)))
+
+
+def call_key(name, args, kwargs):
+    """Nyckel som ett anrop matchas på vid uppspelning."""
+    if name in ("order_send", "order_check") and args and isinstance(args[0], dict):
+        return name, tuple(args[0].get(field) for field in REQUEST_KEY_FIELDS)
+    return name, repr(args), repr(sorted(kwargs.items()))
+
+
+# Svar när ett anrop aldrig spelades in (t.ex. anslutningen gjordes före inspelningen)
+REPLAY_DEFAULTS = {"initialize": True, "shutdown": None, "last_error": (1, "Success")}
+
+
+class ReplayTerminal:
+    """Serverar inspelade resultat i samma ordning som de spelades in."""
+
+    def __init__(self, records):
+        self.constants = {}
+        self.events = []
+        self._recorded = []  # (call_key, resultat)
+        for record in records:
+            kind = record[0]
+            if kind == "constants":
+                self.constants.update(record[1])
+            elif kind == "event":
+                self.events.append((record[1], record[2]))
+            elif kind == "call":
+                _, name, args, kwargs, result = record[:5]
+                self._recorded.append((call_key(name, args, kwargs), result))
+        self.rewind()
+
+    def rewind(self):
+        """Börja om från bandets början."""
+        self._results = collections.defaultdict(deque)  # call_key -> resultat
+        self._last = dict(REPLAY_DEFAULTS)  # funktion -> senast serverade resultat
+        for key, result in self._recorded:
+            self._results[key].append(result)
+            self._last.setdefault(key[0], result)
+        self.calls = 0
+        self.misses = collections.Counter()
+
+    def call(self, name, *args, **kwargs):
+        self.calls += 1
+        served = self._results.get(call_key(name, args, kwargs))
+        if served:
+            result = served.popleft()
+            self._last[name] = result
+            return result
+        if name not in REPLAY_DEFAULTS:
+            self.misses[name] += 1
+        return self._last.get(name)
+
+    def as_module(self):
+        module = types.ModuleType("MetaTrader5")
+        for name, value in self.constants.items():
+            setattr(module, name, value)
+        names = {key[0] for key, _ in self._recorded} | set(REPLAY_DEFAULTS) | {"terminal_info"}
+        for name in names:
+            setattr(module, name, lambda *args, _name=name, **kwargs: self.call(_name, *args, **kwargs))
+        module.replay = self
+        return module
+
+
+async def _drive(events, strategies):
+    import channel_4
+    from channel_registry import CHANNEL_PLUGINS
+
+    # Övervakningsvarven drivs av bandets händelser, inte av en egen loop
+    channel_4.monitoring_equity = True
+    timings = collections.defaultdict(list)
+    for kind, data in events:
+        start = time.perf_counter()
+        if kind == "signal":
+            plugin = CHANNEL_PLUGINS.get(data["channel"])
+            if plugin is None:
+                continue
+            await plugin.handle(data["message"], None)
+        elif kind == "equity_cycle":
+            await channel_4.run_equity_cycle(strategies[data["strategy"]])
+        else:
+            continue
+        timings[kind].append(time.perf_counter() - start)
+    return timings
+
+
+def replay(paths, repeat=1):
+    """Spela upp banden mot den oförändrade koden. Returnerar ({händelse: [sekunder, ...]}, terminal)."""
+    import asyncio
+
+    terminal = ReplayTerminal(read_tape(paths))
+    # Installeras innan kanalerna importeras, så att de binder uppspelningen som MetaTrader5
+    sys.modules["MetaTrader5"] = terminal.as_module()
+
+    import order_rate_limiter
+    from strategy import STRATEGIES
+    order_rate_limiter.configure(1e9, 1e9)  # Full fart: ingen takt mot en inspelad terminal
+
+    timings = collections.defaultdict(list)
+    for _ in range(repeat):
+        terminal.rewind()
+        for kind, values in asyncio.run(_drive(terminal.events, STRATEGIES)).items():
+            timings[kind].extend(values)
+    return timings, terminal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded MT5 tape against the current code.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_parser = sub.add_parser("replay")
+    replay_parser.add_argument("tapes", nargs="+")
+    replay_parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    paths = sorted(path for pattern in args.tapes for path in glob.glob(pattern))
+    timings, terminal = replay(paths, args.repeat)
+    for kind, values in sorted(timings.items()):
+        ordered = sorted(values)
+        print(f"{kind:14s} n={len(values):6d} total={sum(values) * 1000:10.1f} ms "
+              f"p50={ordered[len(ordered) // 2] * 1000:8.2f} ms max={ordered[-1] * 1000:8.2f} ms")
+    print(f"MT5 calls served: {terminal.calls}, unmatched: {sum(terminal.misses.values())} {dict(terminal.misses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# order_rate_limiter.py
+"""
+Prioriterad token bucket för handelsförfrågningar, en per konto (inloggningen för
+den anslutna terminalen, som mt5_connection läser vid anslutningen).
+
+Varje order_send kostar en token. Bucketen fylls på med ORDER_RATE_PER_SECOND
+token per sekund upp till ORDER_RATE_BURST. När det saknas token köar
+anroparen (blockerande; submit_order körs i trådar eller synkront) och den
+väntande med högst prioritet får nästa token, så stängningar aldrig väntar
+bakom nya order:
+
+    CLOSE  - stängning av position och borttagning av pendingorder (minskar risk)
+    HEDGE  - hedgeorder
+    MODIFY - ändring av SL/TP
+    ENTRY  - nya order
+
+Kötid per prioritet sparas i queue_stats.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+import MetaTrader5 as mt5
+
+import mt5_connection
+from settings import ORDER_RATE_PER_SECOND, ORDER_RATE_BURST
+
+logger = logging.getLogger("OrderRateLimiter")
+
+CLOSE, HEDGE, MODIFY, ENTRY = range(4)
+PRIORITY_NAMES = ("close", "hedge", "modify", "entry")
+
+# Kötid i sekunder per prioritet (de senaste)
+queue_stats = {name: deque(maxlen=1000) for name in PRIORITY_NAMES}
+
+
+def classify(request):
+    """Prioritet för en förfrågan utifrån action och position."""
+    action = request.get("action")
+    if action == mt5.TRADE_ACTION_REMOVE or (action == mt5.TRADE_ACTION_DEAL and request.get("position")):
+        return CLOSE
+    if action in (mt5.TRADE_ACTION_SLTP, mt5.TRADE_ACTION_MODIFY):
+        return MODIFY
+    return ENTRY
+
+
+class TokenBucket:
+    """Token bucket med prioriterad kö av väntande trådar."""
+
+    def __init__(self, rate=ORDER_RATE_PER_SECOND, burst=ORDER_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._waiters = []  # heap av (prioritet, löpnummer)
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=ENTRY):
+        """Vänta på en token. Returnerar kötiden i sekunder."""
+        start = time.monotonic()
+        with self._condition:
+            self._refill(start)
+            if not self._waiters and self.tokens >= 1:
+                self.tokens -= 1
+                waited = 0.0
+            else:
+                entry = (priority, next(self._order))
+                heapq.heappush(self._waiters, entry)
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == entry and self.tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self.tokens -= 1
+                        break
+                    if self._waiters[0] != entry:
+                        # Inte först i kön: väcks av notify_all när den före har tagit sin token
+                        self._condition.wait()
+                    else:
+                        # Först i kön: vänta tills nästa token finns (minst en tokens intervall)
+                        self._condition.wait(max((1 - self.tokens) / self.rate, 1 / self.rate))
+                self._condition.notify_all()
+                waited = time.monotonic() - start
+        queue_stats[PRIORITY_NAMES[priority]].append(waited)
+        if waited > 1.0:
+            logger.warning("%s order waited %.0f ms for the rate limiter.", PRIORITY_NAMES[priority].capitalize(), waited * 1000)
+        return waited
+
+    def waiting(self):
+        """Antal förfrågningar som köar för en token just nu."""
+        return len(self._waiters)
+
+
+# konto -> TokenBucket
+_buckets = {}
+_buckets_lock = threading.Lock()
+# Takten för nya buckets; configure utan konto ändrar den för alla konton
+_defaults = {"rate": ORDER_RATE_PER_SECOND, "burst": ORDER_RATE_BURST}
+
+
+def bucket(account=None):
+    """Returnera (och skapa vid behov) bucketen för ett konto (standard: den anslutna terminalens konto)."""
+    if account is None:
+        account = mt5_connection.active_account()
+    limiter = _buckets.get(account)
+    if limiter is None:
+        with _buckets_lock:
+            limiter = _buckets.get(account)
+            if limiter is None:
+                limiter = _buckets[account] = TokenBucket(_defaults["rate"], _defaults["burst"])
+    return limiter
+
+
+def configure(rate, burst, account=None):
+    """Byt takt för ett konto, eller utan konto för alla konton (t.ex. efter brokerns gränser)."""
+    with _buckets_lock:
+        if account is not None:
+            _buckets[account] = TokenBucket(rate, burst)
+            return
+        _defaults.update(rate=rate, burst=burst)
+        for key in _buckets:
+            _buckets[key] = TokenBucket(rate, burst)
+
+
+def acquire(request, priority=None, account=None):
+    """Vänta på en token för request (prioritet från classify om den inte anges) i kontots bucket."""
+    if ORDER_RATE_PER_SECOND is None:
+        return 0.0
+    return bucket(account).acquire(classify(request) if priority is None else priority)
+
+
+def queue_percentiles():
+    """{prioritet: (antal, p50 ms, max ms)} för senaste kötiderna."""
+    report = {}
+    for name, samples in queue_stats.items():
+        if samples:
+            ordered = sorted(samples)
+            report[name] = (len(ordered), ordered[len(ordered) // 2] * 1000, ordered[-1] * 1000)
+    return report
+
+
+def reset():
+    """Glöm alla buckets, konfigurerad takt och kötider (används av tester)."""
+    with _buckets_lock:
+        _buckets.clear()
+        _defaults.update(rate=ORDER_RATE_PER_SECOND, burst=ORDER_RATE_BURST)
+    for samples in queue_stats.values():
+        samples.clear()
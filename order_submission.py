@@ -0,0 +1,156 @@
+# order_submission.py
+"""
+Gemensam orderinskickning med omförsök vid requote och prisändring.
+
+Alla order i projektet skickas via submit_order i stället för mt5.order_send.
+Retcodes klassas i tre grupper:
+
+    REPRICE   - requote, price changed, off quotes: marknadsorder prissätts om direkt
+                från ny bid/ask och skickas igen utan väntan
+    TRANSIENT - anslutning, timeout, för många anrop: kort paus och nytt försök
+    övriga    - slutgiltiga (DONE eller fel som inte blir bättre av ett nytt försök)
+
+Omförsök sker inom ORDER_RETRY_DEADLINE sekunder och högst ORDER_RETRY_BUDGET
+gånger. Antal försök och latens per order sparas i fill_stats.
+
+När terminal_router körs (set_router) skickas nya order via den friskaste och
+snabbaste terminalen i stället för den egna anslutningen; order som stänger eller
+ändrar en position ("position" i requesten) skickas alltid via den egna anslutningen.
+"""
+import logging
+import time
+from collections import deque, namedtuple
+
+import MetaTrader5 as mt5
+
+import order_rate_limiter
+from settings import ORDER_RETRY_BUDGET, ORDER_RETRY_DEADLINE, ORDER_RETRY_BACKOFF
+
+logger = logging.getLogger("OrderSubmission")
+
+REPRICE_RETCODES = {
+    mt5.TRADE_RETCODE_REQUOTE,
+    mt5.TRADE_RETCODE_PRICE_CHANGED,
+    mt5.TRADE_RETCODE_PRICE_OFF,
+}
+TRANSIENT_RETCODES = {
+    mt5.TRADE_RETCODE_CONNECTION,
+    mt5.TRADE_RETCODE_TIMEOUT,
+    mt5.TRADE_RETCODE_TOO_MANY_REQUESTS,
+}
+
+# Senaste inskickningarna: {"symbol", "comment", "retcode", "attempts", "latency"}
+fill_stats = deque(maxlen=1000)
+
+# route(request, retry_budget, deadline) -> OrderSendResult, satt av terminal_router
+_router = None
+
+# Svar när ingen terminal svarade, med samma fält som MetaTrader5:s OrderSendResult
+FailedResult = namedtuple("FailedResult", [
+    "retcode", "deal", "order", "volume", "price", "bid", "ask", "comment",
+    "request_id", "retcode_external", "request",
+])
+
+
+class NoRoute(RuntimeError):
+    """Routern har ingen frisk terminal; ordern skickas via den egna anslutningen."""
+
+
+def set_router(router):
+    """Skicka nya order via router (None = alltid via den egna anslutningen)."""
+    global _router
+    _router = router
+
+
+def classify(retcode):
+    """Returnera "done", "reprice", "transient" eller "fatal" för en retcode."""
+    if retcode == mt5.TRADE_RETCODE_DONE:
+        return "done"
+    if retcode in REPRICE_RETCODES:
+        return "reprice"
+    if retcode in TRANSIENT_RETCODES:
+        return "transient"
+    return "fatal"
+
+
+def market_price(symbol, order_type, tick=None, terminal=None):
+    """Pris som en marknadsorder fylls på: ask för BUY, bid för SELL. None om tick saknas."""
+    tick = tick or (terminal or mt5).symbol_info_tick(symbol)
+    if tick is None:
+        return None
+    return tick.ask if order_type == mt5.ORDER_TYPE_BUY else tick.bid
+
+
+def failed_result(request, retcode, comment):
+    """Ett misslyckat svar (retcode != DONE) för en order som inte fick något svar från terminalen."""
+    return FailedResult(retcode=retcode, deal=0, order=0, volume=0.0, price=0.0, bid=0.0, ask=0.0,
+                        comment=comment, request_id=0, retcode_external=0, request=request)
+
+
+def submit_order(request, retry_budget=ORDER_RETRY_BUDGET, deadline=ORDER_RETRY_DEADLINE, terminal=None, route=True,
+                 priority=None):
+    """
+    Skicka en order och försök igen vid requote/prisändring eller tillfälliga fel.
+
+    Marknadsorder (TRADE_ACTION_DEAL) prissätts om från färsk bid/ask före varje
+    nytt försök; övriga order skickas oförändrade. Returnerar det sista
+    OrderSendResult; svarade terminalen inte alls är det ett failed_result med
+    TRADE_RETCODE_CONNECTION, så att anroparen alltid kan läsa retcode.
+
+    terminal är MetaTrader5-modulen att skicka via (standard: den egna anslutningen).
+    Varje försök via den egna anslutningen (och varje routad order) väntar på en token
+    i order_rate_limiter med priority (standard: order_rate_limiter.classify(request)).
+    """
+    if priority is None:
+        priority = order_rate_limiter.classify(request)
+    if route and _router is not None and terminal is None and not request.get("position"):
+        try:
+            order_rate_limiter.acquire(request, priority)
+            return _router(request, retry_budget, deadline)
+        except NoRoute:
+            logger.warning("No healthy routed terminal for %s order; sending via own connection.", request.get("symbol"))
+
+    api = terminal or mt5
+    request = dict(request)
+    start = time.perf_counter()
+    attempts = 0
+    result = None
+
+    while True:
+        attempts += 1
+        if terminal is None:
+            order_rate_limiter.acquire(request, priority)
+        result = api.order_send(request)
+        retcode = result.retcode if result is not None else mt5.TRADE_RETCODE_CONNECTION
+        outcome = classify(retcode)
+
+        elapsed = time.perf_counter() - start
+        if outcome in ("done", "fatal") or attempts > retry_budget or elapsed >= deadline:
+            break
+
+        if outcome == "reprice":
+            if request.get("action") != mt5.TRADE_ACTION_DEAL:
+                break  # Pending- och SL/TP-order har ett fast pris; ett nytt försök ger samma svar
+            price = market_price(request["symbol"], request["type"], terminal=api)
+            if price is None:
+                break
+            logger.info("Retcode %s for %s, re-pricing %s -> %s (attempt %s).",
+                        retcode, request["symbol"], request.get("price"), price, attempts)
+            request["price"] = price
+        else:
+            logger.info("Transient retcode %s for %s, retrying (attempt %s).", retcode, request.get("symbol"), attempts)
+            time.sleep(min(ORDER_RETRY_BACKOFF * attempts, max(0.0, deadline - elapsed)))
+
+    if result is None:
+        result = failed_result(request, mt5.TRADE_RETCODE_CONNECTION, "no response from terminal")
+    latency = time.perf_counter() - start
+    fill_stats.append({
+        "symbol": request.get("symbol"),
+        "comment": request.get("comment"),
+        "retcode": result.retcode,
+        "attempts": attempts,
+        "latency": latency,
+    })
+    logger.debug("Order %s for %s finished: retcode=%s, attempts=%s, latency=%.1f ms",
+                 request.get("comment"), request.get("symbol"), fill_stats[-1]["retcode"], attempts, latency * 1000)
+    return result
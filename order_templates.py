@@ -0,0 +1,172 @@
+# order_templates.py
+"""
+Färdiga orderförfrågningar per symbol.
+
+Vid uppstart (warm_up) läses varje handlad symbols fyllnadslägen, decimaler,
+stops level och freeze level. Mallar för marknadsorder, pending-order och
+SL/TP-ändringar byggs av dem och kontrolleras en gång med mt5.order_check.
+På den heta vägen kopierar build_request bara mallen och fyller i volym och
+priser, avrundade till symbolens decimaler och volymsteg.
+
+Symboler som inte förberetts vid uppstart förbereds vid första användningen.
+"""
+import logging
+from collections import namedtuple
+
+import MetaTrader5 as mt5
+
+from settings import ORDER_TEMPLATE_SYMBOLS
+import symbol_index
+
+logger = logging.getLogger("OrderTemplates")
+
+SymbolTemplate = namedtuple("SymbolTemplate", [
+    "symbol",
+    "digits",
+    "point",
+    "volume_min",
+    "volume_max",
+    "volume_step",
+    "stops_distance",  # Minsta avstånd (pris) mellan pris och SL/TP
+    "freeze_distance",  # Avstånd (pris) inom vilket order inte får ändras
+    "filling",  # Fyllnadsläge för marknadsorder
+    "requests",  # {"deal": {...}, "pending": {...}, "sltp": {...}}
+])
+
+PRICE_FIELDS = ("price", "sl", "tp", "stoplimit")
+
+# symbol -> SymbolTemplate
+_templates = {}
+
+
+def filling_candidates(symbol_info):
+    """Fyllnadslägen som symbolen stöder för marknadsorder, i prioritetsordning (IOC, FOK, RETURN)."""
+    candidates = []
+    if symbol_info.filling_mode & mt5.SYMBOL_FILLING_IOC:
+        candidates.append(mt5.ORDER_FILLING_IOC)
+    if symbol_info.filling_mode & mt5.SYMBOL_FILLING_FOK:
+        candidates.append(mt5.ORDER_FILLING_FOK)
+    candidates.append(mt5.ORDER_FILLING_RETURN)
+    return candidates
+
+
+def _volume_decimals(step):
+    text = f"{step:.8f}".rstrip("0")
+    return len(text.split(".")[1]) if "." in text else 0
+
+
+def prepare(symbol):
+    """Läs symbolens egenskaper, bygg mallar och kontrollera dem med order_check. Returnerar SymbolTemplate."""
+    info = mt5.symbol_info(symbol)
+    if info is not None and not info.visible:
+        mt5.symbol_select(symbol, True)
+        info = mt5.symbol_info(symbol)
+    tick = mt5.symbol_info_tick(symbol)
+    if info is None or tick is None:
+        raise ValueError(f"Symbol {symbol} is not available in MetaTrader 5.")
+
+    deal = None
+    for filling in filling_candidates(info):
+        candidate = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "deviation": 20,
+            "magic": 0,
+            "type_filling": filling,
+        }
+        check = mt5.order_check({**candidate, "type": mt5.ORDER_TYPE_BUY, "volume": info.volume_min, "price": tick.ask})
+        if check is not None and check.retcode == 0:
+            deal = candidate
+            break
+        logger.debug("Filling mode %s rejected for %s: %s", filling, symbol, check.comment if check else mt5.last_error())
+    if deal is None:
+        raise ValueError(f"No filling mode accepted by order_check for {symbol}.")
+
+    stops_distance = info.trade_stops_level * info.point
+    freeze_distance = info.trade_freeze_level * info.point
+
+    pending = {
+        "action": mt5.TRADE_ACTION_PENDING,
+        "symbol": symbol,
+        "deviation": 10,
+        "magic": 0,
+        "type_time": mt5.ORDER_TIME_GTC,
+        "type_filling": mt5.ORDER_FILLING_RETURN,
+    }
+    # Kontrollera pending-mallen med en limitorder utanför stops-/freeze-avståndet
+    distance = max(stops_distance, freeze_distance) + 10 * info.point
+    check = mt5.order_check({**pending, "type": mt5.ORDER_TYPE_BUY_LIMIT, "volume": info.volume_min,
+                             "price": round(tick.bid - distance, info.digits)})
+    if check is None or check.retcode != 0:
+        logger.warning("Pending order template for %s was not accepted by order_check: %s", symbol,
+                       check.comment if check else mt5.last_error())
+
+    sltp = {
+        "action": mt5.TRADE_ACTION_SLTP,
+        "symbol": symbol,
+    }
+
+    prepared = SymbolTemplate(
+        symbol=symbol,
+        digits=info.digits,
+        point=info.point,
+        volume_min=info.volume_min,
+        volume_max=info.volume_max,
+        volume_step=info.volume_step,
+        stops_distance=stops_distance,
+        freeze_distance=freeze_distance,
+        filling=deal["type_filling"],
+        requests={"deal": deal, "pending": pending, "sltp": sltp},
+    )
+    _templates[symbol] = prepared
+    logger.info("Order templates ready for %s (digits=%s, filling=%s, stops=%s, freeze=%s).",
+                symbol, info.digits, prepared.filling, info.trade_stops_level, info.trade_freeze_level)
+    return prepared
+
+
+def template(symbol):
+    """Returnera symbolens mall, förbered den vid första användningen."""
+    cached = _templates.get(symbol)
+    if cached is None:
+        cached = prepare(symbol)
+    return cached
+
+
+def normalize_price(symbol, price):
+    """Avrunda ett pris till symbolens antal decimaler."""
+    return round(price, template(symbol).digits)
+
+
+def normalize_volume(symbol, volume):
+    """Avrunda en volym till symbolens volymsteg."""
+    t = template(symbol)
+    steps = round(volume / t.volume_step)
+    return round(steps * t.volume_step, _volume_decimals(t.volume_step))
+
+
+def build_request(symbol, kind, **fields):
+    """
+    Bygg en orderförfrågan från symbolens mall ("deal", "pending" eller "sltp").
+
+    fields fyller i/skriver över fält (type, volume, price, sl, tp, position, comment ...).
+    Priser avrundas till symbolens decimaler och volym till volymsteget.
+    """
+    t = template(symbol)
+    request = dict(t.requests[kind])
+    request.update(fields)
+    for field in PRICE_FIELDS:
+        if field in request and request[field] is not None:
+            request[field] = round(request[field], t.digits)
+    if "volume" in request:
+        request["volume"] = normalize_volume(symbol, request["volume"])
+    return request
+
+
+def warm_up(symbols=ORDER_TEMPLATE_SYMBOLS):
+    """Förbered mallar för alla handlade symboler (körs vid uppstart efter MT5-initieringen)."""
+    for symbol in symbols:
+        try:
+            prepare(symbol_index.resolve(symbol) or symbol)
+        except Exception as e:
+            logger.error("Failed to prepare order templates for %s: %s", symbol, e)
+    return dict(_templates)
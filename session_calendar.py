@@ -0,0 +1,210 @@
+# session_calendar.py
+"""
+Handelskalender per symbol, så att signaler och hedgar för stängda marknader
+avvisas innan EMA-hämtning, marginalkontroll och order_send.
+
+MetaTrader5-paketet exponerar inte symbolernas sessionstider (SymbolInfoSessionTrade
+finns bara i MQL5). Kalendern byggs därför av tre källor:
+
+- sessionstabellen i settings (TRADING_SESSIONS, annars DEFAULT_TRADING_SESSION),
+  i serverns tid, förberäknad till en bitkarta med en plats per minut i veckan,
+- symbolens trade_mode från terminalen (avstängd eller bara stängning = stängd),
+- tickströmmen: ingen tick på SESSION_TICK_MAX_AGE sekunder under en öppen
+  session räknas som stängt (helgdagar, handelsstopp).
+
+Serverns tidszon läses av från senaste tick.time mot UTC (avrundat till halvtimme),
+så att sommartid följs; en ny förskjutning antas först när två ticks i följd ger den.
+SERVER_UTC_OFFSET är bara startvärdet.
+
+is_tradable() är en uppslagning i bitkartan plus två flaggor. trade_mode och
+tickåldern läses av en bakgrundsuppgift var SESSION_REFRESH_INTERVAL sekund;
+require_open läser om tickströmmen innan en symbol avvisas för att den saknar ticks.
+"""
+import asyncio
+import logging
+import time
+
+import MetaTrader5 as mt5
+
+import symbol_index
+from settings import (
+    TRADING_SESSIONS, DEFAULT_TRADING_SESSION, SERVER_UTC_OFFSET,
+    SESSION_REFRESH_INTERVAL, SESSION_TICK_MAX_AGE,
+)
+
+logger = logging.getLogger("SessionCalendar")
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# 1970-01-01 var en torsdag: förskjutning så att minut 0 i veckan är måndag 00:00
+_EPOCH_WEEKDAY_OFFSET = 3 * MINUTES_PER_DAY
+# Servertidszoner är hela eller halva timmar från UTC
+_OFFSET_STEP = 1800
+
+# Serverns tid minus UTC i sekunder, avläst från ticks, och en avläst förskjutning
+# (förskjutning, tick.time) som väntar på bekräftelse från en senare tick
+_state = {"offset": SERVER_UTC_OFFSET * 3600, "candidate": None}
+
+
+class MarketClosed(RuntimeError):
+    """Symbolens marknad är stängd just nu."""
+
+
+def _minute(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def minute_of_week(server_time):
+    """Minut i veckan (0 = måndag 00:00) för en tidpunkt i serverns tid (sekunder sedan 1970)."""
+    return (int(server_time) // 60 + _EPOCH_WEEKDAY_OFFSET) % MINUTES_PER_WEEK
+
+
+def server_time(now=None):
+    """Serverns tid i sekunder sedan 1970 (samma skala som tick.time)."""
+    return (time.time() if now is None else now) + _state["offset"]
+
+
+def observe_offset(tick_time, now=None):
+    """
+    Läs av serverns tidszon från den senaste ticken. Returnerar True om förskjutningen ändrades.
+
+    En tick inom SESSION_TICK_MAX_AGE från serverns tid med nuvarande förskjutning bekräftar
+    den. Annars avrundas skillnaden mot UTC till närmaste halvtimme, men den nya förskjutningen
+    antas först när en senare tick ger samma värde: en gammal tick som ligger kvar (helg,
+    handelsstopp, gles symbol) flyttar aldrig klockan.
+    """
+    utc = time.time() if now is None else now
+    if abs(tick_time - (utc + _state["offset"])) <= SESSION_TICK_MAX_AGE:
+        _state["candidate"] = None
+        return False
+    delta = tick_time - utc
+    offset = round(delta / _OFFSET_STEP) * _OFFSET_STEP
+    if abs(delta - offset) > SESSION_TICK_MAX_AGE:
+        return False
+    candidate = _state["candidate"]
+    if candidate is None or candidate[0] != offset:
+        _state["candidate"] = (offset, tick_time)
+        return False
+    if tick_time <= candidate[1]:
+        return False  # Samma tick igen: tickströmmen står still
+    logger.info("Server time offset changed from UTC%+.1f to UTC%+.1f.", _state["offset"] / 3600, offset / 3600)
+    _state["offset"] = offset
+    _state["candidate"] = None
+    return True
+
+
+class SessionCalendar:
+    """Sessionerna för en symbol som bitkarta över veckans minuter, plus terminalens flaggor."""
+
+    __slots__ = ("symbol", "minutes", "trade_allowed", "halted", "checked")
+
+    def __init__(self, symbol, sessions):
+        self.symbol = symbol
+        self.minutes = bytearray(MINUTES_PER_WEEK)
+        for weekday, ranges in sessions.items():
+            for start, end in ranges:
+                first = weekday * MINUTES_PER_DAY + _minute(start)
+                last = weekday * MINUTES_PER_DAY + _minute(end)
+                self.minutes[first:last] = b"\x01" * (last - first)
+        self.trade_allowed = True  # trade_mode tillåter nya order
+        self.halted = False  # Inga ticks under en öppen session
+        self.checked = 0.0
+
+    def in_session(self, when):
+        return bool(self.minutes[minute_of_week(when)])
+
+    def update(self, info, tick, when):
+        """Uppdatera flaggorna från symbol_info och senaste tick. Returnerar True om något ändrades."""
+        trade_allowed = info is not None and info.trade_mode not in (mt5.SYMBOL_TRADE_MODE_DISABLED,
+                                                                     mt5.SYMBOL_TRADE_MODE_CLOSEONLY)
+        halted = (self.in_session(when) and trade_allowed
+                  and (tick is None or when - tick.time > SESSION_TICK_MAX_AGE))
+        changed = (trade_allowed, halted) != (self.trade_allowed, self.halted)
+        self.trade_allowed, self.halted = trade_allowed, halted
+        self.checked = time.time()
+        return changed
+
+
+# Brokerns symbolnamn -> SessionCalendar
+_calendars = {}
+
+
+def sessions_for(symbol):
+    """Sessionstabellen för en symbol: exakt namn, sedan utan brokerns suffix, annars standard."""
+    sessions = TRADING_SESSIONS.get(symbol)
+    if sessions is None:
+        sessions = TRADING_SESSIONS.get(symbol_index.canonical(symbol), DEFAULT_TRADING_SESSION)
+    return sessions
+
+
+def calendar(symbol):
+    """Returnera (och bygg vid behov) kalendern för en symbol."""
+    cal = _calendars.get(symbol)
+    if cal is None:
+        cal = _calendars.setdefault(symbol, SessionCalendar(symbol, sessions_for(symbol)))
+    return cal
+
+
+def is_tradable(symbol, now=None):
+    """Sant om symbolen kan handlas nu enligt sessionstabellen, trade_mode och tickströmmen."""
+    cal = _calendars.get(symbol) or calendar(symbol)
+    return cal.trade_allowed and not cal.halted and bool(cal.minutes[minute_of_week(server_time(now))])
+
+
+def require_open(symbol, now=None):
+    """Som is_tradable men kastar MarketClosed om symbolen inte kan handlas nu."""
+    if not is_tradable(symbol, now):
+        cal = _calendars[symbol]
+        if cal.halted and cal.trade_allowed:
+            # Tickströmmen kan ha kommit igång sedan senaste kontrollen: läs om den innan signalen avvisas
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is not None:
+                when = server_time(now)
+                if when - tick.time <= SESSION_TICK_MAX_AGE:
+                    cal.halted = False
+                    logger.info("Session state for %s: ticks resumed.", symbol)
+                    if cal.in_session(when):
+                        return
+        reason = ("trading disabled by broker" if not cal.trade_allowed
+                  else "no ticks during session" if cal.halted else "outside trading session")
+        raise MarketClosed(f"Market for {symbol} is closed ({reason}).")
+
+
+def refresh(symbols=(), now=None):
+    """
+    Läs trade_mode och senaste tick för kalendrarnas symboler (blockerande) och logga ändringar.
+
+    symbols (signalnamn, t.ex. kanalernas bevakningslistor) läggs till i kalendern först.
+    Serverns tidszon läses av från den senaste ticken innan flaggorna uppdateras.
+    """
+    for symbol in symbols:
+        name = symbol_index.resolve(symbol)
+        if name is not None:
+            calendar(name)
+    calendars = list(_calendars.values())
+    ticks = [mt5.symbol_info_tick(cal.symbol) for cal in calendars]
+    latest = max((tick.time for tick in ticks if tick is not None), default=None)
+    if latest is not None:
+        observe_offset(latest, now)
+    when = server_time(now)
+    for cal, tick in zip(calendars, ticks):
+        if cal.update(mt5.symbol_info(cal.symbol), tick, when):
+            logger.info("Session state for %s: trade allowed=%s, halted=%s.", cal.symbol, cal.trade_allowed, cal.halted)
+
+
+async def run_session_calendar(symbols=(), interval=SESSION_REFRESH_INTERVAL):
+    """Bakgrundsuppgift: håll kalendrarnas trade_mode- och tickflaggor aktuella."""
+    while True:
+        try:
+            await asyncio.to_thread(refresh, symbols)
+        except Exception as e:
+            logger.error("Error refreshing session calendar: %s", e)
+        await asyncio.sleep(interval)
+
+
+def reset():
+    """Glöm alla kalendrar och den avlästa tidszonen (används av tester)."""
+    _calendars.clear()
+    _state["offset"] = SERVER_UTC_OFFSET * 3600
+    _state["candidate"] = None
@@ -1,3 +1,5 @@
+import os
+
 # Telegram API credentials for private account
 TELEGRAM_API_ID = "21741387"
 TELEGRAM_API_HASH = "097295cc4e92cedcf99626ff23d2a010"
@@ -18,6 +20,22 @@ TARGET_GROUP_ID = -1002476037243 #Bulltrading_stops_LIVE kanal
 MT5_PATH = r"C:\\Program Files\\MetaTrader 5 IC Markets (SC)_TESTER\\terminal64.exe"
 MT5_PATH_ALT = r"C:\\Program Files\\MetaTrader 5 IC Markets (SC)_OPTIMIZER\\terminal64.exe"
 
+# Anslutningshantering (mt5_connection): hälsokontroll och circuit breaker
+MT5_HEALTH_INTERVAL = 1.0  # Sekunder mellan hälsokontroller med terminal_info()
+MT5_BREAKER_FAILURES = 3  # Misslyckanden i rad innan brytaren öppnas och signaler avvisas direkt
+MT5_RECONNECT_BACKOFF = 1.0  # Sekunder före första återanslutningsförsöket; fördubblas per misslyckande
+MT5_RECONNECT_MAX_BACKOFF = 60.0
+
+# Routing mellan terminalerna (terminal_router): varje terminal har en egen arbetsprocess och
+# nya order går via den friskaste och snabbaste terminalen. Slå bara på routern när båda
+# terminalerna i ROUTER_TERMINALS är inloggade på SAMMA konto; annars hamnar order och
+# positioner på olika konton (MT5_PATH och MT5_PATH_ALT nedan är olika installationer).
+ROUTER_ENABLED = False
+ROUTER_TERMINALS = {"Primary": MT5_PATH, "Secondary": MT5_PATH_ALT}
+ROUTER_PROBE_INTERVAL = 1.0  # Sekunder mellan prov av varje terminal
+ROUTER_PROBE_TIMEOUT = 0.5  # Ett prov som tar längre räknas som att terminalen har hängt sig
+ROUTER_LATENCY_SMOOTHING = 0.2  # Vikt för senaste rundturen i det glidande medelvärdet
+
 #VPS
 #MT5_PATH = r"C:\Program Files\FTMO MetaTrader 5 - Copy - EGET\terminal64.exe"
 
@@ -28,7 +46,112 @@ TELEGRAM_BOT_TOKEN_CHANNEL_6 = "7700223074:AAFCj8guHqin956tr27aIkWH09EyJyABNpY"
 GROUP_ID6 = -1002438023347  # Kanal-ID för att lyssna på
 TARGET_GROUP_ID6 = -1002476037243  # Målkanal-ID för att skicka meddelanden
 
+# Kanaler som ska köras (se channel_registry.CHANNEL_PLUGINS). Övriga kanaler importeras aldrig.
+ENABLED_CHANNELS = ["channel_4"]
+
+# Återhämtning efter Telegram-avbrott och färskhetsfilter för signaler
+CONNECTION_CHECK_INTERVAL = 1.0  # Sekunder mellan kontroller av Telegram-anslutningen
+CATCH_UP_HISTORY_LIMIT = 20  # Antal senaste meddelanden per chatt som hämtas vid återanslutning
+CATCH_UP_CONCURRENCY = 2  # Max antal återhämtade signaler som processas samtidigt
+DEFAULT_SIGNAL_MAX_AGE = 60  # Sekunder; äldre signaler kastas
+SIGNAL_MAX_AGE = {"channel_4": 30, "channel_4_countertrend": 30, "channel_4_shadow": 30}
+SIGNAL_MAX_DRIFT = {"channel_4": 0.002, "channel_4_countertrend": 0.002, "channel_4_shadow": 0.002}  # Max relativ prisdrift från ENTRY
+
+# Orderinskickning (order_submission): omförsök vid requote, prisändring och tillfälliga fel
+ORDER_RETRY_BUDGET = 3  # Max antal nya försök per order
+ORDER_RETRY_DEADLINE = 2.0  # Sekunder; inga nya försök efter detta
+ORDER_RETRY_BACKOFF = 0.05  # Sekunder paus per försök vid tillfälliga fel (ej vid requote)
+
+# Takt för handelsförfrågningar per konto (order_rate_limiter): token bucket med prioritet
+# stängning > hedge > SL/TP-ändring > ny order. None stänger av begränsningen.
+ORDER_RATE_PER_SECOND = 20
+ORDER_RATE_BURST = 10
+ORDER_TEMPLATE_SYMBOLS = ["XAUUSD", "DJ30"]  # Symboler vars ordermallar förbereds och kontrolleras vid uppstart
+
+# Symbolindex (symbol_index): signalens symbolnamn -> brokerns, byggt från symbols_get() vid uppstart.
+# Brokerns suffix/prefix ("XAUUSD.a", "#US30") löses upp automatiskt; alias anges här.
+SYMBOL_ALIASES = {
+    "US30": "DJ30",
+}
+SYMBOL_INDEX_REFRESH_INTERVAL = 30.0  # Sekunder mellan kontroller av om terminalens symbollista har ändrats
+
+# Lokal bar-lagring (bar_store): en minnesmappad fil per (symbol, tidsram)
+BAR_STORE_DIR = "bars"
+BAR_STORE_INITIAL_BARS = 100000  # Barer som hämtas första gången en (symbol, tidsram) används (~2 månader M1)
+BAR_STORE_SYNC_INTERVAL = 1.0  # Sekunder mellan kontroller av nya stängda barer
+
 #Channel_4 settings
 EMA_PERIOD = 55  # Period för EMA som filter
 Trendorders = True
+# Samlingsfönster (signal_coalescer) i sekunder per strategi ("trend" = channel_4, "countertrend" =
+# channel_4_countertrend): signaler på samma symbol inom fönstret nettas till en order. 0 = av.
+SIGNAL_COALESCE_WINDOW = {"trend": 0.0, "countertrend": 0.0}
+
+# Shadow mode (kanal "channel_4_shadow"): en strategi handlar live, övriga pappershandlas på samma signaler
+SHADOW_LIVE_STRATEGY = "trend"  # Namn i strategy.STRATEGIES
+SHADOW_STRATEGIES = ["countertrend"]
+SHADOW_MONITOR_INTERVAL = 10  # Sekunder mellan equity-kontroller av pappersböckerna
+
+# Dashboard i delat minne (dashboard_shm): GUI:na körs som egna processer och läser bara segmentet
+DASHBOARD_ENABLED = True
+DASHBOARD_SHM_NAME = "mt5bot_dashboard"
+DASHBOARD_MAX_POSITIONS = 20000  # Rader i segmentet; fler positioner trunkeras
+DASHBOARD_PUBLISH_INTERVAL = 0.5  # Sekunder mellan kontroller av ny GUI-ögonblicksbild
+DASHBOARD_POLL_MS = 250  # Hur ofta GUI-processerna läser segmentet
+
+# Trendmotor (trend_engine): symboler och tidsramar som hålls uppdaterade i bakgrunden
+TREND_SYMBOLS = ["XAUUSD"]
+TREND_TIMEFRAMES = ["M1", "M15", "H1"]
+TREND_POLL_INTERVAL = 1.0  # Sekunder mellan kontroller av nya stängda barer
+TREND_MAX_AGE = 5.0  # Sekunder innan ett publicerat trendläge räknas som inaktuellt
+TREND_WARMUP_BARS = 4 * EMA_PERIOD  # Barer som används för att initiera EMA
+
+# Uppvärmning (symbol_warmup): symboler per kanal som förbereds vid start och med jämna mellanrum,
+# så att första signalen inte betalar för historiknedladdning, symbolval och kall tickström
+CHANNEL_WATCHLISTS = {
+    "channel_1": ["XAUUSD"],
+    "channel_2": ["XAUUSD"],
+    "channel_3": ["XAUUSD", "US30"],
+    "channel_4": ["XAUUSD", "US30"],
+    "channel_4_countertrend": ["XAUUSD", "US30"],
+    "channel_4_shadow": ["XAUUSD", "US30"],
+    "channel_6": ["XAUUSD"],
+}
+WARMUP_BARS = {"M1": TREND_WARMUP_BARS, "H1": 14 + 1}  # Barer per tidsram: EMA-filtret (Kanal 4) och ATR(14) (Kanal 3)
+WARMUP_INTERVAL = 300  # Sekunder mellan uppvärmningsvarv
+
+# Handelskalender (session_calendar): signaler och hedgar för stängda marknader avvisas tidigt.
+# MetaTrader5-paketet ger inte sessionstiderna, så de anges här i serverns tid:
+# symbol (utan brokerns suffix) -> {veckodag (0 = måndag): [("HH:MM", "HH:MM"), ...]}, inom dygnet.
+SERVER_UTC_OFFSET = 2  # Timmar; startvärde tills serverns tid har lästs av från tickströmmen (följer sommartid)
+DEFAULT_TRADING_SESSION = {day: [("00:00", "24:00")] for day in range(5)}  # Måndag-fredag dygnet runt
+TRADING_SESSIONS = {
+    "XAUUSD": {day: [("01:00", "24:00")] for day in range(5)},
+    "DJ30": {day: [("01:00", "24:00")] for day in range(5)},
+}
+SESSION_REFRESH_INTERVAL = 60  # Sekunder mellan kontroller av trade_mode och tickström
+SESSION_TICK_MAX_AGE = 300  # Sekunder utan tick under en öppen session innan symbolen räknas som stängd
+
+
+# Vakthund för event-loopen och samplande profilerare (loop_watchdog)
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 0.05  # Sekunder mellan hjärtslag i loopen
+WATCHDOG_STALL_THRESHOLD = 0.25  # Loopstopp längre än så loggas med loopens stack
+WATCHDOG_REPORT_INTERVAL = 300  # Sekunder mellan loggade sammanfattningar av loopens fördröjning
+PROFILE_ENV_VAR = "BOT_PROFILE_SECONDS"  # T.ex. BOT_PROFILE_SECONDS=30 profilerar de första 30 s
+PROFILE_DEFAULT_SECONDS = 30  # Längd när profileraren startas med SIGUSR2
+PROFILE_SAMPLE_INTERVAL = 0.005  # Sekunder mellan sampel (~200 Hz)
+
+# Inspelning av MT5-anrop (mt5_tape): starta boten med BOT_RECORD_TAPE=1 för att spela in
+TAPE_ENV_VAR = "BOT_RECORD_TAPE"
+TAPE_DIR = "tapes"
+TAPE_MAX_BYTES = 64 * 1024 * 1024  # Per bandfil innan rotation
+TAPE_BACKUP_COUNT = 20  # Antal bandfiler som sparas
 
+#Loggning
+LOG_LEVEL = "INFO"
+LOG_DIR = "logs"
+LOG_FILE = "test_log.log" if os.getenv('TEST_MODE', 'False') == 'True' else "bot.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # 10 MB per fil
+LOG_BACKUP_COUNT = 5
+LOG_TO_CONSOLE = True
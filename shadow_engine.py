@@ -0,0 +1,252 @@
+# shadow_engine.py
+"""
+Shadow mode för Kanal 4: flera strategivarianter på samma signalflöde.
+
+En variant (SHADOW_LIVE_STRATEGY) handlar live via channel_4. Övriga varianter
+(SHADOW_STRATEGIES) pappershandlas lokalt, var och en med en egen virtuell
+hedgebok och equity. Alla varianter delar samma marknadsläsning: en signal ger
+en tick och en EMA-kontroll per EMA-period, och varje övervakningsvarv hämtar en
+tick per symbol som alla pappersböcker räknar mot.
+
+Jämförelsen publiceras i communication.shadow_results och loggas varje varv.
+"""
+import asyncio
+import itertools
+import logging
+
+import MetaTrader5 as mt5
+
+import channel_4
+from channel_4 import signal_price_reference, parse_channel_4_signal, check_price_vs_ema  # noqa: F401
+from communication import shadow_results, hedged_positions
+from logging_setup import bind_log_context
+from mt5_connection import require_connection_async
+from session_calendar import require_open
+from settings import Trendorders, SHADOW_LIVE_STRATEGY, SHADOW_STRATEGIES, SHADOW_MONITOR_INTERVAL
+from strategy import STRATEGIES, required_ema_position
+
+logger = logging.getLogger("ShadowEngine")
+
+_paper_tickets = itertools.count(1)
+
+
+class PaperPosition:
+    """En pappersposition i en virtuell hedgebok."""
+
+    __slots__ = ("ticket", "symbol", "type", "volume", "price_open", "contract_size", "is_hedge", "hedge_ticket", "profit")
+
+    def __init__(self, symbol, order_type, volume, price_open, contract_size, is_hedge=False):
+        self.ticket = next(_paper_tickets)
+        self.symbol = symbol
+        self.type = order_type
+        self.volume = volume
+        self.price_open = price_open
+        self.contract_size = contract_size
+        self.is_hedge = is_hedge
+        self.hedge_ticket = None  # Satt när en originalposition har hedgats
+        self.profit = 0.0
+
+
+class PaperBook:
+    """Virtuell hedgebok för en strategivariant: samma regler som channel_4, men fyllda lokalt."""
+
+    def __init__(self, params):
+        self.params = params
+        self.positions = []
+        self.realized = 0.0
+        self.hedges_placed = 0
+
+    def has_hedge(self, symbol):
+        return any(p.is_hedge and p.symbol == symbol for p in self.positions)
+
+    def on_signal(self, action, symbol, ema_check, tick, contract_size):
+        """Pappersfyll en signal enligt variantens EMA-regel. Returnerar positionen eller None om den avvisades."""
+        hedged = self.has_hedge(symbol)
+        if not (Trendorders and hedged):
+            required_position = required_ema_position(self.params, action == mt5.ORDER_TYPE_BUY)
+            if ema_check["position"] != required_position:
+                logger.info("[%s] Paper signal rejected: Price is not %s EMA for %s.", self.params.name, required_position, symbol)
+                return None
+            if not Trendorders and hedged:
+                logger.info("[%s] Paper order rejected due to active hedge on %s.", self.params.name, symbol)
+                return None
+
+        price = tick.ask if action == mt5.ORDER_TYPE_BUY else tick.bid
+        position = PaperPosition(symbol, action, self.params.fixed_lot_size, price, contract_size)
+        self.positions.append(position)
+        logger.info("[%s] Paper %s %s %s @ %s. Ticket: %s", self.params.name,
+                    'BUY' if action == mt5.ORDER_TYPE_BUY else 'SELL', position.volume, symbol, price, position.ticket)
+        return position
+
+    def mark_to_market(self, ticks):
+        """Räkna om P/L för alla positioner mot ögonblicksbildens tickar. Returnerar total flytande P/L."""
+        total = 0.0
+        for position in self.positions:
+            tick = ticks.get(position.symbol)
+            if tick is None:
+                total += position.profit  # Behåll senast kända P/L
+                continue
+            if position.type == mt5.ORDER_TYPE_BUY:
+                position.profit = (tick.bid - position.price_open) * position.volume * position.contract_size
+            else:
+                position.profit = (position.price_open - tick.ask) * position.volume * position.contract_size
+            total += position.profit
+        return total
+
+    def run_cycle(self, ticks):
+        """Ett varv av equity-logiken: stäng allt vid vinstgränsen, annars hedga förlustpositioner."""
+        floating = self.mark_to_market(ticks)
+        if not self.positions:
+            return
+
+        if floating >= self.params.profit_threshold:
+            logger.info("[%s] Paper profit reached $%.2f. Closing all paper positions.", self.params.name, floating)
+            self.realized += floating
+            self.positions = []
+            return
+
+        originals, hedges = {}, {}
+        for position in self.positions:
+            counts = hedges if position.is_hedge else originals
+            counts[position.symbol] = counts.get(position.symbol, 0) + 1
+
+        for position in list(self.positions):
+            if position.is_hedge or position.hedge_ticket is not None or position.profit > self.params.loss_threshold:
+                continue
+            symbol = position.symbol
+            tick = ticks.get(symbol)
+            if tick is None or hedges.get(symbol, 0) >= originals.get(symbol, 0):
+                continue
+            hedge_type = mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
+            hedge_price = tick.ask if hedge_type == mt5.ORDER_TYPE_BUY else tick.bid
+            hedge = PaperPosition(symbol, hedge_type, self.params.hedge_lot_size, hedge_price, position.contract_size, is_hedge=True)
+            self.positions.append(hedge)
+            position.hedge_ticket = hedge.ticket
+            hedges[symbol] = hedges.get(symbol, 0) + 1
+            self.hedges_placed += 1
+            logger.info("[%s] Paper hedge for position %s. Hedge Ticket: %s", self.params.name, position.ticket, hedge.ticket)
+
+    def summary(self):
+        floating = sum(p.profit for p in self.positions)
+        return {
+            "live": False,
+            "realized": self.realized,
+            "floating": floating,
+            "equity": self.realized + floating,
+            "positions": len(self.positions),
+            "hedges": self.hedges_placed,
+        }
+
+
+LIVE = STRATEGIES[SHADOW_LIVE_STRATEGY]
+paper_books = {name: PaperBook(STRATEGIES[name]) for name in SHADOW_STRATEGIES if name != SHADOW_LIVE_STRATEGY}
+
+
+def market_snapshot(symbols):
+    """Hämta en tick per symbol; delas av alla pappersböcker under ett varv."""
+    ticks = {}
+    for symbol in symbols:
+        tick = mt5.symbol_info_tick(symbol)
+        if tick is None:
+            logger.error("Failed to retrieve tick data for %s.", symbol)
+            continue
+        ticks[symbol] = tick
+    return ticks
+
+
+def read_signal_market(symbol):
+    """Symbolinfo, en tick och en EMA-kontroll per distinkt period för en signal (blockerande; körs i en tråd)."""
+    symbol_info = mt5.symbol_info(symbol)
+    tick = mt5.symbol_info_tick(symbol)
+    if symbol_info is None or tick is None:
+        raise ValueError(f"Symbol {symbol} is not available in MetaTrader 5.")
+
+    # En EMA-kontroll per distinkt period, delad mellan varianterna
+    ema_checks = {}
+    for params in [LIVE, *(book.params for book in paper_books.values())]:
+        if params.ema_period not in ema_checks:
+            ema_checks[params.ema_period] = check_price_vs_ema(symbol, period=params.ema_period)
+    return symbol_info, tick, ema_checks
+
+
+async def process_channel_4_signal(message, mt5_path):
+    """Processa en Kanal 4-signal för alla varianter med en gemensam marknadsläsning."""
+    try:
+        await require_connection_async(mt5_path)
+
+        parsed = parse_channel_4_signal(message)
+        if parsed is None:
+            return
+        action, _, symbol = parsed
+        bind_log_context(symbol=symbol)
+        require_open(symbol)  # Stängd marknad: varken live- eller pappersorder
+
+        # Terminalanropen i en tråd (de delar MT5_LOCK med orderläggningen); pappersböckerna ändras på event-loopen
+        symbol_info, tick, ema_checks = await asyncio.to_thread(read_signal_market, symbol)
+
+    except Exception as e:
+        logger.error("Error processing shadow signal: %s", e)
+        return
+
+    # Live först så att pappersfyllningarna inte fördröjer den riktiga ordern
+    await channel_4.process_channel_4_signal(message, mt5_path, LIVE, ema_check=ema_checks[LIVE.ema_period])
+
+    for book in paper_books.values():
+        book.on_signal(action, symbol, ema_checks[book.params.ema_period], tick, symbol_info.trade_contract_size)
+
+
+def read_cycle_market(symbols):
+    """
+    Ticks för pappersböckernas symboler och live-kontots (flytande P/L, antal positioner) eller None
+    (blockerande; körs i en tråd).
+    """
+    ticks = market_snapshot(symbols)
+    account_info = mt5.account_info()
+    if account_info is None:
+        return ticks, None
+    return ticks, (account_info.equity - account_info.balance, len(mt5.positions_get() or ()))
+
+
+def publish_results(live=None):
+    """Uppdatera shadow_results med live-kontot (från read_cycle_market) och alla pappersböcker och logga jämförelsen."""
+    if live is not None:
+        floating, positions = live
+        shadow_results[LIVE.name] = {
+            "live": True,
+            "realized": None,
+            "floating": floating,
+            "equity": floating,
+            "positions": positions,
+            "hedges": len(hedged_positions),
+        }
+    for name, book in paper_books.items():
+        shadow_results[name] = book.summary()
+
+    logger.info("Shadow comparison: %s", ", ".join(
+        f"{name}{'*' if result['live'] else ''} equity={result['equity']:.2f} positions={result['positions']}"
+        for name, result in shadow_results.items()))
+
+
+async def run_shadow_cycle():
+    """Ett varv för alla pappersböcker mot en gemensam ögonblicksbild (läst i en tråd)."""
+    symbols = {p.symbol for book in paper_books.values() for p in book.positions}
+    ticks, live = await asyncio.to_thread(read_cycle_market, symbols)
+    for book in paper_books.values():
+        book.run_cycle(ticks)
+    publish_results(live)
+
+
+async def monitor_shadows():
+    """Övervaka pappersböckerna i samma takt som live-strategins equity-övervakning."""
+    logger.info("Starting shadow monitoring: live=%s, paper=%s", LIVE.name, ", ".join(paper_books) or "-")
+    while True:
+        try:
+            await run_shadow_cycle()
+        except Exception as e:
+            logger.error("Error in shadow monitoring: %s", e)
+        await asyncio.sleep(SHADOW_MONITOR_INTERVAL)
+
+
+async def run_shadow_engine():
+    """Bakgrundsuppgift: live-variantens equity-övervakning och pappersböckernas övervakning."""
+    await asyncio.gather(channel_4.supervise_monitor_equity(LIVE), monitor_shadows())
@@ -0,0 +1,109 @@
+# signal_coalescer.py
+"""
+Kort samlingsfönster per (kanal, symbol) som nettar motstående signaler.
+
+Kanal 4 postar ibland flera BUY/SELL på samma symbol inom några sekunder. Med ett
+fönster (SIGNAL_COALESCE_WINDOW, av som standard) öppnar första signalen fönstret
+och väntar; signaler som kommer under tiden räknas bara in. När fönstret stängs får
+den första signalen nettot (köp minus sälj) och lägger en samlad order med
+nettovolymen, eller ingen alls om signalerna tog ut varandra.
+
+coalesce_stats visar per kanal hur många signaler, fönster och order det blev
+och hur många orderrundor och tickets som sparades.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger("SignalCoalescer")
+
+# kanal -> räknare
+coalesce_stats = defaultdict(lambda: {
+    "signals": 0,  # Signaler som gått genom ett fönster
+    "windows": 0,  # Stängda fönster
+    "orders": 0,  # Samlade order som lagts
+    "netted": 0,  # Signaler som tog ut en motstående signal
+    "round_trips_saved": 0,  # Orderläggningar (marginal, pris, order_send) som inte behövdes
+    "tickets_saved": 0,  # Positioner som inte öppnades
+})
+
+
+class Window:
+    """Signalerna på en symbol inom ett öppet fönster."""
+
+    __slots__ = ("buys", "sells", "last_line")
+
+    def __init__(self):
+        self.buys = 0
+        self.sells = 0
+        self.last_line = {}  # riktning (+1/-1) -> senaste signalens rad
+
+    def add(self, direction, line):
+        if direction > 0:
+            self.buys += 1
+        else:
+            self.sells += 1
+        self.last_line[direction] = line
+
+    @property
+    def signals(self):
+        return self.buys + self.sells
+
+    @property
+    def net(self):
+        """Köp minus sälj: tecknet ger riktningen och beloppet antalet signalvolymer."""
+        return self.buys - self.sells
+
+
+# (kanal, symbol) -> öppet Window
+_windows = {}
+
+
+async def coalesce(channel, symbol, direction, line, window):
+    """
+    Lägg en signal (direction +1 köp, -1 sälj) i symbolens fönster.
+
+    Returnerar None om signalen räknades in i ett redan öppet fönster (den som öppnade
+    fönstret lägger ordern), annars Window när fönstret har stängts.
+    """
+    key = (channel, symbol)
+    open_window = _windows.get(key)
+    if open_window is not None:
+        open_window.add(direction, line)
+        logger.info("Coalesced %s signal on %s into open window (%s signals).",
+                    "BUY" if direction > 0 else "SELL", symbol, open_window.signals)
+        return None
+    open_window = _windows[key] = Window()
+    open_window.add(direction, line)
+    try:
+        await asyncio.sleep(window)
+    finally:
+        del _windows[key]
+    stats = coalesce_stats[channel]
+    stats["signals"] += open_window.signals
+    stats["windows"] += 1
+    stats["netted"] += 2 * min(open_window.buys, open_window.sells)
+    if open_window.signals > 1:
+        logger.info("Window on %s closed: %s buy, %s sell, net %+d.",
+                    symbol, open_window.buys, open_window.sells, open_window.net)
+    return open_window
+
+
+def record_result(channel, closed_window, placed):
+    """Räkna in utfallet för ett stängt fönster (placed: om den samlade ordern lades)."""
+    stats = coalesce_stats[channel]
+    orders = 1 if placed else 0
+    stats["orders"] += orders
+    # Utan fönster hade varje signal gjort en egen orderläggning och (om den gick igenom) en egen ticket
+    stats["round_trips_saved"] += closed_window.signals - (1 if closed_window.net else 0)
+    if placed or not closed_window.net:
+        stats["tickets_saved"] += closed_window.signals - orders
+    if closed_window.signals > 1:
+        logger.info("Coalescing on %s has saved %s order round-trips and %s tickets over %s signals.",
+                    channel, stats["round_trips_saved"], stats["tickets_saved"], stats["signals"])
+
+
+def reset():
+    """Glöm fönster och räknare (används av tester)."""
+    _windows.clear()
+    coalesce_stats.clear()
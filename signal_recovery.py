@@ -0,0 +1,191 @@
+# signal_recovery.py
+"""
+Återhämtning av signaler efter Telegram-avbrott.
+
+När Telethon tappar anslutningen levereras signaler från avbrottet antingen inte
+alls eller sent i en klump. Den här modulen:
+
+- håller reda på vilka meddelanden som redan hanterats per chatt (claim),
+- filtrerar varje signal mot en maxålder och en maximal prisdrift per kanal
+  (classify), både för live-händelser och för återhämtade meddelanden,
+- hämtar missade meddelanden för alla aktiverade kanaler i ett enda batchat
+  historikanrop efter återanslutning (catch_up) och spelar upp färska signaler
+  genom den vanliga pipelinen med begränsad samtidighet.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from settings import (
+    CATCH_UP_HISTORY_LIMIT,
+    CATCH_UP_CONCURRENCY,
+    CONNECTION_CHECK_INTERVAL,
+    DEFAULT_SIGNAL_MAX_AGE,
+    SIGNAL_MAX_AGE,
+    SIGNAL_MAX_DRIFT,
+)
+from logging_setup import new_trace
+from loop_watchdog import in_flight
+import mt5_tape
+from startup_profile import timed_import
+
+logger = logging.getLogger("SignalRecovery")
+
+# Utfall från classify()
+FRESH = "fresh"  # Spelas upp/processas som vanligt
+DOWNGRADED = "downgraded"  # Inom maxåldern men priset har dragit iväg: loggas, handlas inte
+STALE = "stale"  # Äldre än maxåldern: kastas
+
+# Senast hanterade meddelande-id per chatt, och de senaste id:na per (chatt, kanal) mot dubbelhantering
+last_message_id = {}
+_claimed = {}
+_CLAIMED_HISTORY = 500
+
+
+def claim(chat_id, message_id, channel):
+    """Markera ett meddelande som hanterat av en kanal. Returnerar False om det redan har hanterats."""
+    claimed = _claimed.get((chat_id, channel))
+    if claimed is None:
+        claimed = _claimed[(chat_id, channel)] = (set(), deque())
+    ids, order = claimed
+    if message_id in ids:
+        return False
+    ids.add(message_id)
+    order.append(message_id)
+    if len(order) > _CLAIMED_HISTORY:
+        ids.discard(order.popleft())
+    if message_id > last_message_id.get(chat_id, 0):
+        last_message_id[chat_id] = message_id
+    return True
+
+
+def signal_age(message_date, now=None):
+    """Ålder i sekunder för ett Telegram-meddelande (message.date är en tidszonsmedveten datetime)."""
+    return (now or time.time()) - message_date.timestamp()
+
+
+def price_drift(plugin, message):
+    """
+    Relativ prisdrift mellan signalens angivna pris och aktuellt pris, eller None om den inte kan beräknas.
+
+    Kräver att kanalens modul har en signal_price_reference(message) -> (symbol, pris).
+    """
+    if plugin.price_reference is None:
+        return None
+    reference = getattr(timed_import(plugin.module_name), plugin.price_reference)(message)
+    if reference is None:
+        return None
+    symbol, signal_price = reference
+    if not signal_price:
+        return None
+    mt5 = timed_import("MetaTrader5")
+    tick = mt5.symbol_info_tick(symbol)
+    if tick is None:
+        return None
+    current_price = (tick.ask + tick.bid) / 2
+    return abs(current_price - signal_price) / signal_price
+
+
+def classify(plugin, message, message_date, now=None):
+    """Avgör om en signal är färsk, nedgraderad eller för gammal för att handlas."""
+    age = signal_age(message_date, now)
+    max_age = SIGNAL_MAX_AGE.get(plugin.name, DEFAULT_SIGNAL_MAX_AGE)
+    if age > max_age:
+        logger.warning("Dropping stale %s signal: %.1fs old (max %ss).", plugin.name, age, max_age)
+        return STALE
+
+    max_drift = SIGNAL_MAX_DRIFT.get(plugin.name)
+    if max_drift is not None:
+        drift = price_drift(plugin, message)
+        if drift is not None and drift > max_drift:
+            logger.warning("Downgrading %s signal: price drifted %.4f%% since signal (max %.4f%%).",
+                           plugin.name, drift * 100, max_drift * 100)
+            return DOWNGRADED
+    return FRESH
+
+
+async def process_signal(plugin, client, chat_id, message_id, message, message_date, replay=False):
+    """Gemensam väg för live- och återhämtade signaler: deduplicering, färskhetskontroll och processning."""
+    if not claim(chat_id, message_id, plugin.name):
+        logger.debug("Message %s in %s already handled.", message_id, chat_id)
+        return
+    trace_id = new_trace()
+    logger.info("[%s] %s message %s received.", plugin.name, "Replaying" if replay else "New", message_id)
+    if classify(plugin, message, message_date) != FRESH:
+        return
+    mt5_tape.mark("signal", channel=plugin.name, message=message)
+    with in_flight(f"{plugin.name} message {message_id} [{trace_id}]"):
+        await plugin.handle(message, client)
+
+
+def event_handler(plugin, client):
+    """Telethon-hanterare för NewMessage-händelser i en kanals chattar."""
+    async def handle_channel(event):
+        # Samma väg som återhämtade meddelanden: deduplicering och färskhetsfilter före processning
+        await process_signal(plugin, client, event.chat_id, event.id, event.raw_text, event.date)
+
+    return handle_channel
+
+
+async def catch_up(client, plugins):
+    """
+    Hämta missade meddelanden för alla kanaler i ett batchat historikanrop och spela upp de färska.
+
+    Alla GetHistoryRequest skickas i samma MTProto-container (client([...])).
+    """
+    from telethon.tl.functions.messages import GetHistoryRequest
+
+    by_chat = {}
+    for plugin in plugins:
+        by_chat.setdefault(plugin.chats, []).append(plugin)
+    chats = list(by_chat)
+    if not chats:
+        return 0
+
+    requests = [
+        GetHistoryRequest(peer=chat, offset_id=0, offset_date=None, add_offset=0,
+                          limit=CATCH_UP_HISTORY_LIMIT, max_id=0, min_id=last_message_id.get(chat, 0), hash=0)
+        for chat in chats
+    ]
+    start = time.perf_counter()
+    results = await client(requests)
+    logger.info("Fetched history for %s chats in %.0f ms.", len(chats), (time.perf_counter() - start) * 1000)
+
+    semaphore = asyncio.Semaphore(CATCH_UP_CONCURRENCY)
+
+    async def replay(plugin, chat, msg):
+        async with semaphore:
+            try:
+                await process_signal(plugin, client, chat, msg.id, msg.message, msg.date, replay=True)
+            except Exception as e:
+                logger.error("Error replaying message %s for %s: %s", msg.id, plugin.name, e)
+
+    jobs = []
+    for chat, result in zip(chats, results):
+        # Äldsta först så att signalerna spelas upp i den ordning de postades
+        for msg in sorted(result.messages, key=lambda m: m.id):
+            if not getattr(msg, "message", None) or msg.id <= last_message_id.get(chat, 0):
+                continue
+            for plugin in by_chat[chat]:
+                jobs.append(replay(plugin, chat, msg))
+    await asyncio.gather(*jobs)
+    return len(jobs)
+
+
+async def watch_connection(client, plugins):
+    """Övervaka Telegram-anslutningen och kör catch_up() efter varje återanslutning."""
+    was_connected = client.is_connected()
+    while True:
+        await asyncio.sleep(CONNECTION_CHECK_INTERVAL)
+        connected = client.is_connected()
+        if connected and not was_connected:
+            logger.info("Telegram reconnected. Catching up on missed signals...")
+            try:
+                replayed = await catch_up(client, plugins)
+                logger.info("Catch-up complete: %s candidate messages.", replayed)
+            except Exception as e:
+                logger.error("Catch-up after reconnect failed: %s", e)
+        elif was_connected and not connected:
+            logger.warning("Telegram connection lost.")
+        was_connected = connected
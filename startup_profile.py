@@ -0,0 +1,46 @@
+# startup_profile.py
+"""
+Mätning av kallstarten: tid per import och tid från processstart till att boten lyssnar.
+
+Importera denna modul först i main.py så att PROCESS_START hamnar så nära
+processstarten som möjligt. För en fullständig importträd-profil, kör
+python -X importtime main.py.
+"""
+import importlib
+import logging
+import sys
+import time
+
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger("Startup")
+
+# (namn, sekunder sedan PROCESS_START)
+_marks = []
+# (modulnamn, sekunder för importen)
+_imports = []
+
+
+def mark(name):
+    """Registrera en milstolpe i starten och returnera tiden sedan processstart."""
+    elapsed = time.perf_counter() - PROCESS_START
+    _marks.append((name, elapsed))
+    return elapsed
+
+
+def timed_import(module_name):
+    """Importera en modul och registrera hur lång tid importen tog (0 om den redan var laddad)."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _imports.append((module_name, time.perf_counter() - start))
+    return module
+
+
+def report():
+    """Logga en startrapport med milstolpar och importtider (långsammast först)."""
+    for name, elapsed in _marks:
+        logger.info("Startup %-28s %8.1f ms", name, elapsed * 1000)
+    for module_name, duration in sorted(_imports, key=lambda item: item[1], reverse=True):
+        logger.info("Import  %-28s %8.1f ms", module_name, duration * 1000)
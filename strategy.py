@@ -0,0 +1,52 @@
+# strategy.py
+"""
+Strategiparametrar för Kanal 4.
+
+channel_4 (trend) och channel_4_org_countertrend skilde sig bara i dessa värden,
+så de är samlade här och skickas som params till channel_4:s funktioner.
+StrategyParams är en namedtuple så att den kan picklas till processpoolen i
+strategy_sweep.
+"""
+from collections import namedtuple
+
+from settings import EMA_PERIOD
+
+StrategyParams = namedtuple("StrategyParams", [
+    "name",
+    "ema_rule",  # "trend": BUY över EMA / SELL under EMA. "countertrend": tvärtom.
+    "fixed_lot_size",  # Lotstorlek för originalorder
+    "profit_threshold",  # Total profit ($) då alla positioner stängs
+    "loss_threshold",  # Förlust ($) per position då en hedge läggs
+    "hedge_lot_size",  # Lotstorlek för hedge-order
+    "ema_period",
+])
+
+TREND = StrategyParams(
+    name="trend",
+    ema_rule="trend",
+    fixed_lot_size=0.1,
+    profit_threshold=10.0,
+    loss_threshold=-20.0,
+    hedge_lot_size=0.1,
+    ema_period=EMA_PERIOD,
+)
+
+COUNTERTREND = StrategyParams(
+    name="countertrend",
+    ema_rule="countertrend",
+    fixed_lot_size=1.0,
+    profit_threshold=100.0,
+    loss_threshold=-80.0,
+    hedge_lot_size=1.0,
+    ema_period=EMA_PERIOD,
+)
+
+
+def required_ema_position(params, is_buy):
+    """Returnera "above" eller "below": var priset måste ligga mot EMA för att signalen ska godtas."""
+    if params.ema_rule == "trend":
+        return "above" if is_buy else "below"
+    return "below" if is_buy else "above"
+
+# Namngivna strategier, används från settings (t.ex. SHADOW_STRATEGIES)
+STRATEGIES = {params.name: params for params in (TREND, COUNTERTREND)}
@@ -0,0 +1,301 @@
+# strategy_sweep.py
+"""
+Parametersvep för Kanal 4-strategin över inspelad historik.
+
+Varje parameteruppsättning (strategy.StrategyParams) backtestas mot samma
+M1-barer och signaler på en processpool som använder alla kärnor. Resultaten
+rankas efter netto-P/L och drawdown.
+
+Indikatorserier (EMA per period) räknas ut en gång i huvudprocessen och sparas
+som .npy i cachekatalogen; arbetarprocesserna läser dem och barerna med
+mmap_mode="r" i stället för att räkna om dem.
+
+Historik:
+    barer    - bar_store-filen för symbolens M1-barer (standard), eller en .npy med
+               MetaTrader5:s rates-array; läses utan att terminalen anropas
+    signaler - CSV med kolumnerna time,action,symbol (time i unix-sekunder, action BUY/SELL)
+
+Exempel:
+    python strategy_sweep.py --signals history/signals.csv --symbol XAUUSD
+    python strategy_sweep.py ... --random 500 --seed 1
+"""
+import argparse
+import csv
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import bar_store
+from settings import EMA_PERIOD, Trendorders
+from strategy import StrategyParams, required_ema_position
+
+logger = logging.getLogger("StrategySweep")
+
+CACHE_DIR = os.path.join("history", "cache")
+
+# Standardrutnät; varje nyckel är ett fält i StrategyParams
+SWEEP_GRID = {
+    "ema_rule": ["trend", "countertrend"],
+    "fixed_lot_size": [0.1, 0.5, 1.0],
+    "profit_threshold": [10.0, 50.0, 100.0],
+    "loss_threshold": [-20.0, -50.0, -80.0],
+    "hedge_lot_size": [0.1, 0.5, 1.0],
+    "ema_period": [EMA_PERIOD],
+}
+
+# Intervall för slumpsökning: (min, max) för tal, lista för kategoriska värden
+RANDOM_SPACE = {
+    "ema_rule": ["trend", "countertrend"],
+    "fixed_lot_size": (0.01, 1.0),
+    "profit_threshold": (5.0, 200.0),
+    "loss_threshold": (-200.0, -5.0),
+    "hedge_lot_size": (0.01, 1.0),
+    "ema_period": [21, 34, EMA_PERIOD, 89],
+}
+
+# Data som varje arbetarprocess laddar en gång (se _init_worker)
+_worker_data = {}
+
+
+def load_bars(path):
+    """Minnesmappa barer från en bar_store-fil eller en .npy-fil."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return bar_store.open_bars(path)
+
+
+def load_signals(path, symbol):
+    """Läs signaler för en symbol från CSV. Returnerar (tider, riktningar) där riktning är +1 (BUY) / -1 (SELL)."""
+    times, directions = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["symbol"].strip().upper() != symbol:
+                continue
+            action = row["action"].strip().upper()
+            if action not in ("BUY", "SELL"):
+                continue
+            times.append(int(float(row["time"])))
+            directions.append(1 if action == "BUY" else -1)
+    order = np.argsort(times, kind="stable")
+    return np.asarray(times, dtype=np.int64)[order], np.asarray(directions, dtype=np.int8)[order]
+
+
+def ema_series(closes, period):
+    """EMA för hela serien (startad med SMA över första perioden; NaN innan dess)."""
+    ema = np.full(len(closes), np.nan)
+    if len(closes) < period:
+        return ema
+    multiplier = 2 / (period + 1)
+    value = float(closes[:period].mean())
+    ema[period - 1] = value
+    for i in range(period, len(closes)):
+        value = (closes[i] - value) * multiplier + value
+        ema[i] = value
+    return ema
+
+
+def cached_ema_path(bars_path, period, cache_dir=CACHE_DIR):
+    """Räkna ut (om den saknas eller är äldre än barerna) och returnera sökvägen till EMA-serien för en period."""
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(bars_path))[0]
+    path = os.path.join(cache_dir, f"{name}_ema{period}.npy")
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(bars_path):
+        rates = load_bars(bars_path)
+        np.save(path, ema_series(np.asarray(rates["close"], dtype=np.float64), period))
+    return path
+
+
+def backtest(params, rates, ema, signal_times, signal_directions, contract_size):
+    """
+    Simulera Kanal 4-logiken bar för bar: EMA-filter på signaler, hedge vid loss_threshold
+    per position och stäng allt vid profit_threshold.
+
+    Utan framåtblick: en signal under bar b jämförs med EMA för senast stängda baren (b - 1),
+    som i boten, och fylls på öppningspriset för nästa bar (b + 1), där EMA-regeln också
+    prövas. Därefter värderas positionerna på barernas close.
+
+    Returnerar dict med net_pl, max_drawdown, trades och hedges.
+    """
+    # Sökning görs på mmap-arrayen; själva loopen går på Python-listor (billigare per bar än numpy-skalärer)
+    signal_bars = (np.searchsorted(rates["time"], signal_times, side="right") - 1).tolist()
+    entry_bars = [signal_bar + 1 for signal_bar in signal_bars]
+    signal_directions = signal_directions.tolist()
+    opens = rates["open"].tolist()
+    closes = rates["close"].tolist()
+    ema = ema.tolist()
+    scale = contract_size
+
+    # Öppna positioner: [riktning * lot * kontraktsstorlek, öppningspris, hedge, redan hedgad]
+    positions = []
+
+    realized = 0.0
+    peak = 0.0
+    max_drawdown = 0.0
+    trades = 0
+    hedges = 0
+
+    signal_index = 0
+    n_signals = len(signal_bars)
+    bar = entry_bars[0] if n_signals else len(closes)
+    while bar < len(closes):
+        price = closes[bar]
+
+        # Signaler från föregående bar fylls på denna bars öppning
+        while signal_index < n_signals and entry_bars[signal_index] <= bar:
+            direction = signal_directions[signal_index]
+            closed_bar = signal_bars[signal_index] - 1
+            signal_index += 1
+            if closed_bar < 0 or ema[closed_bar] != ema[closed_bar]:  # NaN före första EMA-värdet
+                continue
+            fill = opens[bar]
+            trend_order = Trendorders and any(p[2] for p in positions)
+            if not trend_order:
+                position = "above" if fill > ema[closed_bar] else "below"
+                if position != required_ema_position(params, direction > 0):
+                    continue
+            positions.append([direction * params.fixed_lot_size * scale, fill, False, False])
+            trades += 1
+
+        if positions:
+            pnl = [(price - p[1]) * p[0] for p in positions]
+            total = sum(pnl)
+            if total >= params.profit_threshold:
+                realized += total
+                positions = []
+                total = 0.0
+            else:
+                current_hedges = sum(1 for p in positions if p[2])
+                originals = len(positions) - current_hedges
+                for i in range(len(pnl)):
+                    p = positions[i]
+                    if pnl[i] > params.loss_threshold or p[2] or p[3] or current_hedges >= originals:
+                        continue
+                    p[3] = True
+                    direction = -1 if p[0] > 0 else 1
+                    positions.append([direction * params.hedge_lot_size * scale, price, True, True])
+                    current_hedges += 1
+                    hedges += 1
+            equity = realized + total
+        else:
+            equity = realized
+
+        if equity > peak:
+            peak = equity
+        elif peak - equity > max_drawdown:
+            max_drawdown = peak - equity
+
+        # Inga öppna positioner: hoppa direkt till nästa signal
+        if not positions:
+            if signal_index >= n_signals:
+                break
+            bar = max(bar + 1, entry_bars[signal_index])
+        else:
+            bar += 1
+
+    if positions:
+        last = closes[-1]
+        realized += sum((last - p[1]) * p[0] for p in positions)
+
+    return {"net_pl": realized, "max_drawdown": max_drawdown, "trades": trades, "hedges": hedges}
+
+
+def _init_worker(bars_path, ema_paths, signals, contract_size):
+    """Ladda barer och cachade EMA-serier en gång per arbetarprocess (mmap, ingen omräkning)."""
+    _worker_data["rates"] = load_bars(bars_path)
+    _worker_data["ema"] = {period: np.load(path, mmap_mode="r") for period, path in ema_paths.items()}
+    _worker_data["signals"] = signals
+    _worker_data["contract_size"] = contract_size
+
+
+def _evaluate(params):
+    data = _worker_data
+    result = backtest(params, data["rates"], data["ema"][params.ema_period], *data["signals"], data["contract_size"])
+    result["params"] = params
+    return result
+
+
+def grid_params(grid=SWEEP_GRID):
+    """Alla kombinationer i rutnätet som StrategyParams."""
+    fields = [f for f in StrategyParams._fields if f != "name"]
+    for i, values in enumerate(itertools.product(*(grid[f] for f in fields))):
+        yield StrategyParams(f"grid{i}", *values)
+
+
+def random_params(count, space=RANDOM_SPACE, seed=None):
+    """count slumpade parameteruppsättningar ur space."""
+    rng = random.Random(seed)
+    fields = [f for f in StrategyParams._fields if f != "name"]
+    for i in range(count):
+        values = []
+        for field in fields:
+            choice = space[field]
+            if isinstance(choice, tuple):
+                values.append(round(rng.uniform(*choice), 2))
+            else:
+                values.append(rng.choice(choice))
+        yield StrategyParams(f"random{i}", *values)
+
+
+def run_sweep(param_sets, bars_path, signals_path, symbol, contract_size, workers=None):
+    """Backtesta alla parameteruppsättningar parallellt och returnera resultaten rankade (bäst först)."""
+    param_sets = list(param_sets)
+    signals = load_signals(signals_path, symbol)
+    ema_paths = {period: cached_ema_path(bars_path, period) for period in {p.ema_period for p in param_sets}}
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_init_worker,
+                             initargs=(bars_path, ema_paths, signals, contract_size)) as pool:
+        results = list(pool.map(_evaluate, param_sets, chunksize=max(1, len(param_sets) // (4 * (workers or os.cpu_count())))))
+
+    return rank(results)
+
+
+def rank(results):
+    """Sortera efter högst netto-P/L och därefter lägst drawdown."""
+    return sorted(results, key=lambda r: (-r["net_pl"], r["max_drawdown"]))
+
+
+def write_results(results, path):
+    """Skriv rankade resultat till CSV."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", *StrategyParams._fields, "net_pl", "max_drawdown", "trades", "hedges"])
+        for i, result in enumerate(results, 1):
+            writer.writerow([i, *result["params"], round(result["net_pl"], 2), round(result["max_drawdown"], 2),
+                             result["trades"], result["hedges"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parametersvep för Kanal 4-strategin.")
+    parser.add_argument("--bars", default=None, help="Bar-fil (.bars eller .npy); standard är bar_store-filen för symbolens M1")
+    parser.add_argument("--signals", required=True, help="CSV med time,action,symbol")
+    parser.add_argument("--symbol", default="XAUUSD")
+    parser.add_argument("--contract-size", type=float, default=100.0)
+    parser.add_argument("--random", type=int, default=0, help="Slumpsök N uppsättningar i stället för rutnätet")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Skriv alla rankade resultat till denna CSV")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    param_sets = random_params(args.random, seed=args.seed) if args.random else grid_params()
+    symbol = args.symbol.upper()
+    bars_path = args.bars or bar_store.store_path(symbol, "M1")
+    results = run_sweep(param_sets, bars_path, args.signals, symbol, args.contract_size, args.workers)
+
+    for i, result in enumerate(results[:args.top], 1):
+        p = result["params"]
+        logger.info("%3d. net=%10.2f dd=%9.2f trades=%4d hedges=%4d | %s lot=%s profit=%s loss=%s hedge=%s ema=%s",
+                    i, result["net_pl"], result["max_drawdown"], result["trades"], result["hedges"],
+                    p.ema_rule, p.fixed_lot_size, p.profit_threshold, p.loss_threshold, p.hedge_lot_size, p.ema_period)
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# symbol_index.py
+"""
+Index över terminalens symboler: signalens namn -> brokerns symbolnamn.
+
+Indexet byggs en gång från mt5.symbols_get() (vid uppstart, annars vid första
+uppslagningen). Varje brokernamn indexeras både som det är och utan brokerns
+suffix/prefix ("XAUUSD.a", "XAUUSDm", "#US30" -> "XAUUSD"/"US30"), och alias
+från SYMBOL_ALIASES ("US30" -> "DJ30") pekar på det upplösta namnet. Finns både
+ett exakt namn och ett med suffix vinner det exakta, annars ett synligt framför
+ett dolt.
+
+Att lösa upp en signals symbol är därefter en uppslagning i en dictionary.
+Handlade symboler (ORDER_TEMPLATE_SYMBOLS, TREND_SYMBOLS) väljs i Market Watch
+med symbol_select när indexet byggs, övriga första gången de löses upp. En
+bakgrundsuppgift bygger om indexet när terminalens symbollista ändras.
+"""
+import asyncio
+import logging
+import re
+
+import MetaTrader5 as mt5
+
+from settings import SYMBOL_ALIASES, SYMBOL_INDEX_REFRESH_INTERVAL, ORDER_TEMPLATE_SYMBOLS, TREND_SYMBOLS
+
+logger = logging.getLogger("SymbolIndex")
+
+# Prefix och suffix som brokers lägger till: "#US30", "XAUUSD.a", "EURUSD_i", "XAUUSDm", "GBPUSD.pro"
+_DECORATION = re.compile(r"^[#.!_]*(?P<base>[A-Z0-9]+?)(?:[._\-#!+].*|[a-z]+)?$")
+
+# Namn i versaler (exakt, utan suffix eller alias) -> brokerns symbolnamn
+_index = {}
+# Brokernamn som är synliga i Market Watch
+_selected = set()
+# symbols_total() när indexet byggdes
+_state = {"total": None}
+
+
+def canonical(name):
+    """Brokerns namn utan prefix/suffix, i versaler ("XAUUSD.a" -> "XAUUSD")."""
+    match = _DECORATION.match(name)
+    return (match.group("base") if match else name).upper()
+
+
+def build(traded=None):
+    """Bygg indexet från symbols_get() och välj handlade symboler i Market Watch. Returnerar antal symboler."""
+    symbols = mt5.symbols_get()
+    if symbols is None:
+        logger.error("symbols_get failed: %s", mt5.last_error())
+        return 0
+    index = {}
+    rank = {}  # Indexnamn -> (exakt, synlig) för namnet som valts
+    selected = set()
+    for info in symbols:
+        if info.visible:
+            selected.add(info.name)
+        for key, exact in ((info.name.upper(), True), (canonical(info.name), False)):
+            candidate = (exact or key == info.name, bool(info.visible))
+            if key not in rank or candidate > rank[key]:
+                index[key] = info.name
+                rank[key] = candidate
+    for alias, target in SYMBOL_ALIASES.items():
+        resolved = index.get(target.upper())
+        if resolved is not None and alias.upper() not in index:
+            index[alias.upper()] = resolved
+
+    global _index, _selected
+    _index, _selected = index, selected
+    _state["total"] = len(symbols)
+    for symbol in traded if traded is not None else [*ORDER_TEMPLATE_SYMBOLS, *TREND_SYMBOLS]:
+        name = index.get(symbol.upper())
+        if name is None:
+            logger.warning("Traded symbol %s is not offered by the broker.", symbol)
+        else:
+            ensure_selected(name)
+    logger.info("Symbol index built: %s broker symbols, %s names.", len(symbols), len(index))
+    return len(symbols)
+
+
+def ensure_selected(name):
+    """Välj symbolen i Market Watch om den inte redan är synlig. Returnerar True om den är det."""
+    if name in _selected:
+        return True
+    if not mt5.symbol_select(name, True):
+        logger.error("Failed to select %s in Market Watch: %s", name, mt5.last_error())
+        return False
+    _selected.add(name)
+    logger.info("Selected %s in Market Watch.", name)
+    return True
+
+
+def resolve(symbol):
+    """Brokerns namn för en signals symbol (alias och suffix upplösta, synlig), eller None om den saknas."""
+    if not _index:
+        build()
+    name = _index.get(symbol.upper())
+    if name is None:
+        name = _index.get(canonical(symbol))
+    if name is None or (name not in _selected and not ensure_selected(name)):
+        return None
+    return name
+
+
+def is_selected(name):
+    """Sant om brokernamnet är synligt i Market Watch (enligt indexet)."""
+    return name in _selected
+
+
+def refresh():
+    """Bygg om indexet om terminalens symbollista har ändrats. Returnerar True om det byggdes om."""
+    total = mt5.symbols_total()
+    if total == _state["total"]:
+        return False
+    logger.info("Broker symbol list changed (%s -> %s symbols); rebuilding index.", _state["total"], total)
+    build()
+    return True
+
+
+async def run_symbol_index(interval=SYMBOL_INDEX_REFRESH_INTERVAL):
+    """Bakgrundsuppgift: bygg om indexet när terminalens symbollista ändras."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(refresh)
+        except Exception as e:
+            logger.error("Error refreshing symbol index: %s", e)
+
+
+def reset():
+    """Glöm indexet (används av tester)."""
+    global _index, _selected
+    _index, _selected = {}, set()
+    _state["total"] = None
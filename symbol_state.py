@@ -0,0 +1,69 @@
+# symbol_state.py
+"""
+Lås och tillstånd per symbol.
+
+Varje symbol har en egen partition med ett asyncio-lås. Signaler, hedgar och
+stängningar på samma symbol tar låset och körs därmed i ordning, medan olika
+symboler kan processas samtidigt (det blockerande MT5-arbetet körs i trådar
+via asyncio.to_thread medan låset hålls).
+
+generation räknas upp varje gång en operation har ändrat symbolens positioner,
+så att equity-övervakningen kan se om dess ögonblicksbild av positionerna är
+inaktuell för en symbol och då läsa om just den symbolen.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class SymbolPartition:
+    """Tillstånd som bara ändras av den som håller symbolens lås."""
+
+    __slots__ = ("symbol", "lock", "generation", "last_original_order", "hedge_warning_logged")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.lock = asyncio.Lock()
+        self.generation = 0  # Räknas upp när symbolens positioner har ändrats
+        self.last_original_order = None  # Senaste originalorderns ticket
+        self.hedge_warning_logged = 0.0  # Tid för senaste "max hedge"-varningen
+
+    def touch(self):
+        """Markera att symbolens positioner har ändrats."""
+        self.generation += 1
+
+
+# symbol -> SymbolPartition
+_partitions = {}
+
+
+def partition(symbol):
+    """Returnera (och skapa vid behov) partitionen för en symbol."""
+    part = _partitions.get(symbol)
+    if part is None:
+        part = _partitions.setdefault(symbol, SymbolPartition(symbol))
+    return part
+
+
+def symbol_lock(symbol):
+    """asyncio-låset för en symbol: `async with symbol_lock(symbol): ...`"""
+    return partition(symbol).lock
+
+
+@asynccontextmanager
+async def symbols_locked(symbols):
+    """Ta låsen för flera symboler, alltid i sorterad ordning så att två anropare inte kan låsa varandra."""
+    locks = [symbol_lock(symbol) for symbol in sorted(set(symbols))]
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+
+def generations():
+    """Ögonblicksbild av alla symbolers generation: {symbol: generation}."""
+    return {symbol: part.generation for symbol, part in _partitions.items()}
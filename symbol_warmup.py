@@ -0,0 +1,105 @@
+# symbol_warmup.py
+"""
+Uppvärmning av kanalernas symboler innan signalerna kommer.
+
+Första signalen efter start (eller efter en lugn period) betalar annars för
+att terminalen laddar ned historik, att symbolen väljs i Market Watch och att
+tickströmmen startar. För varje symbol i de aktiverade kanalernas bevakningslistor
+(CHANNEL_WATCHLISTS) gör warm_up, vid start och sedan var WARMUP_INTERVAL sekund:
+
+- löser upp och väljer symbolen (symbol_index),
+- förbereder ordermallen (order_templates),
+- läser en tick,
+- fyller bar-lagringen med historik och kontrollerar EMA- och ATR-fönstren (WARMUP_BARS),
+- initierar och publicerar EMA-/trendläget och registrerar symbolen i trend_engine,
+  som sedan håller det aktuellt.
+
+Resultatet per symbol sparas i readiness och loggas.
+"""
+import asyncio
+import logging
+import time
+
+import MetaTrader5 as mt5
+
+import bar_store
+import order_templates
+import symbol_index
+import trend_engine
+from settings import CHANNEL_WATCHLISTS, WARMUP_BARS, WARMUP_INTERVAL
+
+logger = logging.getLogger("SymbolWarmup")
+
+# Signalens symbolnamn -> {"symbol", "ready", "duration", "checked", "bars", "error"}
+readiness = {}
+
+
+def watchlist(plugins):
+    """Symbolerna som de givna kanalerna bevakar, utan dubbletter och i konfigurerad ordning."""
+    symbols = []
+    for plugin in plugins:
+        for symbol in CHANNEL_WATCHLISTS.get(plugin.name, ()):
+            if symbol not in symbols:
+                symbols.append(symbol)
+    return symbols
+
+
+def warm_up(symbol):
+    """Värm upp en symbol (blockerande). Returnerar och sparar dess status i readiness."""
+    start = time.perf_counter()
+    status = {"symbol": None, "ready": False, "duration": None, "checked": time.time(), "bars": {}, "error": None}
+    try:
+        name = symbol_index.resolve(symbol)
+        if name is None:
+            raise ValueError("not offered by the broker")
+        status["symbol"] = name
+        order_templates.template(name)
+        if mt5.symbol_info_tick(name) is None:
+            raise ValueError(f"no tick data ({mt5.last_error()})")
+        for timeframe, count in WARMUP_BARS.items():
+            bar_store.sync(name, timeframe)  # Djup historik i filen, så att signalvägen bara läser den
+            status["bars"][timeframe] = len(bar_store.bars(name, timeframe, count, include_current=True))
+            if status["bars"][timeframe] < count:
+                raise ValueError(f"only {status['bars'][timeframe]} of {count} {timeframe} bars")
+        trend_engine.watch(name)
+        trend_engine.refresh([name])
+        status["ready"] = True
+    except Exception as e:
+        status["error"] = str(e)
+    status["duration"] = time.perf_counter() - start
+    readiness[symbol] = status
+    return status
+
+
+def warm_up_all(symbols):
+    """Värm upp alla symboler och logga en rad per symbol."""
+    for symbol in symbols:
+        previous = readiness.get(symbol)
+        status = warm_up(symbol)
+        if previous is not None and previous["ready"] == status["ready"]:
+            logger.debug("Warm-up %s refreshed in %.1f ms.", symbol, status["duration"] * 1000)
+        elif status["ready"]:
+            logger.info("Warm-up %s (%s) ready in %.1f ms.", symbol, status["symbol"], status["duration"] * 1000)
+        else:
+            logger.warning("Warm-up %s not ready after %.1f ms: %s", symbol, status["duration"] * 1000, status["error"])
+    return readiness
+
+
+def is_ready(symbol):
+    """Sant om symbolen värmdes upp utan fel vid senaste varvet."""
+    status = readiness.get(symbol)
+    return bool(status and status["ready"])
+
+
+async def run_warmup(plugins, interval=WARMUP_INTERVAL):
+    """Bakgrundsuppgift: värm upp kanalernas symboler direkt och sedan med jämna mellanrum."""
+    symbols = watchlist(plugins)
+    if not symbols:
+        return
+    logger.info("Warming up %s for %s.", ", ".join(symbols), ", ".join(plugin.name for plugin in plugins))
+    while True:
+        try:
+            await asyncio.to_thread(warm_up_all, symbols)
+        except Exception as e:
+            logger.error("Error during symbol warm-up: %s", e)
+        await asyncio.sleep(interval)
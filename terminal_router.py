@@ -0,0 +1,229 @@
+# terminal_router.py
+"""
+Hot standby och latensstyrd routing mellan MT5-terminalerna.
+
+MetaTrader5-paketet kan bara vara anslutet till en terminal per process, så
+varje terminal i ROUTER_TERMINALS får en egen arbetsprocess som håller sin
+anslutning uppe. Terminalerna förutsätts vara inloggade på samma konto, så en
+order kan läggas via vilken som helst av dem och positionerna syns i alla.
+
+En bakgrundsuppgift provar varje terminal var ROUTER_PROBE_INTERVAL sekund:
+rundtur till arbetsprocessen plus terminal_info() (anslutning till
+handelsservern och ping_last). Nya order skickas via den friska terminalen med
+lägst poäng (glidande medelvärde av rundturen + ping till servern). Svarar den
+inte, eller bara med ett anslutningsfel, går ordern vidare till nästa terminal
+inom samma inskickning. Routingbeslut och failover-tider loggas och sparas i
+routing_log.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import MetaTrader5 as mt5
+
+import order_submission
+from order_submission import NoRoute, classify, failed_result
+from settings import ROUTER_TERMINALS, ROUTER_PROBE_INTERVAL, ROUTER_PROBE_TIMEOUT, ROUTER_LATENCY_SMOOTHING
+
+logger = logging.getLogger("TerminalRouter")
+
+# Senaste routade order: {"symbol", "terminal", "retcode", "failovers", "failover_ms", "latency"}
+routing_log = deque(maxlen=1000)
+
+# Arbetarens terminal (MetaTrader5-modulen) och sökväg, per tråd i arbetsprocessen
+_local = threading.local()
+
+
+# --- Körs i arbetsprocessen/-tråden ---
+def _init_worker(path):
+    import MetaTrader5
+    _local.mt5 = MetaTrader5
+    _local.path = path
+    MetaTrader5.initialize(path)
+
+
+def _init_local(module, path):
+    _local.mt5 = module
+    _local.path = path
+
+
+def _probe():
+    """Terminalens anslutning till handelsservern; ansluter igen om terminalen har tappats."""
+    mt5 = _local.mt5
+    info = mt5.terminal_info()
+    if info is None:
+        mt5.initialize(_local.path)
+        info = mt5.terminal_info()
+        if info is None:
+            return {"connected": False, "trade_allowed": False, "ping": None, "error": mt5.last_error()}
+    return {"connected": bool(info.connected), "trade_allowed": bool(info.trade_allowed),
+            "ping": info.ping_last / 1e6, "error": None}
+
+
+def _send(request, retry_budget, deadline):
+    return order_submission.submit_order(request, retry_budget, deadline, terminal=_local.mt5, route=False)
+
+
+# --- Körs i boten ---
+class TerminalWorker:
+    """En terminal med egen arbetsprocess (eller en tråd med given modul, t.ex. mt5_simulator i tester)."""
+
+    __slots__ = ("alias", "path", "executor", "healthy", "rtt", "ping", "checked", "error")
+
+    def __init__(self, alias, path, module=None):
+        self.alias = alias
+        self.path = path
+        if module is None:
+            self.executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(path,))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, initializer=_init_local, initargs=(module, path))
+        self.healthy = False
+        self.rtt = None  # Glidande medelvärde av rundturen till arbetaren (sekunder)
+        self.ping = 0.0  # Terminalens ping till handelsservern (sekunder)
+        self.checked = 0.0
+        self.error = None
+
+    def score(self):
+        return (self.rtt or 0.0) + (self.ping or 0.0)
+
+    def record_probe(self, probe, rtt):
+        self.checked = time.monotonic()
+        self.rtt = rtt if self.rtt is None else self.rtt + ROUTER_LATENCY_SMOOTHING * (rtt - self.rtt)
+        self.ping = probe["ping"] or 0.0
+        self.error = probe["error"]
+        healthy = probe["connected"] and probe["trade_allowed"]
+        if healthy != self.healthy:
+            logger.info("Terminal %s is now %s (rtt %.1f ms, ping %.1f ms).",
+                        self.alias, "healthy" if healthy else "unhealthy", self.rtt * 1000, self.ping * 1000)
+        self.healthy = healthy
+
+    def mark_unhealthy(self, reason):
+        if self.healthy:
+            logger.warning("Terminal %s marked unhealthy: %s", self.alias, reason)
+        self.healthy = False
+        self.error = reason
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Terminalerna i konfigurerad ordning
+workers = []
+
+
+def ranking():
+    """Friska terminaler, bästa (lägst poäng) först."""
+    return sorted((worker for worker in workers if worker.healthy), key=TerminalWorker.score)
+
+
+async def probe(worker, timeout=ROUTER_PROBE_TIMEOUT):
+    """Prova en terminal och uppdatera dess hälsa och latens."""
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(worker.executor.submit(_probe)), timeout)
+    except asyncio.TimeoutError:
+        worker.mark_unhealthy(f"probe timed out after {timeout * 1000:.0f} ms")
+        return
+    except Exception as e:
+        worker.mark_unhealthy(f"probe failed: {e}")
+        return
+    worker.record_probe(result, time.perf_counter() - start)
+
+
+def route_order(request, retry_budget, deadline):
+    """
+    Skicka en order via den bästa friska terminalen, med failover till nästa inom samma inskickning.
+
+    Failover sker bara när ordern bevisligen inte lades (inget svar eller anslutningsfel). Tar
+    arbetaren för lång tid är utfallet okänt; då returneras ett failed_result med
+    TRADE_RETCODE_TIMEOUT i stället för att riskera en dubbel order. Svarade ingen terminal
+    returneras ett failed_result med TRADE_RETCODE_CONNECTION. Kastar NoRoute om ingen
+    terminal är frisk.
+    """
+    candidates = ranking()
+    if not candidates:
+        raise NoRoute()
+    start = time.perf_counter()
+    result = None
+    failed = []
+    for worker in candidates:
+        remaining = deadline - (time.perf_counter() - start)
+        if remaining <= 0:
+            break
+        future = worker.executor.submit(_send, request, retry_budget, remaining)
+        try:
+            result = future.result(timeout=remaining + ROUTER_PROBE_TIMEOUT)
+        except FutureTimeout:
+            worker.mark_unhealthy("order submission timed out")
+            logger.error("Order for %s via %s timed out; outcome unknown, not failing over.",
+                         request.get("symbol"), worker.alias)
+            result = failed_result(request, mt5.TRADE_RETCODE_TIMEOUT,
+                                   f"timed out on {worker.alias}, outcome unknown")
+            _log_route(request, None, result.retcode, [*failed, worker.alias], start)
+            return result
+        except Exception as e:
+            result = None
+            logger.error("Order for %s via %s failed: %s", request.get("symbol"), worker.alias, e)
+
+        retcode = result.retcode if result is not None else None
+        if result is not None and classify(retcode) != "transient":
+            _log_route(request, worker, retcode, failed, start)
+            return result
+        worker.mark_unhealthy(f"retcode {retcode}")
+        failed.append(worker.alias)
+        logger.warning("Terminal %s could not place %s order (retcode %s) after %.1f ms; failing over.",
+                       worker.alias, request.get("symbol"), retcode, (time.perf_counter() - start) * 1000)
+    if result is None:
+        result = failed_result(request, mt5.TRADE_RETCODE_CONNECTION, "no terminal responded")
+    _log_route(request, None, result.retcode, failed, start)
+    return result
+
+
+def _log_route(request, worker, retcode, failed, start):
+    latency = time.perf_counter() - start
+    routing_log.append({
+        "symbol": request.get("symbol"),
+        "terminal": worker.alias if worker else None,
+        "retcode": retcode,
+        "failovers": len(failed),
+        "latency": latency,
+    })
+    if worker is None:
+        logger.error("Order for %s failed on all terminals (%s) after %.1f ms.",
+                     request.get("symbol"), ", ".join(failed), latency * 1000)
+    elif failed:
+        logger.warning("Order for %s failed over from %s to %s in %.1f ms (retcode %s).",
+                       request.get("symbol"), ", ".join(failed), worker.alias, latency * 1000, retcode)
+    else:
+        logger.info("Order for %s routed to %s (score %.1f ms) in %.1f ms (retcode %s).",
+                    request.get("symbol"), worker.alias, worker.score() * 1000, latency * 1000, retcode)
+
+
+def start(terminals=ROUTER_TERMINALS, modules=None):
+    """Starta arbetarna och skicka nya order via routern. modules: {alias: modul} för arbetare i tråd."""
+    modules = modules or {}
+    for alias, path in terminals.items():
+        workers.append(TerminalWorker(alias, path, modules.get(alias)))
+    order_submission.set_router(route_order)
+
+
+def stop():
+    order_submission.set_router(None)
+    for worker in workers:
+        worker.shutdown()
+    workers.clear()
+
+
+async def run_router(interval=ROUTER_PROBE_INTERVAL):
+    """Bakgrundsuppgift: starta arbetarna och prova alla terminaler kontinuerligt."""
+    start()
+    logger.info("Routing orders across terminals: %s.", ", ".join(worker.alias for worker in workers))
+    try:
+        while True:
+            await asyncio.gather(*(probe(worker) for worker in workers))
+            await asyncio.sleep(interval)
+    finally:
+        stop()
@@ -0,0 +1,29 @@
+# test_bar_store.py
+import os
+
+import pytest
+
+import bar_store
+import channel_4
+import symbol_warmup
+import trend_engine
+
+
+def test_signal_path_fetches_only_the_ema_window(terminal, monkeypatch):
+    """Utan sparad historik hämtar EMA-kontrollen bara sitt fönster; den djupa hämtningen görs av uppvärmningen."""
+    mt5 = channel_4.mt5
+    requested = []
+    copy_rates = mt5.copy_rates_from_pos
+    monkeypatch.setattr(mt5, "copy_rates_from_pos",
+                        lambda symbol, timeframe, start, count: (requested.append(count),
+                                                                 copy_rates(symbol, timeframe, start, count))[1])
+    ema = channel_4.calculate_ema("XAUUSD")
+    assert requested == [trend_engine.TREND_WARMUP_BARS]
+    assert not os.path.exists(bar_store.store_path("XAUUSD", "M1"))
+
+    requested.clear()
+    symbol_warmup.warm_up("XAUUSD")
+    assert bar_store.BAR_STORE_INITIAL_BARS in requested
+    requested.clear()
+    assert channel_4.calculate_ema("XAUUSD") == pytest.approx(ema, rel=1e-12)
+    assert requested == []  # Läses ur filen
@@ -0,0 +1,591 @@
+# test_benchmarks.py
+"""
+Benchmarks för de heta vägarna, körda mot den simulerade MT5-terminalen (mt5_simulator).
+
+Spara en baslinje:   pytest test_benchmarks.py --benchmark-autosave
+Därefter jämförs varje körning automatiskt mot senaste baslinjen och fälls vid
+regression (se BENCHMARK_REGRESSION_LIMIT i conftest.py).
+"""
+import asyncio
+import collections
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import mt5_simulator
+import logging_setup
+import channel_1
+import channel_2
+import channel_3
+import channel_4
+import trend_engine
+import shadow_engine
+import order_submission
+import order_templates
+import bar_store
+import dashboard_shm
+import loop_watchdog
+import mt5_connection
+import terminal_router
+import order_rate_limiter
+import mt5_tape
+import symbol_index
+import symbol_warmup
+import signal_coalescer
+import session_calendar
+import load_generator
+from communication import gui_updates, hedged_positions, original_orders_per_symbol, hedge_orders_per_symbol
+
+CHANNEL_1_MESSAGE = """
+Gold sell now
+Zone 2650 - 2655
+SL: 2660
+TP1: 2645
+TP2: 2640
+TP3: 2635
+"""
+SCALPING_MESSAGE = """
+Gold Sell 2650 - 2655
+SL 2660
+TP1 2645
+TP2 (2640/2638)
+"""
+CHANNEL_2_MESSAGE = """
+Signal alert
+Gold sell zone 2650 - 2655
+SL: 2660
+TP1: 2645
+TP2: 2640
+"""
+CHANNEL_3_MESSAGE = "buy xauusd\nATR signal"
+CHANNEL_4_MESSAGE = """
+SELL XAUUSD
+ENTRY: 2632.59
+BULL
+"""
+CHANNEL_6_MESSAGE = "BUY XAUUSD:\nEntry now"
+
+
+# --- Parsers ---
+def test_parse_channel_1(benchmark):
+    assert benchmark(channel_1.parse_channel_1_signal, CHANNEL_1_MESSAGE)[0] == "SELL"
+
+
+def test_parse_scalping(benchmark):
+    assert benchmark(channel_1.parse_scalping_signal, SCALPING_MESSAGE)[4] == [2645.0, 2640.0]
+
+
+def test_parse_channel_2(benchmark):
+    assert benchmark(channel_2.parse_channel_2_signal, CHANNEL_2_MESSAGE)[2] == [2650.0, 2655.0]
+
+
+def test_parse_channel_3(benchmark):
+    assert benchmark(channel_3.parse_channel_3_signal, CHANNEL_3_MESSAGE) == ("BUY", "XAUUSD")
+
+
+def test_parse_channel_4(benchmark, terminal):
+    assert benchmark(channel_4.parse_channel_4_signal, CHANNEL_4_MESSAGE)[2] == "XAUUSD"
+
+
+def test_parse_channel_5(benchmark):
+    channel_5 = pytest.importorskip("channel_5")
+    assert benchmark(channel_5.parse_channel_5_signal, "BUY BTCUSDT") == "Buy"
+
+
+def test_parse_channel_6(benchmark):
+    channel_6 = pytest.importorskip("channel_6")
+    assert benchmark(channel_6.parse_channel_6_signal, CHANNEL_6_MESSAGE) == ("BUY_STOP", "XAUUSD")
+
+
+# --- Indikatorer och lotstorlek ---
+def test_calculate_ema(benchmark, terminal):
+    benchmark(channel_4.calculate_ema, "XAUUSD")
+
+
+def test_calculate_atr(benchmark, terminal):
+    assert benchmark(channel_3.calculate_atr, "XAUUSD") > 0
+
+
+def test_calculate_lot_size_channel_1(benchmark, terminal):
+    benchmark(channel_1.calculate_lot_size, 2, 10000.0, 2660.0, 2650.0, 5)
+
+
+def test_calculate_lot_size_channel_2(benchmark, terminal):
+    benchmark(channel_2.calculate_lot_size, 2, 10000.0, 2660.0, 2650.0, 5)
+
+
+def test_calculate_lot_size_channel_3(benchmark, terminal):
+    benchmark(channel_3.calculate_lot_size, 10000.0, 24, 150.0, "XAUUSD", 225.0)
+
+
+def test_channel_4_lot_search(benchmark, terminal):
+    symbol_info = terminal.symbols["XAUUSD"]
+    # Så lite marginal att sökningen måste stega ner från 1.0 lot till nästan volume_min
+    lot = benchmark(channel_4.find_affordable_lot_size, terminal.as_module().ORDER_TYPE_BUY, "XAUUSD",
+                    symbol_info, 2630.0, 1.0, 100.0)
+    assert lot < 1.0
+
+
+def test_bar_store_incremental_sync(benchmark, terminal):
+    """Efter första hämtningen läggs bara nya stängda barer till; läsningen är en vy av filen."""
+    assert bar_store.sync("XAUUSD", "M1", force=True) == terminal.bars - 1
+
+    def append_one():
+        terminal.advance(1)
+        return bar_store.sync("XAUUSD", "M1", force=True)
+
+    assert benchmark.pedantic(append_one, rounds=50) == 1
+    bars = bar_store.bars("XAUUSD", "M1", 100)
+    assert isinstance(bars, np.memmap)  # Vy av filen, ingen kopia
+    assert bars["time"][-1] == terminal.rates["XAUUSD"]["time"][-2]
+
+
+def test_calculate_ema_from_bar_store(benchmark, terminal):
+    bar_store.sync("XAUUSD", "M1", force=True)
+    benchmark(channel_4.calculate_ema, "XAUUSD")
+
+
+def test_trend_engine_refresh(benchmark, terminal):
+    trend_engine.refresh(["XAUUSD"])  # Initiera EMA; därefter mäts det inkrementella varvet
+    benchmark(trend_engine.refresh, ["XAUUSD"])
+    assert trend_engine.get_state("XAUUSD")["trend"] in ("UP", "DOWN", "MIXED")
+
+
+def test_check_price_vs_ema_from_trend_engine(benchmark, terminal):
+    trend_engine.refresh(["XAUUSD"])
+    assert benchmark(channel_4.check_price_vs_ema, "XAUUSD")["ema"] == trend_engine.get_ema("XAUUSD")
+
+
+def test_ensure_connected_reuses_connection(benchmark, terminal):
+    """Signalvägen efter första anslutningen: ingen initialize-handskakning."""
+    assert mt5_connection.ensure_connected("terminal64.exe")
+    calls = terminal.calls
+    assert benchmark(mt5_connection.ensure_connected, "terminal64.exe")
+    assert terminal.calls == calls
+
+
+def test_circuit_breaker_fails_fast(benchmark, terminal):
+    """Med terminalen nere avvisas signaler direkt i stället för att vänta ut initialize."""
+    terminal.connected = False
+    terminal.latency = 0.05
+    for _ in range(mt5_connection.MT5_BREAKER_FAILURES):
+        mt5_connection.ensure_connected("terminal64.exe")
+    assert mt5_connection.connection("terminal64.exe").state == mt5_connection.OPEN
+    assert not benchmark(mt5_connection.ensure_connected, "terminal64.exe")
+
+    # Bakgrundsuppgiften återansluter när terminalen är uppe igen
+    terminal.connected = True
+    terminal.latency = 0.0
+    mt5_connection._maintain(float("inf"))
+    assert mt5_connection.ensure_connected("terminal64.exe")
+
+
+def test_submit_order_requote_retry(benchmark, terminal):
+    """Requote och prisändring prissätts om direkt från ny tick; tredje försöket fylls."""
+    mt5 = terminal.as_module()
+    request = {"action": mt5.TRADE_ACTION_DEAL, "symbol": "XAUUSD", "volume": 0.1, "type": mt5.ORDER_TYPE_BUY,
+               "price": 1.0, "deviation": 20, "magic": 0, "comment": "Original_order",
+               "type_filling": mt5.ORDER_FILLING_IOC}
+
+    def submit():
+        terminal.retcode_script[:] = [mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED]
+        return order_submission.submit_order(request)
+
+    result = benchmark(submit)
+    assert result.retcode == mt5.TRADE_RETCODE_DONE
+    assert result.price == terminal.as_module().symbol_info_tick("XAUUSD").ask
+    assert order_submission.fill_stats[-1]["attempts"] == 3
+
+
+def test_rate_limiter_serves_closes_before_entries(benchmark):
+    """Under en kö får stängningar token före nya order, oavsett ankomstordning."""
+    limiter = order_rate_limiter.TokenBucket(rate=100, burst=1)
+    limiter.acquire()  # Töm bucketen så att alla följande köar
+    served = []
+
+    def request(priority):
+        limiter.acquire(priority)
+        served.append(priority)
+
+    threads = [threading.Thread(target=request, args=(order_rate_limiter.ENTRY,)) for _ in range(5)]
+    threads += [threading.Thread(target=request, args=(order_rate_limiter.CLOSE,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    # Första ENTRY kan ha fått en token innan stängningarna kom; därefter går alla stängningar först
+    assert served[served.index(order_rate_limiter.CLOSE):][:3] == [order_rate_limiter.CLOSE] * 3
+
+    unlimited = order_rate_limiter.TokenBucket(rate=1e9, burst=1e9)
+    benchmark(unlimited.acquire, order_rate_limiter.ENTRY)
+
+
+def test_route_order_to_fastest_terminal(benchmark, terminal, router):
+    primary, secondary = router
+    mt5 = terminal.as_module()
+    request = order_templates.build_request("XAUUSD", "deal", type=mt5.ORDER_TYPE_BUY, volume=0.1,
+                                            price=terminal.symbol_info_tick("XAUUSD").ask, comment="Route")
+    result = benchmark(order_submission.submit_order, request)
+    assert result.retcode == mt5.TRADE_RETCODE_DONE
+    assert terminal_router.routing_log[-1]["terminal"] == "Secondary"
+    assert secondary.positions and not primary.positions and not terminal.positions
+
+
+def test_build_request_from_template(benchmark, terminal):
+    """Het väg: kopiera den kontrollerade mallen och fyll i volym och pris."""
+    mt5 = terminal.as_module()
+    order_templates.warm_up(["XAUUSD"])
+    request = benchmark(order_templates.build_request, "XAUUSD", "deal", type=mt5.ORDER_TYPE_BUY,
+                        volume=0.123, price=2630.123456, comment="Original_order")
+    assert request["price"] == round(2630.123456, terminal.symbols["XAUUSD"].digits)
+    assert request["volume"] == 0.12
+    assert mt5.order_check(request).retcode == 0
+
+
+def test_symbol_index_resolves_broker_suffix(benchmark, terminal, use_terminal):
+    """Signalnamn och alias löses upp mot brokerns suffixnamn med en uppslagning; dolda handlade symboler väljs."""
+    broker = mt5_simulator.SimulatedTerminal(symbols={
+        "XAUUSD.a": mt5_simulator.DEFAULT_SYMBOLS["XAUUSD"],
+        "DJ30.a": mt5_simulator.DEFAULT_SYMBOLS["DJ30"],
+        "EURUSDm": mt5_simulator.DEFAULT_SYMBOLS["EURUSD"],
+    })
+    broker.symbols["DJ30.a"] = broker.symbols["DJ30.a"]._replace(visible=False, select=False)
+    use_terminal(broker.as_module())
+    symbol_index.build(traded=["XAUUSD"])
+
+    calls = broker.calls
+    assert benchmark(channel_4.map_symbol, "xauusd") == "XAUUSD.a"
+    assert broker.calls == calls
+    assert channel_3.map_symbol("US30") == "DJ30.a" and broker.symbols["DJ30.a"].visible
+    assert channel_4.parse_channel_4_signal("BUY EURUSD\nENTRY: 1.05\nBULL")[2] == "EURUSDm"
+    assert channel_4.map_symbol("GBPUSD") is None
+
+    broker.add_symbol("GBPUSD.a", *mt5_simulator.DEFAULT_SYMBOLS["GBPUSD"])
+    assert symbol_index.refresh() and channel_4.map_symbol("GBPUSD") == "GBPUSD.a"
+
+    # Trendmotorn bevakar signalnamnen och publicerar under brokerns namn
+    trend_engine.refresh(["XAUUSD"])
+    assert trend_engine.get_ema("XAUUSD.a") is not None and channel_4.get_trend("XAUUSD") != "UNKNOWN"
+
+
+def test_warmup_readies_watchlist(benchmark, terminal):
+    """Efter uppvärmningen är symbolerna valda och EMA-filtret läser bara en tick från terminalen."""
+    terminal.symbols["DJ30"] = terminal.symbols["DJ30"]._replace(visible=False, select=False)
+    symbol_warmup.warm_up_all(["XAUUSD", "US30", "NOSUCH"])
+    assert symbol_warmup.is_ready("XAUUSD") and symbol_warmup.is_ready("US30")
+    assert not symbol_warmup.is_ready("NOSUCH")
+    assert terminal.symbols["DJ30"].visible
+
+    calls = terminal.calls
+    benchmark.pedantic(channel_4.check_price_vs_ema, args=("XAUUSD",), rounds=1)
+    assert terminal.calls - calls == 1
+
+
+def test_coalescing_window_nets_signals(benchmark, terminal, loop, monkeypatch):
+    """Signaler på samma symbol inom fönstret blir en order med nettovolymen; motstående tar ut varandra."""
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    monkeypatch.setattr(channel_4, "SIGNAL_COALESCE_WINDOW", {"trend": 0.02})
+    monkeypatch.setattr(channel_4, "check_price_vs_ema", lambda symbol, **kwargs: {"position": "below", "ema": 0.0,
+                                                                                   "price": 2630.0})
+
+    def burst(actions):
+        async def run():
+            await asyncio.gather(*(channel_4.process_channel_4_signal(f"{action} XAUUSD\nENTRY: 2630", None)
+                                   for action in actions))
+        loop.run_until_complete(run())
+
+    benchmark.pedantic(burst, args=(["SELL", "SELL", "BUY", "SELL"],), rounds=1)
+    positions = terminal.positions_get(symbol="XAUUSD")
+    assert len(positions) == 1 and positions[0].volume == 0.2
+    burst(["BUY", "SELL"])
+    assert len(terminal.positions_get(symbol="XAUUSD")) == 1
+    assert signal_coalescer.coalesce_stats["trend"] == {
+        "signals": 6, "windows": 2, "orders": 1, "netted": 4, "round_trips_saved": 5, "tickets_saved": 5,
+    }
+
+
+def test_session_calendar_is_tradable(benchmark, terminal):
+    """Sessionskontrollen på signalvägen är en uppslagning."""
+    assert benchmark(session_calendar.is_tradable, "XAUUSD") is True
+
+
+def test_signals_on_different_symbols_in_parallel(benchmark, terminal, loop, monkeypatch):
+    """Signaler på olika symboler processas samtidigt (var och en under sitt eget symbollås)."""
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)  # Starta ingen equity-övervakning
+    terminal.latency = 0.001  # Varje MT5-anrop väntar, som mot en riktig terminal
+    symbols = ["XAUUSD", "EURUSD", "GBPUSD"]
+    ema_check = {"position": "below", "ema": 0.0, "price": 0.0}  # SELL godtas av trendregeln
+
+    async def burst():
+        await asyncio.gather(*(
+            channel_4.process_channel_4_signal(f"SELL {symbol}\nENTRY: 1.0", None, ema_check=ema_check)
+            for symbol in symbols
+        ))
+
+    benchmark.pedantic(lambda: loop.run_until_complete(burst()), rounds=5)
+    assert {p.symbol for p in terminal.positions.values()} == set(symbols)
+
+
+# --- Equity-övervakning och stängning ---
+@pytest.mark.parametrize("positions", [10, 1000, 10000])
+def test_monitor_equity_cycle(benchmark, terminal, loop, positions, monkeypatch):
+    terminal.seed_positions(positions)
+    snapshot = dict(terminal.positions)
+
+    def setup():
+        terminal.restore_positions(snapshot)
+        hedged_positions.clear()
+
+    benchmark.pedantic(lambda: loop.run_until_complete(channel_4.run_equity_cycle()),
+                       setup=setup, rounds=3 if positions >= 10000 else 10)
+
+    # Ett varv till med spioner på de vektoriserade stegen, jämfört med en referens i ren Python
+    setup()
+    seen = {}
+
+    def spy(name):
+        func = getattr(channel_4, name)
+
+        def call(*args):
+            seen[name] = result = func(*args)
+            return result
+        return call
+
+    for name in ("counts_per_symbol", "loss_candidates", "original_directions", "_plan_hedges"):
+        monkeypatch.setattr(channel_4, name, spy(name))
+    loop.run_until_complete(channel_4.run_equity_cycle())
+
+    ordered = list(terminal.positions_get())
+    originals, directions, losing = collections.Counter(), {}, []
+    for index, position in enumerate(ordered):
+        originals[position.symbol] += 1
+        directions.setdefault(position.symbol, set()).add(position.type)
+        if position.profit <= channel_4.TREND.loss_threshold and position.ticket > 0:
+            losing.append(index)
+    assert seen["counts_per_symbol"] == (dict(originals), {symbol: 0 for symbol in originals})
+    assert seen["loss_candidates"].tolist() == losing
+    if not losing:
+        assert "_plan_hedges" not in seen and not hedged_positions
+        return
+    assert seen["original_directions"] == directions
+    eligible, slots, blocked = seen["_plan_hedges"]
+    # Varje förlustposition är en kandidat (den är själv en original i sin riktning), grupperad per symbol
+    assert sorted(position.ticket for position in eligible) == sorted(ordered[index].ticket for index in losing)
+    assert slots == {symbol: originals[symbol] for symbol in {ordered[index].symbol for index in losing}}
+    assert blocked == {}
+    # Hedgar läggs så långt marginalen räcker, och bara för kandidaterna
+    assert set(hedged_positions) <= {position.ticket for position in eligible}
+
+
+def test_hedge_batch_reserves_margin_once(benchmark, terminal, loop, monkeypatch):
+    """Förlustpositioner i samma varv hedgas i en batch med ett account_info och en marginalberäkning per riktning."""
+    mt5 = channel_4.mt5
+    terminal.seed_positions(8, symbols=["XAUUSD"], loss_share=1.0)  # 4 BUY och 4 SELL på förlust
+    tick = terminal.symbol_info_tick("XAUUSD")
+    margin = max(terminal.order_calc_margin(mt5.ORDER_TYPE_BUY, "XAUUSD", 0.1, tick.ask),
+                 terminal.order_calc_margin(mt5.ORDER_TYPE_SELL, "XAUUSD", 0.1, tick.bid))
+    # Fri marginal för tre och en halv hedge
+    terminal.balance = 3.5 * margin - terminal.open_profit + terminal.used_margin
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    order_templates.template("XAUUSD")
+
+    calls = collections.Counter()
+    for name in ("account_info", "order_calc_margin", "symbol_info_tick"):
+        def counted(*args, _name=name, _call=getattr(mt5, name), **kwargs):
+            calls[_name] += 1
+            return _call(*args, **kwargs)
+        monkeypatch.setattr(mt5, name, counted)
+
+    benchmark.pedantic(lambda: loop.run_until_complete(channel_4.run_equity_cycle()), rounds=1)
+    assert len(hedged_positions) == 3
+    assert calls == {"account_info": 2, "order_calc_margin": 2, "symbol_info_tick": 1}
+
+
+def test_close_all_orders(benchmark, terminal):
+    terminal.seed_positions(1000)
+    snapshot = dict(terminal.positions)
+
+    benchmark.pedantic(channel_4.close_all_orders, setup=lambda: terminal.restore_positions(snapshot), rounds=10)
+    assert not terminal.positions
+
+
+def test_shadow_paper_cycle(benchmark, terminal):
+    """Ett övervakningsvarv för en pappersbok efter 1000 signaler (hälften godtas av EMA-regeln)."""
+    mt5 = terminal.as_module()
+    book = shadow_engine.PaperBook(shadow_engine.STRATEGIES["countertrend"])
+    tick = mt5.symbol_info_tick("XAUUSD")
+    ema_check = {"position": "below"}
+    for i in range(1000):
+        book.on_signal(mt5.ORDER_TYPE_BUY if i % 2 else mt5.ORDER_TYPE_SELL, "XAUUSD", ema_check, tick, 100.0)
+    ticks = shadow_engine.market_snapshot(["XAUUSD"])
+    benchmark(book.run_cycle, ticks)
+    assert book.summary()["positions"] >= 1
+
+
+# --- Inspelning och uppspelning ---
+def test_tape_replays_equity_cycle(benchmark, terminal, loop, monkeypatch, tmp_path, use_terminal):
+    """Ett inspelat equity-varv spelas upp mot samma kod utan omatchade anrop."""
+    terminal.seed_positions(1000)
+    recorder = mt5_tape.TapeRecorder(mt5_tape.module_constants(terminal.as_module()), directory=str(tmp_path))
+    recording = mt5_tape.recording_module(terminal.as_module(), recorder)
+    use_terminal(recording)
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    loop.run_until_complete(channel_4.run_equity_cycle())
+    recorder.close()
+    hedges_placed = dict(hedged_positions)
+
+    replay = mt5_tape.ReplayTerminal(mt5_tape.read_tape(sorted(map(str, tmp_path.glob("*.mt5tape")))))
+    use_terminal(replay.as_module())
+
+    def setup():
+        replay.rewind()
+        hedged_positions.clear()
+        original_orders_per_symbol.clear()
+        hedge_orders_per_symbol.clear()
+        order_templates._templates.clear()
+
+    benchmark.pedantic(lambda: loop.run_until_complete(channel_4.run_equity_cycle()), setup=setup, rounds=5)
+    assert replay.calls > 0 and not replay.misses
+    assert hedged_positions == hedges_placed
+
+
+def test_load_generator_pipeline(benchmark, terminal, loop):
+    """Syntetisk signallast genom de riktiga hanterarna: alla signaler hanteras och når order."""
+    terminal.balance = 100_000.0
+    mix = {"channel_4": 3, "channel_3": 1}
+
+    def run():
+        return loop.run_until_complete(load_generator.run_load(channel_4.mt5, 200, 0.5, mix, seed=1))
+
+    stats = benchmark.pedantic(run, rounds=1)
+    report = stats.report()
+    assert report["injected"] == report["completed"] > 0
+    assert report["orders"] > 0 and report["p50_ms"] is not None
+
+
+# --- GUI ---
+def test_gui_position_list_refresh(benchmark, terminal):
+    gui_visualization = pytest.importorskip("gui_visualization")
+    tk = pytest.importorskip("tkinter")
+    try:
+        gui = gui_visualization.GUI()
+    except tk.TclError:
+        pytest.skip("No display available for Tk.")
+    terminal.seed_positions(100)
+    gui.update_position_batch(dashboard_shm.build_rows(terminal.positions_get(), {}))
+
+    benchmark(gui.update_position_list_ui)
+    gui.root.destroy()
+
+
+def test_gui_publish_positions(benchmark, terminal):
+    """Kostnaden event-loopen betalar för att publicera 10000 positioner till GUI:t (ingen väntan på Tk)."""
+    terminal.seed_positions(10000)
+    positions = terminal.positions_get()
+    hedged_positions.update({p.ticket: p.ticket + 1 for p in positions[:1000]})
+    benchmark(gui_updates.publish_positions, positions, hedged_positions)
+    snapshot = gui_updates.read()
+    assert len(snapshot.positions) == 10000 and snapshot.hedges is not hedged_positions
+
+
+@pytest.fixture
+def dashboard():
+    publisher = dashboard_shm.DashboardPublisher(name=f"dashboard_test_{os.getpid()}")
+    reader = dashboard_shm.DashboardReader(name=publisher.shm.name)
+    yield publisher, reader
+    reader.close()
+    publisher.close()
+
+
+def test_dashboard_publish(benchmark, terminal, dashboard):
+    """Bottens kostnad för att skriva 10000 positioner till det delade minnet."""
+    publisher, reader = dashboard
+    terminal.seed_positions(10000)
+    positions = terminal.positions_get()
+    hedges = {p.ticket: p.ticket + 1 for p in positions[:1000:2]}
+    benchmark(lambda: publisher.publish(dashboard_shm.build_rows(positions, hedges), 100.0, 90.0, "Monitoring"))
+    header, rows = reader.read()
+    assert header["count"] == 10000 and header["status"] == b"Monitoring"
+    assert (rows["hedge_state"] == dashboard_shm.HEDGE).sum() == 500
+    assert (rows["hedge_state"] == dashboard_shm.ORIGINAL_HEDGED).sum() == 500
+
+
+def test_symbol_pl_data(benchmark, terminal, dashboard):
+    org_hedge_visual = pytest.importorskip("Org_hedge_visual")
+    publisher, reader = dashboard
+    terminal.seed_positions(10000)
+    publisher.publish(dashboard_shm.build_rows(terminal.positions_get(), {}))
+    original, hedge = benchmark(org_hedge_visual.get_symbol_pl_data, reader)
+    assert original.keys() == hedge.keys()
+    assert sum(original.values()) == pytest.approx(sum(p.profit for p in terminal.positions_get()))
+
+
+# --- Vakthund och profilerare ---
+def test_profiler_sample(benchmark, tmp_path):
+    """Kostnaden för ett sampel av alla trådars stackar (profileraren tar ~200 per sekund)."""
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="Worker")
+    worker.start()
+    counts, names = collections.Counter(), {}
+    benchmark(loop_watchdog.sample_once, counts, names)
+    stop.set()
+    worker.join()
+    path = tmp_path / "profile.folded"
+    loop_watchdog.write_folded(counts, path)
+    assert any(line.startswith("Worker;") and "threading.py:wait" in line for line in path.read_text().splitlines())
+
+
+# --- Loggning ---
+@pytest.fixture
+def bench_logger(tmp_path):
+    logger = logging.getLogger("Benchmark")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger, tmp_path
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_logging_synchronous_handlers(benchmark, bench_logger):
+    """Före: StreamHandler + FileHandler direkt på loggern (som channel_4 tidigare gjorde)."""
+    logger, tmp_path = bench_logger
+    for handler in (logging.FileHandler(tmp_path / "sync.log"), logging.StreamHandler(io.StringIO())):
+        handler.setFormatter(logging.Formatter(logging_setup.CONSOLE_FORMAT.replace(" [%(trace_id)s]", "")))
+        logger.addHandler(handler)
+    benchmark(logger.info, "Successfully placed hedge order for %s. Hedge Ticket: %s", "XAUUSD", 1000001)
+
+
+def test_logging_queue_handler(benchmark, bench_logger):
+    """Efter: QueueHandler i den loggande tråden, formatering och I/O i QueueListener."""
+    logger, tmp_path = bench_logger
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging_setup._QueueHandler(log_queue)
+    queue_handler.addFilter(logging_setup.ContextFilter())
+    logger.addHandler(queue_handler)
+    file_handler = logging.FileHandler(tmp_path / "queued.log")
+    file_handler.setFormatter(logging_setup.JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    try:
+        benchmark(logger.info, "Successfully placed hedge order for %s. Hedge Ticket: %s", "XAUUSD", 1000001)
+    finally:
+        listener.stop()
+        file_handler.close()
+
+
+def test_logging_lazy_debug_disabled(benchmark, bench_logger):
+    """Debug-anrop med lat formatering kostar nästan ingenting när DEBUG är avslaget."""
+    logger, _ = bench_logger
+    result = mt5_simulator.OrderSendResult(10009, 1, 1, 0.1, 2630.0, 2630.0, 2630.1, "Request executed", 1, 0, {})
+    benchmark(logger.debug, "OrderSendResult: %s", result)
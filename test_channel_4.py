@@ -0,0 +1,47 @@
+# test_channel_4.py
+import threading
+
+import channel_4
+from communication import hedged_positions, original_orders_per_symbol, hedge_orders_per_symbol
+
+
+def test_equity_cycle_calls_terminal_off_the_loop(terminal, loop, monkeypatch):
+    """Equity-varvet (läsning, hedgar och stängning) anropar aldrig terminalen från event-loopens tråd."""
+    terminal.seed_positions(50, loss_share=0.3)
+    loop_thread = threading.get_ident()
+    threads = []
+    sleep = terminal._sleep
+    monkeypatch.setattr(terminal, "_sleep", lambda: (threads.append(threading.get_ident()), sleep()))
+
+    loop.run_until_complete(channel_4.run_equity_cycle())
+    assert hedged_positions and threads and loop_thread not in threads
+
+    # Vinstgränsen nådd: stängningen och kontrollen efteråt körs också i trådar
+    threads.clear()
+    terminal.open_profit += 1e9
+    loop.run_until_complete(channel_4.run_equity_cycle())
+    assert not terminal.positions and threads and loop_thread not in threads
+
+
+def test_hedge_batch_counts_only_placed_hedges(terminal):
+    """En hedgeplats räknas när hedgen köas och släpps när ordern misslyckas; fler kandidater än platser blockeras."""
+    mt5 = channel_4.mt5
+    terminal.seed_positions(4, symbols=["XAUUSD"], loss_share=1.0)
+    positions = list(terminal.positions.values())
+    original_orders_per_symbol["XAUUSD"] = 4
+    hedge_orders_per_symbol["XAUUSD"] = 2  # Två lediga platser
+    terminal.retcode_script = [mt5.TRADE_RETCODE_REJECT]  # Första hedgen avvisas
+
+    directions = {"XAUUSD": {mt5.ORDER_TYPE_BUY, mt5.ORDER_TYPE_SELL}}
+
+    def hedge_pass():
+        eligible, slots, blocked = channel_4._plan_hedges({"XAUUSD": positions}, directions)
+        placed = channel_4._hedge_batch(eligible, 0.1, slots)
+        return channel_4._record_hedges(eligible, slots, placed, blocked)
+
+    assert hedge_pass() == {}  # Den avvisade hedgens plats släpptes igen
+    assert len(hedged_positions) == 1
+    assert hedge_orders_per_symbol["XAUUSD"] == 3
+
+    assert hedge_pass() == {"XAUUSD": (4, 4)}  # Sista platsen tas; övriga kandidater blockeras
+    assert len(hedged_positions) == 2
@@ -0,0 +1,44 @@
+# test_channel_registry.py
+import asyncio
+import logging
+import sys
+
+import channel_registry
+import startup_profile
+
+
+def test_enabled_plugins_follow_settings(monkeypatch, caplog):
+    monkeypatch.setattr(channel_registry, "ENABLED_CHANNELS", ["channel_6", "channel_9", "channel_4"])
+    with caplog.at_level(logging.ERROR, logger="ChannelRegistry"):
+        plugins = channel_registry.enabled_plugins()
+    assert [plugin.name for plugin in plugins] == ["channel_6", "channel_4"]
+    assert "Unknown channel 'channel_9'" in caplog.text
+
+    monkeypatch.setattr(channel_registry, "ENABLED_CHANNELS", [])
+    assert channel_registry.enabled_plugins() == []
+
+
+def test_preload_imports_lazily(monkeypatch, tmp_path, caplog):
+    """Kanalens modul importeras först vid preload (eller första signalen), en gång."""
+    (tmp_path / "lazy_channel.py").write_text(
+        "calls = []\n\nasync def process(message, path):\n    calls.append((message, path))\n")
+    (tmp_path / "broken_channel.py").write_text("raise ImportError('missing dependency')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(startup_profile, "_imports", [])
+    lazy = channel_registry.ChannelPlugin("lazy", "lazy_channel", "process", 0, args=lambda client: ("terminal64.exe",))
+    broken = channel_registry.ChannelPlugin("broken", "broken_channel", "process", 0)
+    try:
+        assert "lazy_channel" not in sys.modules
+        with caplog.at_level(logging.ERROR, logger="ChannelRegistry"):
+            channel_registry.preload([broken, lazy])
+        assert "Failed to load channel plugin broken" in caplog.text
+        assert "lazy_channel" in sys.modules
+        assert [name for name, _ in startup_profile._imports] == ["lazy_channel"]
+
+        handler = lazy.load()
+        assert lazy.load() is handler
+        asyncio.run(lazy.handle("BUY XAUUSD", client=None))
+        assert sys.modules["lazy_channel"].calls == [("BUY XAUUSD", "terminal64.exe")]
+        assert len(startup_profile._imports) == 1
+    finally:
+        sys.modules.pop("lazy_channel", None)
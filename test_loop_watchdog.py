@@ -0,0 +1,23 @@
+# test_loop_watchdog.py
+import asyncio
+import logging
+import time
+
+import loop_watchdog
+
+
+def test_watchdog_reports_stall(loop, caplog, monkeypatch):
+    monkeypatch.setitem(loop_watchdog.stats, "stalls", 0)
+
+    async def stall():
+        watchdog = asyncio.create_task(loop_watchdog.run_watchdog(threshold=0.1, interval=0.01))
+        await asyncio.sleep(0.05)
+        with loop_watchdog.in_flight("channel_4 message 1"):
+            time.sleep(0.3)  # Blockerar loopen
+        await asyncio.sleep(0.05)
+        watchdog.cancel()
+
+    with caplog.at_level(logging.WARNING, logger="Watchdog"):
+        loop.run_until_complete(stall())
+    assert loop_watchdog.stats["stalls"] == 1
+    assert "channel_4 message 1" in caplog.text and "in stall" in caplog.text
@@ -0,0 +1,70 @@
+# test_mt5_connection.py
+import asyncio
+import threading
+import time
+
+import channel_4
+import mt5_connection
+from communication import original_orders_per_symbol
+
+
+def test_terminal_switch_runs_off_the_loop(terminal, loop):
+    """Byte mellan kanalernas terminaler gör handskakningen i en tråd; event-loopen fortsätter under tiden."""
+    assert mt5_connection.ensure_connected("terminal64.exe")
+    terminal.latency = 0.05
+    ticks = []
+
+    async def heartbeat():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.005)
+
+    async def switch():
+        beat = asyncio.ensure_future(heartbeat())
+        await mt5_connection.require_connection_async("terminal64_alt.exe")
+        await mt5_connection.require_connection_async("terminal64.exe")
+        beat.cancel()
+
+    loop.run_until_complete(switch())
+    assert mt5_connection.is_connected("terminal64.exe")
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.04
+    # Den aktiva terminalen kontrolleras utan anrop
+    calls = terminal.calls
+    loop.run_until_complete(mt5_connection.require_connection_async("terminal64.exe"))
+    assert terminal.calls == calls
+
+
+def test_mt5_calls_are_serialized(terminal, loop, monkeypatch):
+    """Signaler i olika trådar anropar aldrig terminalen samtidigt; räknarna ändras på event-loopen."""
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    terminal.latency = 0.001
+    active, overlaps = [0], []
+    sleep = terminal._sleep
+
+    def tracked_sleep():
+        active[0] += 1
+        overlaps.append(active[0])
+        try:
+            sleep()
+        finally:
+            active[0] -= 1
+
+    monkeypatch.setattr(terminal, "_sleep", tracked_sleep)
+    loop_thread = threading.get_ident()
+    record = channel_4.record_original_order
+    recorded_on = []
+    monkeypatch.setattr(channel_4, "record_original_order",
+                        lambda *args: (recorded_on.append(threading.get_ident()), record(*args)))
+    ema_check = {"position": "below", "ema": 0.0, "price": 0.0}
+    symbols = ["XAUUSD", "EURUSD", "GBPUSD"]
+
+    async def burst():
+        await asyncio.gather(*(
+            channel_4.process_channel_4_signal(f"SELL {symbol}\nENTRY: 1.0", None, ema_check=ema_check)
+            for symbol in symbols
+        ))
+
+    loop.run_until_complete(burst())
+    assert len(terminal.positions) == 3 and max(overlaps) == 1
+    assert recorded_on == [loop_thread] * 3
+    assert all(original_orders_per_symbol[symbol] == 1 for symbol in symbols)
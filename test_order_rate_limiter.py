@@ -0,0 +1,46 @@
+# test_order_rate_limiter.py
+import collections
+import threading
+import time
+
+import mt5_connection
+import order_rate_limiter
+
+
+def test_rate_limiter_bucket_per_account(terminal):
+    """Varje konto har sin egen bucket: en tom bucket på ett konto stryper inte order från ett annat."""
+    assert order_rate_limiter.bucket() is order_rate_limiter.bucket("default")  # Innan någon anslutning
+    request = {"action": terminal.as_module().TRADE_ACTION_DEAL}
+    assert mt5_connection.ensure_connected("terminal64.exe")
+    order_rate_limiter.configure(0.5, 1, account=1)
+    order_rate_limiter.acquire(request)
+    assert order_rate_limiter.bucket(1).tokens < 1  # Kontots enda token är förbrukad
+
+    terminal.login = 2  # Den andra terminalen är inloggad på ett annat konto
+    assert mt5_connection.ensure_connected("terminal64_alt.exe")
+    assert mt5_connection.active_account() == 2
+    assert order_rate_limiter.acquire(request) == 0.0
+    assert order_rate_limiter.bucket() is order_rate_limiter.bucket(2) is not order_rate_limiter.bucket(1)
+
+
+def test_rate_limiter_waiters_do_not_spin():
+    """Väntande som inte är först i kön sover tills de väcks i stället för att snurra med timeout 0."""
+    limiter = order_rate_limiter.TokenBucket(rate=50, burst=1)
+    limiter.acquire()
+    waits = collections.Counter()
+    wait = limiter._condition.wait
+
+    def counted_wait(timeout=None):
+        waits[threading.get_ident()] += 1
+        return wait(timeout)
+
+    limiter._condition.wait = counted_wait
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(6)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 5 / 50  # Sex token i takten 50/s
+    # Varje väntande vaknar ungefär en gång per token som delas ut före den, inte tusentals gånger
+    assert sum(waits.values()) <= 6 * 12
@@ -0,0 +1,25 @@
+# test_position_book.py
+import threading
+
+import position_book
+
+
+def test_symbol_codes_are_unique_across_threads(monkeypatch):
+    """Dashboardens tråd och equity-varvet delar symbolregistret: samma namn får samma kod, olika namn olika."""
+    monkeypatch.setattr(position_book, "_symbol_codes", {})
+    monkeypatch.setattr(position_book, "_symbol_names", [])
+    names = [f"SYM{i}" for i in range(2000)]
+    codes = [{} for _ in range(4)]
+
+    def register(result):
+        for name in names:
+            result[name] = position_book.symbol_code(name)
+
+    threads = [threading.Thread(target=register, args=(result,)) for result in codes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result == codes[0] for result in codes)
+    assert sorted(codes[0].values()) == list(range(len(names)))
+    assert all(position_book.symbol_name(code) == name for name, code in codes[0].items())
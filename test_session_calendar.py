@@ -0,0 +1,64 @@
+# test_session_calendar.py
+import pytest
+
+import channel_4
+import mt5_simulator
+import session_calendar
+
+
+def test_session_calendar_rejects_closed_market(terminal, loop, monkeypatch):
+    """Signaler för en stängd marknad avvisas innan EMA, marginal och order_send."""
+    monkeypatch.setattr(session_calendar, "TRADING_SESSIONS", {"DJ30": {day: [("01:00", "22:00")] for day in range(5)}})
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    saturday_noon = 1_700_000_000 - 1_700_000_000 % 604800 + 2 * 86400 + 12 * 3600  # Epokveckan börjar på torsdag
+    tuesday_night = saturday_noon + 3 * 86400 + 11 * 3600
+    monkeypatch.setitem(session_calendar._state, "offset", 0)  # Servern går på UTC
+
+    assert session_calendar.is_tradable("DJ30", saturday_noon + 3 * 86400)
+    assert not session_calendar.is_tradable("DJ30", saturday_noon)
+    assert not session_calendar.is_tradable("DJ30", tuesday_night)
+    assert session_calendar.is_tradable("XAUUSD", saturday_noon)  # Standardtabellen i testerna: alltid öppen
+
+    # Brokern stänger symbolen (bara stängning): bakgrundsuppdateringen fångar det
+    terminal.symbols["XAUUSD"] = terminal.symbols["XAUUSD"]._replace(trade_mode=mt5_simulator.SYMBOL_TRADE_MODE_CLOSEONLY)
+    session_calendar.refresh(["XAUUSD"], now=terminal.now)
+    calls = terminal.calls
+    loop.run_until_complete(channel_4.process_channel_4_signal("SELL XAUUSD\nENTRY: 2632.59\nBULL", None))
+    assert not terminal.positions and terminal.calls - calls <= 2  # Bara anslutningskontrollen
+
+
+def test_session_calendar_follows_server_clock(terminal):
+    """Serverns tidszon läses av från ticks (sommartid), och en stoppad symbol släpps så fort ticks kommer igen."""
+    utc = terminal.now
+    terminal.now = utc + 3 * 3600  # Servern går på UTC+3
+    session_calendar.refresh(["XAUUSD"], now=utc)
+    assert session_calendar.server_time(utc) != utc + 3 * 3600  # En enda tick räcker inte
+    terminal.now += 1
+    session_calendar.refresh(now=utc + 1)
+    assert session_calendar.server_time(utc) == utc + 3 * 3600
+
+    terminal.now = utc + 3 * 3600 - 2 * session_calendar.SESSION_TICK_MAX_AGE  # Inga ticks på en stund
+    session_calendar.refresh(now=utc)
+    assert session_calendar.calendar("XAUUSD").halted and not session_calendar.is_tradable("XAUUSD", utc)
+    assert session_calendar.server_time(utc) == utc + 3 * 3600  # En gammal tick flyttar inte tidszonen
+
+    terminal.now = utc + 3 * 3600  # Ticks igen: require_open läser om tickströmmen i stället för att avvisa
+    session_calendar.require_open("XAUUSD", utc)
+    assert session_calendar.is_tradable("XAUUSD", utc)
+
+
+def test_session_calendar_ignores_half_hour_old_ticks(terminal):
+    """En tick som är exakt en halvtimme eller en timme gammal ser ut som en annan tidszon men flyttar inte klockan."""
+    utc = terminal.now
+    offset = session_calendar.server_time(utc) - utc
+    for age in (1800, 3600):
+        terminal.now = utc + offset - age
+        for later in range(3):  # Samma gamla tick vid flera uppdateringar
+            session_calendar.refresh(["XAUUSD"], now=utc + later * 60)
+            assert session_calendar.server_time(utc) == utc + offset
+        assert session_calendar.calendar("XAUUSD").halted
+
+        # Den stoppade symbolens gamla tick flyttar inte heller klockan när require_open läser om den
+        with pytest.raises(session_calendar.MarketClosed):
+            session_calendar.require_open("XAUUSD", utc + 180)
+        assert session_calendar.server_time(utc) == utc + offset
@@ -0,0 +1,30 @@
+# test_shadow_engine.py
+import threading
+
+import channel_4
+import shadow_engine
+import symbol_index
+
+
+def test_shadow_engine_calls_terminal_off_the_loop(terminal, loop, monkeypatch):
+    """Skuggsignalen och pappersvarvet läser marknaden och kontot i trådar; böckerna ändras på event-loopen."""
+    monkeypatch.setattr(channel_4, "monitoring_equity", True)
+    book = shadow_engine.PaperBook(shadow_engine.STRATEGIES["countertrend"])
+    monkeypatch.setattr(shadow_engine, "paper_books", {"countertrend": book})
+    monkeypatch.setattr(shadow_engine, "shadow_results", {})
+    symbol_index.build()  # Byggs vid uppstart
+    loop_thread = threading.get_ident()
+    threads = []
+    sleep = terminal._sleep
+    monkeypatch.setattr(terminal, "_sleep", lambda: (threads.append(threading.get_ident()), sleep()))
+
+    async def signal_and_cycle():
+        for direction in ("SELL", "BUY"):
+            await shadow_engine.process_channel_4_signal(f"{direction} XAUUSD\nENTRY: 2632.59", None)
+        await shadow_engine.run_shadow_cycle()
+
+    loop.run_until_complete(signal_and_cycle())
+    assert book.positions and len(terminal.positions) == 1
+    assert set(shadow_engine.shadow_results) == {"trend", "countertrend"}
+    assert shadow_engine.shadow_results["trend"]["positions"] == 1
+    assert threads and loop_thread not in threads
@@ -0,0 +1,56 @@
+# test_signal_recovery.py
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+import channel_4
+import channel_registry
+import signal_recovery
+
+
+def test_claim_deduplicates_catch_up(monkeypatch):
+    """Ett meddelande som redan hanterats live spelas inte upp igen efter återanslutning (per kanal)."""
+    monkeypatch.setattr(signal_recovery, "last_message_id", {})
+    monkeypatch.setattr(signal_recovery, "_claimed", {})
+    monkeypatch.setattr(signal_recovery, "_CLAIMED_HISTORY", 3)
+    assert signal_recovery.claim(-100, 7, "channel_4")
+    assert not signal_recovery.claim(-100, 7, "channel_4")
+    # Samma meddelande i en annan kanal som lyssnar på samma chatt hanteras för sig
+    assert signal_recovery.claim(-100, 7, "channel_4_shadow")
+    assert signal_recovery.claim(-100, 5, "channel_4")
+    assert signal_recovery.last_message_id == {-100: 7}
+
+    # Bara de senaste _CLAIMED_HISTORY id:na per kanal sparas
+    for message_id in (8, 9, 10):
+        assert signal_recovery.claim(-100, message_id, "channel_4")
+    assert not signal_recovery.claim(-100, 10, "channel_4")
+    assert signal_recovery.claim(-100, 7, "channel_4")
+    assert signal_recovery.last_message_id == {-100: 10}
+
+
+def test_classify_filters_stale_and_drifted_signals(terminal, monkeypatch):
+    monkeypatch.setitem(sys.modules, "MetaTrader5", channel_4.mt5)
+    plugin = channel_registry.CHANNEL_PLUGINS["channel_4"]
+    tick = terminal.symbol_info_tick("XAUUSD")
+    mid = (tick.ask + tick.bid) / 2
+    now = 1_700_000_000.0
+    posted = datetime.fromtimestamp(now - 10, timezone.utc)
+    max_age = signal_recovery.SIGNAL_MAX_AGE["channel_4"]
+    max_drift = signal_recovery.SIGNAL_MAX_DRIFT["channel_4"]
+
+    def signal(entry):
+        return f"SELL XAUUSD\nENTRY: {entry:.2f}\nBULL"
+
+    assert signal_recovery.classify(plugin, signal(mid), posted, now) == signal_recovery.FRESH
+    old = datetime.fromtimestamp(now - max_age - 1, timezone.utc)
+    assert signal_recovery.classify(plugin, signal(mid), old, now) == signal_recovery.STALE
+    drifted = mid / (1 + 2 * max_drift)
+    assert signal_recovery.price_drift(plugin, signal(drifted)) == pytest.approx(2 * max_drift, rel=1e-3)
+    assert signal_recovery.classify(plugin, signal(drifted), posted, now) == signal_recovery.DOWNGRADED
+    # Utan ENTRY kan driften inte beräknas: bara åldern avgör
+    assert signal_recovery.classify(plugin, "SELL XAUUSD\nBULL", posted, now) == signal_recovery.FRESH
+    # Kanaler utan driftgräns använder standardåldern
+    other = channel_registry.CHANNEL_PLUGINS["channel_1"]
+    within_default = datetime.fromtimestamp(now - signal_recovery.DEFAULT_SIGNAL_MAX_AGE + 1, timezone.utc)
+    assert signal_recovery.classify(other, signal(drifted), within_default, now) == signal_recovery.FRESH
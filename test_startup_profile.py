@@ -0,0 +1,21 @@
+# test_startup_profile.py
+import logging
+
+import startup_profile
+
+
+def test_startup_profile_mark_and_report(monkeypatch, caplog):
+    monkeypatch.setattr(startup_profile, "_marks", [])
+    monkeypatch.setattr(startup_profile, "_imports", [("fast_module", 0.001), ("slow_module", 0.25)])
+    first = startup_profile.mark("settings loaded")
+    second = startup_profile.mark("listening")
+    assert 0 <= first <= second
+    assert [name for name, _ in startup_profile._marks] == ["settings loaded", "listening"]
+
+    with caplog.at_level(logging.INFO, logger="Startup"):
+        startup_profile.report()
+    lines = [record.getMessage() for record in caplog.records]
+    assert lines[0].startswith("Startup settings loaded") and lines[1].startswith("Startup listening")
+    # Importerna loggas långsammast först
+    assert lines[2].startswith("Import  slow_module") and lines[2].endswith("250.0 ms")
+    assert lines[3].startswith("Import  fast_module")
@@ -0,0 +1,68 @@
+# test_strategy_sweep.py
+import numpy as np
+import pytest
+
+import bar_store
+import strategy_sweep
+from strategy import StrategyParams
+
+
+def _sweep_bars(opens, closes):
+    rates = np.zeros(len(closes), dtype=bar_store.RATES_DTYPE)
+    rates["time"] = 60 * np.arange(len(closes))
+    rates["open"], rates["close"] = opens, closes
+    rates["high"], rates["low"] = np.maximum(opens, closes), np.minimum(opens, closes)
+    return rates
+
+
+# Bar 5 stiger till 120 och nästa bar öppnar med ett gap till 119
+SWEEP_OPENS = [100.0] * 6 + [119.0, 121.0, 122.0, 123.0]
+SWEEP_CLOSES = [100.0] * 5 + [120.0, 121.0, 122.0, 123.0, 124.0]
+SWEEP_PARAMS = StrategyParams("test", "trend", 0.1, 1e9, -1e9, 0.1, 3)
+
+
+def _signal(bar, direction):
+    return np.array([60 * bar + 10], dtype=np.int64), np.array([direction], dtype=np.int8)
+
+
+def test_backtest_has_no_lookahead():
+    """En signal under bar 5 prövas mot EMA för bar 4 och fylls på bar 6:s öppning, inte på bar 5:s close."""
+    rates = _sweep_bars(SWEEP_OPENS, SWEEP_CLOSES)
+    ema = np.full(len(rates), 100.0)
+    ema[0] = np.nan
+    ema[5] = 200.0  # EMA:n för den pågående baren hade avvisat köpet
+    result = strategy_sweep.backtest(SWEEP_PARAMS, rates, ema, *_signal(5, 1), contract_size=100.0)
+    assert result["trades"] == 1
+    assert result["net_pl"] == pytest.approx((124.0 - 119.0) * 0.1 * 100.0)
+
+    # En signal under sista baren har ingen nästa bar att fyllas på
+    assert strategy_sweep.backtest(SWEEP_PARAMS, rates, ema, *_signal(9, 1), contract_size=100.0)["trades"] == 0
+
+
+def test_backtest_closes_at_profit_and_hedges_losses():
+    rates = _sweep_bars(SWEEP_OPENS, SWEEP_CLOSES)
+    ema = strategy_sweep.ema_series(rates["close"], 3)
+
+    take_profit = SWEEP_PARAMS._replace(profit_threshold=30.0)
+    result = strategy_sweep.backtest(take_profit, rates, ema, *_signal(5, 1), contract_size=100.0)
+    assert result == {"net_pl": pytest.approx(30.0), "max_drawdown": 0.0, "trades": 1, "hedges": 0}
+
+    # Motrend säljer över EMA; förlusten passerar loss_threshold och hedgas en gång
+    countertrend = SWEEP_PARAMS._replace(ema_rule="countertrend", loss_threshold=-15.0)
+    result = strategy_sweep.backtest(countertrend, rates, ema, *_signal(5, -1), contract_size=100.0)
+    assert result["trades"] == 1 and result["hedges"] == 1
+    assert result["net_pl"] == pytest.approx((119.0 - 124.0) * 10.0 + (124.0 - 121.0) * 10.0)
+
+
+def test_grid_params_and_rank():
+    grid = {"ema_rule": ["trend", "countertrend"], "fixed_lot_size": [0.1, 0.5], "profit_threshold": [10.0],
+            "loss_threshold": [-20.0], "hedge_lot_size": [0.1], "ema_period": [3]}
+    params = list(strategy_sweep.grid_params(grid))
+    assert [p.name for p in params] == ["grid0", "grid1", "grid2", "grid3"]
+    assert {(p.ema_rule, p.fixed_lot_size) for p in params} == {
+        ("trend", 0.1), ("trend", 0.5), ("countertrend", 0.1), ("countertrend", 0.5)}
+
+    results = [{"name": "a", "net_pl": 10.0, "max_drawdown": 5.0},
+               {"name": "b", "net_pl": 20.0, "max_drawdown": 9.0},
+               {"name": "c", "net_pl": 10.0, "max_drawdown": 1.0}]
+    assert [r["name"] for r in strategy_sweep.rank(results)] == ["b", "c", "a"]
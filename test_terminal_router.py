@@ -0,0 +1,33 @@
+# test_terminal_router.py
+import order_submission
+import order_templates
+import terminal_router
+
+
+def test_route_order_failover(terminal, router):
+    primary, secondary = router
+    mt5 = terminal.as_module()
+    primary.latency = 0.0
+    secondary.retcode_script = [mt5.TRADE_RETCODE_CONNECTION] * (order_submission.ORDER_RETRY_BUDGET + 1)
+    terminal_router.workers[1].rtt = 0.0  # Secondary först
+    request = order_templates.build_request("XAUUSD", "deal", type=mt5.ORDER_TYPE_SELL, volume=0.1,
+                                            price=terminal.symbol_info_tick("XAUUSD").bid, comment="Failover")
+    result = order_submission.submit_order(request)
+    assert result.retcode == mt5.TRADE_RETCODE_DONE
+    assert terminal_router.routing_log[-1] == {**terminal_router.routing_log[-1], "terminal": "Primary", "failovers": 1}
+    assert primary.positions and not secondary.positions
+
+
+def test_route_order_timeout_returns_failed_result(terminal, router, monkeypatch):
+    """En arbetare som inte svarar i tid ger ett misslyckat svar med retcode, inte None, och ingen failover."""
+    primary, secondary = router
+    mt5 = terminal.as_module()
+    monkeypatch.setattr(terminal_router, "ROUTER_PROBE_TIMEOUT", 0.0)
+    secondary.latency = 0.05
+    terminal_router.workers[1].rtt = 0.0  # Secondary först
+    request = order_templates.build_request("XAUUSD", "deal", type=mt5.ORDER_TYPE_BUY, volume=0.1,
+                                            price=terminal.symbol_info_tick("XAUUSD").ask, comment="Timeout")
+    result = terminal_router.route_order(request, 0, 0.001)
+    assert result.retcode == mt5.TRADE_RETCODE_TIMEOUT
+    assert not primary.positions
+    assert terminal_router.routing_log[-1]["terminal"] is None
@@ -0,0 +1,40 @@
+# test_trend_engine.py
+import threading
+
+import pytest
+
+import bar_store
+import channel_4
+import symbol_warmup
+import trend_engine
+
+
+def test_calculate_ema_matches_trend_engine(terminal):
+    """Reservvägen och trendmotorn ger samma EMA på samma stängda barer (samma start, fönster och barregel)."""
+    trend_engine.refresh(["XAUUSD"])
+    published = trend_engine.get_ema("XAUUSD")
+    assert channel_4.calculate_ema("XAUUSD") == pytest.approx(published, rel=1e-12)
+
+    # Den pågående baren påverkar ingen av vägarna
+    terminal.rates["XAUUSD"]["close"][-1] += 50.0
+    assert channel_4.calculate_ema("XAUUSD") == pytest.approx(published, rel=1e-12)
+
+
+def test_warmup_hands_symbols_to_trend_engine(terminal):
+    """Uppvärmda symboler hålls aktuella av trendmotorn, och samtidiga varv räknar in varje bar en gång."""
+    symbol_warmup.warm_up_all(["XAUUSD", "US30"])
+    assert trend_engine.watched([]) == ["XAUUSD", "DJ30"]
+
+    terminal.advance(5)
+    for symbol in ("XAUUSD", "DJ30"):
+        assert bar_store.sync(symbol, "M1", force=True) == 5
+    threads = [threading.Thread(target=trend_engine.refresh, args=(trend_engine.watched(),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for symbol in ("XAUUSD", "DJ30"):
+        closes = bar_store.bars(symbol, "M1")["close"]
+        seeded = trend_engine.ema_from_closes(closes[-5 - trend_engine.TREND_WARMUP_BARS:-5])
+        expected = trend_engine._apply_closes(seeded, closes[-5:].tolist())
+        assert trend_engine.get_ema(symbol) == pytest.approx(expected, rel=1e-9)
@@ -0,0 +1,196 @@
+# trend_engine.py
+"""
+Bakgrundsmotor som håller trendläget för bevakade symboler aktuellt.
+
+För varje (symbol, tidsram) hålls en EMA som uppdateras inkrementellt när en
+ny bar har stängt, i stället för att räknas om från grunden vid varje signal.
+Resultatet publiceras i communication.current_trends:
+
+    current_trends[symbol] = {
+        "trend": "UP" | "DOWN" | "MIXED",      # samstämmighet över alla tidsramar
+        "timeframes": {"M1": "UP", ...},
+        "ema": {"M1": 2631.4, ...},
+        "close": {"M1": 2632.0, ...},          # senast stängda barens close
+        "updated": <time.time() vid senaste kontroll>,
+    }
+
+Läsare (get_trend, get_ema) gör bara en dictionary-uppslagning och kontrollerar
+att "updated" inte är äldre än TREND_MAX_AGE.
+
+refresh körs både av bakgrundsuppgiften och av uppvärmningen (i trådar), så
+EMA-läget uppdateras under _lock. Symboler som värms upp utöver TREND_SYMBOLS
+registreras med watch() och hålls sedan aktuella av bakgrundsuppgiften.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import MetaTrader5 as mt5
+import numpy as np
+
+import bar_store
+import symbol_index
+from communication import current_trends
+from settings import EMA_PERIOD, TREND_SYMBOLS, TREND_TIMEFRAMES, TREND_POLL_INTERVAL, TREND_MAX_AGE, TREND_WARMUP_BARS
+
+logger = logging.getLogger("TrendEngine")
+
+# (symbol, tidsram) -> [tid för senast stängda bar, ema, senaste close]
+_ema_state = {}
+# Bevakade symboler som brokern inte erbjuder (loggas en gång)
+_missing = set()
+# Symboler utöver TREND_SYMBOLS som bakgrundsuppgiften håller aktuella (registrerade med watch)
+_watched = []
+# Skyddar _ema_state: refresh körs från både bakgrundsuppgiften och uppvärmningen
+_lock = threading.Lock()
+
+
+def timeframe_constant(name):
+    """Översätt ett tidsramsnamn ("M1", "H1") till MetaTrader5-konstanten."""
+    return getattr(mt5, f"TIMEFRAME_{name}")
+
+
+def _apply_closes(ema, closes, period=EMA_PERIOD):
+    """Uppdatera en EMA med en följd av stängningspriser."""
+    multiplier = 2 / (period + 1)
+    for price in closes:
+        ema = (price - ema) * multiplier + ema
+    return ema
+
+
+def seed_rates(symbol, timeframe, period=EMA_PERIOD, bars=TREND_WARMUP_BARS):
+    """De stängda barer som EMA initieras från (den pågående baren ingår aldrig)."""
+    rates = bar_store.bars(symbol, timeframe, bars)
+    if len(rates) < period:
+        raise ValueError(f"Not enough data to seed EMA for {symbol} {timeframe}.")
+    return rates
+
+
+def ema_from_closes(closes, period=EMA_PERIOD):
+    """EMA över stängningspriserna: SMA över första perioden, därefter den vanliga rekursionen."""
+    ema = float(closes[:period].mean())
+    return _apply_closes(ema, closes[period:].tolist(), period)
+
+
+def calculate(symbol, timeframe, period=EMA_PERIOD, bars=TREND_WARMUP_BARS):
+    """Räkna EMA från grunden med samma barer och start som seed (används när inget publicerat värde finns)."""
+    return ema_from_closes(seed_rates(symbol, timeframe, period, bars)["close"], period)
+
+
+def seed(symbol, timeframe, period=EMA_PERIOD, bars=TREND_WARMUP_BARS):
+    """Initiera EMA för (symbol, tidsram) från stängda barer i bar-lagringen."""
+    rates = seed_rates(symbol, timeframe, period, bars)
+    closes = rates["close"]
+    _ema_state[(symbol, timeframe)] = [int(rates["time"][-1]), ema_from_closes(closes, period), float(closes[-1])]
+
+
+def update(symbol, timeframe, period=EMA_PERIOD):
+    """Uppdatera EMA om nya barer har stängt sedan förra kontrollen. Returnerar True om något ändrades."""
+    state = _ema_state.get((symbol, timeframe))
+    if state is None:
+        seed(symbol, timeframe, period)
+        return True
+
+    # bar_store hämtar bara nya stängda barer från terminalen; resten är en vy av filen
+    rates = bar_store.bars(symbol, timeframe)
+    if len(rates) == 0:
+        return False
+    last_time = state[0]
+    times = rates["time"]
+    if times[-1] <= last_time:
+        return False
+
+    new_closes = rates["close"][np.searchsorted(times, last_time, side="right"):]
+    state[1] = _apply_closes(state[1], new_closes.tolist(), period)
+    state[0] = int(times[-1])
+    state[2] = float(new_closes[-1])
+    return True
+
+
+def publish(symbol, now=None):
+    """Publicera trendläget för en symbol i current_trends."""
+    directions, emas, closes = {}, {}, {}
+    for timeframe in TREND_TIMEFRAMES:
+        state = _ema_state.get((symbol, timeframe))
+        if state is None:
+            continue
+        _, ema, close = state
+        directions[timeframe] = "UP" if close > ema else "DOWN"
+        emas[timeframe] = ema
+        closes[timeframe] = close
+    values = set(directions.values())
+    trend = values.pop() if len(values) == 1 else "MIXED"
+    current_trends[symbol] = {
+        "trend": trend,
+        "timeframes": directions,
+        "ema": emas,
+        "close": closes,
+        "updated": now or time.time(),
+    }
+
+
+def get_state(symbol, max_age=TREND_MAX_AGE):
+    """Returnera publicerat trendläge för symbolen om det är färskt, annars None."""
+    entry = current_trends.get(symbol)
+    if entry is None or time.time() - entry["updated"] > max_age:
+        return None
+    return entry
+
+
+def get_ema(symbol, timeframe="M1", max_age=TREND_MAX_AGE):
+    """Returnera publicerad EMA för (symbol, tidsram) om den är färsk, annars None."""
+    entry = get_state(symbol, max_age)
+    if entry is None:
+        return None
+    return entry["ema"].get(timeframe)
+
+
+def watch(symbol):
+    """Registrera en symbol så att bakgrundsuppgiften håller dess trendläge aktuellt."""
+    if symbol not in _watched:
+        _watched.append(symbol)
+
+
+def watched(symbols=TREND_SYMBOLS):
+    """De givna symbolerna plus de registrerade, utan dubbletter."""
+    return list(dict.fromkeys([*symbols, *_watched]))
+
+
+def refresh(symbols=TREND_SYMBOLS):
+    """Ett varv: uppdatera alla (symbol, tidsram) och publicera under brokerns symbolnamn (symbol_index)."""
+    now = time.time()
+    for name in symbols:
+        symbol = symbol_index.resolve(name)
+        if symbol is None:
+            if name not in _missing:
+                _missing.add(name)
+                logger.error("Trend symbol %s is not offered by the broker.", name)
+            continue
+        _missing.discard(name)
+        with _lock:
+            for timeframe in TREND_TIMEFRAMES:
+                try:
+                    update(symbol, timeframe)
+                except Exception as e:
+                    logger.error("Failed to update trend for %s %s: %s", symbol, timeframe, e)
+            publish(symbol, now)
+
+
+async def run_trend_engine(symbols=TREND_SYMBOLS):
+    """Bakgrundsuppgift: håll current_trends uppdaterad för de bevakade (och registrerade) symbolerna."""
+    logger.info("Starting trend engine for %s on %s.", ", ".join(symbols), ", ".join(TREND_TIMEFRAMES))
+    while True:
+        try:
+            await asyncio.to_thread(refresh, watched(symbols))
+        except Exception as e:
+            logger.error("Trend engine iteration failed: %s", e)
+        await asyncio.sleep(TREND_POLL_INTERVAL)
+
+
+def reset():
+    """Glöm EMA-läget och registrerade symboler (används av tester)."""
+    with _lock:
+        _ema_state.clear()
+    _watched.clear()
+    _missing.clear()